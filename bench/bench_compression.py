@@ -0,0 +1,139 @@
+# bench/bench_compression.py — bytes on wire + latency end-to-end (mô phỏng đường truyền chậm)
+# của CompressionMiddleware với payload JSON cỡ /api/content/timeseries (không cần DB).
+#   python -m bench.bench_compression --videos 200 --days 365 --mbps 2 10 50 --rtt-ms 80
+# latency = thời gian server (render + nén, đo thật qua ASGI) + RTT + bytes/băng thông
+#           + thời gian client giải nén (đo thật).
+import argparse
+import asyncio
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import compression
+from compression import CompressionMiddleware
+
+
+def synthetic_rows(videos: int, days: int) -> List[Dict]:
+    start = date(2024, 1, 1)
+    return [
+        {
+            "bucket": (start + timedelta(days=d)).isoformat(),
+            "videoId": f"vid{v:05d}xxxxx",
+            "title": f"Synthetic video title number {v}",
+            "views": (v * 7919 + d * 104729) % 5000,
+            "watch_hours": round(((v + 1) * (d + 3) % 977) / 7.0, 4),
+            "likes": (v * d) % 120,
+            "revenue": 0,
+            "impressions": 0,
+        }
+        for d in range(days) for v in range(videos)
+    ]
+
+
+def build_app(rows: List[Dict]) -> Starlette:
+    import json
+
+    async def full(request):
+        return JSONResponse({"items": rows})
+
+    async def stream(request):
+        # NDJSON theo lô 1000 dòng -> nhánh nén streaming
+        async def gen():
+            for i in range(0, len(rows), 1000):
+                yield "".join(json.dumps(r) + "\n" for r in rows[i:i + 1000]).encode()
+        return StreamingResponse(gen(), media_type="application/x-ndjson; charset=utf-8")
+
+    app = Starlette(routes=[Route("/full", full), Route("/stream", stream)])
+    return app
+
+
+async def asgi_get(app, path: str, accept_encoding: str) -> Tuple[bytes, Dict[bytes, bytes], float]:
+    """Gọi ASGI trực tiếp, lấy body thô (chưa giải nén) + thời gian server."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "client": ("bench", 0), "server": ("bench", 80),
+    }
+    chunks: List[bytes] = []
+    headers: Dict[bytes, bytes] = {}
+    received = False
+
+    async def receive():
+        # lần đầu: body rỗng; sau đó chờ mãi (StreamingResponse nghe http.disconnect)
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.update({k.lower(): v for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    t0 = time.perf_counter()
+    await app(scope, receive, send)
+    return b"".join(chunks), headers, time.perf_counter() - t0
+
+
+def decode(encoding: str, body: bytes) -> bytes:
+    if encoding == "gzip":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "br":
+        return compression.brotli.decompress(body)
+    if encoding == "zstd":
+        return compression.zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+async def run(args):
+    rows = synthetic_rows(args.videos, args.days)
+    app = CompressionMiddleware(build_app(rows))
+    encodings = ["identity"] + list(compression.ENCODERS)
+    print(f"[bench] {len(rows)} rows, encoders: {', '.join(compression.ENCODERS)}")
+
+    for path in ("/full", "/stream"):
+        print(f"\n== {path} ==")
+        baseline = None
+        for enc in encodings:
+            best = None
+            for _ in range(args.repeat):
+                body, headers, server_s = await asgi_get(app, path, enc)
+                got = headers.get(b"content-encoding", b"identity").decode()
+                t0 = time.perf_counter()
+                plain = decode(got, body)
+                client_s = time.perf_counter() - t0
+                if best is None or server_s + client_s < best[1] + best[2]:
+                    best = (body, server_s, client_s, plain, got)
+            body, server_s, client_s, plain, got = best
+            baseline = baseline or plain
+            assert plain == baseline, f"{enc}: payload khác sau giải nén"
+
+            cells = []
+            for mbps in args.mbps:
+                wire_s = len(body) * 8 / (mbps * 1e6)
+                total = server_s + client_s + args.rtt_ms / 1000 + wire_s
+                cells.append(f"{mbps:>5g}Mbps {total * 1000:8.1f}ms")
+            print(f"  {got:8} {len(body) / 1024:9.1f} KB  ratio {len(baseline) / len(body):5.1f}x  "
+                  f"server {server_s * 1000:6.1f}ms  decode {client_s * 1000:5.1f}ms  | " + "  ".join(cells))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark CompressionMiddleware trên đường truyền mô phỏng.")
+    ap.add_argument("--videos", type=int, default=200)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--mbps", type=float, nargs="+", default=[2, 10, 50])
+    ap.add_argument("--rtt-ms", type=float, default=80)
+    ap.add_argument("--repeat", type=int, default=3)
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# bench/bench_densify.py — legacy dict densify vs module_columnar (15 năm × 20 source)
+#   python -m bench.bench_densify [--years 15] [--sources 20] [--repeat 3]
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from module_columnar import TRAFFIC_SCHEMA, RecordBatch, densify_daily, traffic_frame
+from module_trafficsource import _iter_day_chunks, _iter_days
+
+
+HEADERS = [
+    {"name": "insightTrafficSourceType"},
+    {"name": "day"},
+    {"name": "views"},
+    {"name": "estimatedMinutesWatched"},
+    {"name": "engagedViews"},
+    {"name": "averageViewDuration"},
+    {"name": "averageViewPercentage"},
+]
+
+
+def synthetic_responses(years: int, sources: int, density: float = 0.6, seed: int = 42) -> Tuple[List[Dict], str, str]:
+    """Giả lập các response 90 ngày/chunk như API trả về (thưa, có ngày thiếu)."""
+    rnd = random.Random(seed)
+    end = date(2025, 1, 1)
+    start = end - timedelta(days=365 * years)
+    names = [f"SRC_{i:02d}" for i in range(sources)]
+
+    out = []
+    for sd, ed in _iter_day_chunks(start.isoformat(), end.isoformat()):
+        rows = []
+        for d in _iter_days(sd, ed):
+            for src in names:
+                if rnd.random() > density:
+                    continue
+                views = rnd.randint(0, 5000)
+                rows.append([src, d, views, views * rnd.randint(1, 6), views // 2, 0, rnd.random() * 100])
+        out.append({"columnHeaders": HEADERS, "rows": rows})
+    return out, start.isoformat(), end.isoformat()
+
+
+def legacy_densify(responses: List[Dict], start_date: str, end_date: str) -> List[Dict]:
+    """Bản sao logic dict cũ của run_traffic_source_lifetime_daily_to_postgres."""
+    data_map, source_set = {}, set()
+    for resp in responses:
+        col_index = {c["name"]: i for i, c in enumerate(resp.get("columnHeaders", []))}
+        i_day, i_src = col_index["day"], col_index["insightTrafficSourceType"]
+        i_v, i_emw = col_index["views"], col_index["estimatedMinutesWatched"]
+        i_eng, i_avp = col_index["engagedViews"], col_index["averageViewPercentage"]
+        for r in resp["rows"]:
+            views, emw = int(r[i_v] or 0), int(r[i_emw] or 0)
+            data_map[(r[i_day], r[i_src])] = {
+                "day": r[i_day],
+                "insightTrafficSourceType": r[i_src],
+                "views": views,
+                "estimatedMinutesWatched": emw,
+                "averageViewDuration": int(round((emw * 60) / views)) if views > 0 else 0,
+                "averageViewPercentage": float(r[i_avp]) if r[i_avp] is not None else 0.0,
+                "engagedViews": int(r[i_eng] or 0),
+            }
+            source_set.add(r[i_src])
+
+    for d in _iter_days(start_date, end_date):
+        for s in source_set:
+            if (d, s) not in data_map:
+                data_map[(d, s)] = {
+                    "day": d, "insightTrafficSourceType": s, "views": 0,
+                    "estimatedMinutesWatched": 0, "averageViewDuration": 0,
+                    "averageViewPercentage": 0.0, "engagedViews": 0,
+                }
+    return sorted(data_map.values(), key=lambda x: (x["day"], x["insightTrafficSourceType"]))
+
+
+def legacy_bind(out_rows: List[Dict]) -> List[Dict]:
+    """Bản sao payload của save_traffic_source_daily_to_postgres (ép int/float lần 2)."""
+    return [{
+        "account_tag": "bench", "channel_id": "", "day": r["day"],
+        "source": r["insightTrafficSourceType"],
+        "views": int(r.get("views", 0) or 0),
+        "emw": int(r.get("estimatedMinutesWatched", 0) or 0),
+        "avd": int(r.get("averageViewDuration", 0) or 0),
+        "avp": float(r.get("averageViewPercentage", 0.0) or 0.0),
+        "eng": int(r.get("engagedViews", 0) or 0),
+    } for r in out_rows]
+
+
+def columnar_densify(responses: List[Dict], start_date: str, end_date: str):
+    raw = RecordBatch(TRAFFIC_SCHEMA)
+    for resp in responses:
+        raw.extend_response(resp)
+    return densify_daily(traffic_frame(raw), start_date, end_date)
+
+
+def columnar_bind(dense) -> List[Tuple]:
+    """Như save_traffic_batch_to_postgres, nhưng gom tuple lại thay vì execute."""
+    batch = RecordBatch.from_frame(dense, TRAFFIC_SCHEMA)
+    return [row for chunk in batch.iter_tuples(5000, prefix=("bench", "")) for row in chunk]
+
+
+def best_of(fn, repeat: int, *args):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=int, default=15)
+    ap.add_argument("--sources", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    responses, start, end = synthetic_responses(args.years, args.sources)
+    n_in = sum(len(r["rows"]) for r in responses)
+    print(f"input: {n_in} rows, {len(responses)} chunks, {start}..{end}")
+
+    t_legacy, legacy = best_of(legacy_densify, args.repeat, responses, start, end)
+    t_col, dense = best_of(columnar_densify, args.repeat, responses, start, end)
+    t_lbind, legacy_payload = best_of(legacy_bind, args.repeat, legacy)
+    t_cbind, col_payload = best_of(columnar_bind, args.repeat, dense)
+
+    bind_order = ["account_tag", "channel_id", "day", "source", "views", "emw", "avd", "avp", "eng"]
+    assert [tuple(p[k] for k in bind_order) for p in legacy_payload] == col_payload, \
+        "columnar output khác legacy"
+
+    print(f"{'':10} {'densify':>10} {'bind':>10} {'total':>10}")
+    print(f"{'legacy':10} {t_legacy * 1000:8.1f}ms {t_lbind * 1000:8.1f}ms {(t_legacy + t_lbind) * 1000:8.1f}ms")
+    print(f"{'columnar':10} {t_col * 1000:8.1f}ms {t_cbind * 1000:8.1f}ms {(t_col + t_cbind) * 1000:8.1f}ms")
+    print(f"rows out: {len(col_payload)}  speedup densify x{t_legacy / t_col:.1f}, "
+          f"total x{(t_legacy + t_lbind) / (t_col + t_cbind):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench/bench_ingest_memory.py — peak memory (tracemalloc) của 1 lần ingest lifetime:
+#   traffic_source_daily (years × sources) + video_daily_stats (videos × ngày từ lúc publish)
+#   legacy = list/dict theo dòng như code cũ, columnar = RecordBatch -> tuple chunk
+#   python -m bench.bench_ingest_memory [--years 15] [--sources 20] [--videos 200]
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+from bench.bench_densify import legacy_bind, legacy_densify, synthetic_responses
+from module_columnar import TRAFFIC_SCHEMA, RecordBatch, densify_daily, traffic_frame
+from module_content import VIDEO_DAILY_SCHEMA, parse_video_daily
+
+BATCH_SIZE = 5000
+
+DAILY_HEADERS = [
+    {"name": "day"},
+    {"name": "views"},
+    {"name": "estimatedMinutesWatched"},
+    {"name": "averageViewDuration"},
+    {"name": "likes"},
+]
+
+
+def synthetic_video_responses(videos: int, years: int, seed: int = 7) -> Iterator[Dict]:
+    """Mỗi video 1 response dimensions=day, từ ngày publish tới hết kỳ (sinh lười như gọi API)."""
+    rnd = random.Random(seed)
+    end = date(2025, 1, 1)
+    for n in range(videos):
+        published = end - timedelta(days=rnd.randint(30, 365 * years))
+        rows, d = [], published
+        while d <= end:
+            views = rnd.randint(0, 3000)
+            rows.append([d.isoformat(), views, views * 3, rnd.randint(10, 600), views // 20])
+            d += timedelta(days=1)
+        yield f"VID{n:07d}", {"columnHeaders": DAILY_HEADERS, "rows": rows}
+
+
+# ===== legacy: bản sao luồng dict cũ =====
+def legacy_ingest(args) -> int:
+    responses, start, end = synthetic_responses(args.years, args.sources)
+    out_rows = legacy_densify(responses, start, end)
+    del responses
+    payload = legacy_bind(out_rows)
+    written = len(payload)
+    del out_rows, payload
+
+    daily_rows: List[Dict] = []
+    for video_id, resp in synthetic_video_responses(args.videos, args.years):
+        col = {c["name"]: i for i, c in enumerate(resp["columnHeaders"])}
+        for r in resp["rows"]:
+            daily_rows.append({
+                "video_id": video_id,
+                "day": r[col["day"]],
+                "views": int(r[col["views"]]),
+                "estimated_minutes": int(r[col["estimatedMinutesWatched"]]),
+                "average_view_duration": int(r[col["averageViewDuration"]]),
+                "likes": int(r[col["likes"]]),
+            })
+    for r in daily_rows:
+        params = {
+            "id": r["video_id"], "day": r["day"], "views": r["views"],
+            "emw": r["estimated_minutes"], "avd": r["average_view_duration"], "likes": r["likes"],
+        }
+        written += bool(params)
+    return written
+
+
+# ===== columnar: cùng các bước với run_traffic_source_lifetime_daily_to_postgres / run_content_v3_hybrid =====
+def columnar_ingest(args) -> int:
+    responses, start, end = synthetic_responses(args.years, args.sources)
+    raw = RecordBatch(TRAFFIC_SCHEMA)
+    for resp in responses:
+        raw.extend_response(resp)
+    del responses
+    dense = densify_daily(traffic_frame(raw), start, end)
+    out_rows = RecordBatch.from_frame(dense, TRAFFIC_SCHEMA)
+    del dense, raw
+    written = sum(len(chunk) for chunk in out_rows.iter_tuples(BATCH_SIZE, prefix=("bench", "")))
+    del out_rows
+
+    daily_rows = RecordBatch(VIDEO_DAILY_SCHEMA)
+    for video_id, resp in synthetic_video_responses(args.videos, args.years):
+        daily_rows.extend(parse_video_daily(resp, video_id))
+    written += sum(len(chunk) for chunk in daily_rows.iter_tuples(BATCH_SIZE))
+    return written
+
+
+def measure(fn, args):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    written = fn(args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return written, peak, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--years", type=int, default=15)
+    ap.add_argument("--sources", type=int, default=20)
+    ap.add_argument("--videos", type=int, default=200)
+    args = ap.parse_args()
+
+    n_legacy, peak_legacy, t_legacy = measure(legacy_ingest, args)
+    n_col, peak_col, t_col = measure(columnar_ingest, args)
+    assert n_legacy == n_col, (n_legacy, n_col)
+
+    mb = 1024 * 1024
+    print(f"rows bound: {n_col}")
+    print(f"legacy   : peak {peak_legacy / mb:8.1f} MB  ({t_legacy:.2f}s dưới tracemalloc)")
+    print(f"columnar : peak {peak_col / mb:8.1f} MB  ({t_col:.2f}s dưới tracemalloc)")
+    print(f"peak giảm {100 * (1 - peak_col / peak_legacy):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# bench/suite.py — chạy mọi endpoint trong routes/ qua ASGI app (httpx.ASGITransport,
+# không qua mạng) với concurrency cố định; ghi throughput, p50/p95/p99, bộ nhớ ra JSON,
+# và so sánh với 1 lần chạy trước.
+#   PG_URL=... python -m bench.synthetic --accounts 3 --videos 200 --years 5
+#   PG_URL=... python -m bench.suite --accounts 3 --concurrency 8 --requests 200 \
+#       --out bench/results/run.json [--compare bench/results/prev.json]
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bench.synthetic import END_DAY, REPORT_DAILY, REPORT_TRAFFIC, RETENTION_VIDEOS, account_tags, video_ids
+
+
+def endpoint_specs(accounts: int, years: int) -> List[Tuple[str, str, str, Optional[dict]]]:
+    """(tên, method, path, json body) cho mọi route trong routes/."""
+    tag = account_tags(accounts)[0]
+    vid = video_ids(tag, 1)[0]
+    end = END_DAY.isoformat()
+    start_28d = (END_DAY - timedelta(days=27)).isoformat()
+    start_all = END_DAY.replace(year=END_DAY.year - years).isoformat()
+
+    return [
+        ("traffic.channels", "GET", "/api/traffic_source/channels", None),
+        ("traffic.timeseries.daily", "POST", "/api/traffic_source/timeseries",
+         {"start": start_28d, "end": end, "channelRoot": tag, "interval": "daily"}),
+        ("traffic.timeseries.monthly.all", "POST", "/api/traffic_source/timeseries",
+         {"start": start_all, "end": end, "channelRoot": tag, "interval": "monthly"}),
+        ("traffic.range", "POST", "/api/traffic_source/range",
+         {"start": start_all, "end": end, "channelRoot": tag}),
+        ("traffic.overview.monthly.all", "POST", "/api/traffic_source/overview",
+         {"start": start_all, "end": end, "channelRoot": tag, "interval": "monthly"}),
+        ("batch.dashboard", "POST", "/api/batch", {"queries": [
+            {"id": "range", "route": "/api/traffic_source/range",
+             "body": {"start": start_28d, "end": end, "channelRoot": tag}},
+            {"id": "ts", "route": "/api/traffic_source/timeseries",
+             "body": {"start": start_28d, "end": end, "channelRoot": tag, "interval": "daily"}},
+            {"id": "content", "route": "/api/content/list",
+             "body": {"start": start_28d, "end": end, "channelId": tag}},
+            {"id": "stats", "route": "/api/video_overview/stats",
+             "body": {"accountTag": tag, "start": start_28d, "end": end}},
+        ]}),
+        ("portfolio.all.90d", "POST", "/api/portfolio",
+         {"accountTags": "all", "start": (END_DAY - timedelta(days=89)).isoformat(), "end": end}),
+        ("content.channels", "GET", "/api/content/channels", None),
+        ("content.list", "POST", "/api/content/list",
+         {"start": start_all, "end": end, "channelId": tag}),
+        ("content.top", "POST", "/api/content/top",
+         {"start": start_all, "end": end, "channelId": tag, "metric": "views,watchTimeHours", "n": 10}),
+        ("content.timeseries", "POST", "/api/content/timeseries",
+         {"start": start_28d, "end": end, "channelId": tag}),
+        ("content.timeseries.monthly.top10.all", "POST", "/api/content/timeseries",
+         {"start": start_all, "end": end, "channelId": tag, "interval": "monthly", "topK": 10,
+          "maxPoints": 60}),
+        ("overview.channels", "GET", "/api/video_overview/channels", None),
+        ("overview.videos", "GET", f"/api/video_overview/videos?accountTag={tag}", None),
+        ("overview.list", "POST", "/api/video_overview/list",
+         {"accountTag": tag, "startDate": start_all, "endDate": end}),
+        ("overview.detail", "GET", f"/api/video_overview/detail/{vid}", None),
+        ("overview.stats", "POST", "/api/video_overview/stats",
+         {"accountTag": tag, "start": start_all, "end": end}),
+        # CSV do bench.synthetic ghi vào REPORT_ROOT/<tag>/ (lần đầu parse, sau đó cache theo mtime)
+        ("reports.list", "GET", f"/api/reports/{tag}", None),
+        ("reports.daily.all", "GET", f"/api/reports/{tag}/{REPORT_DAILY}", None),
+        ("reports.traffic.28d", "GET", f"/api/reports/{tag}/{REPORT_TRAFFIC}", None),
+        ("retention.curves.50", "POST", "/api/retention/curves",
+         {"channelId": tag, "videoIds": video_ids(tag, 50)}),
+        ("retention.average.all", "POST", "/api/retention/curves",
+         {"channelId": tag, "videoIds": video_ids(tag, RETENTION_VIDEOS), "includeCurves": False,
+          "average": True}),
+        # INGEST_SCHEDULER tắt: chỉ đọc ingest_jobs gần nhất
+        ("admin.ingest", "GET", "/api/admin/ingest", None),
+        # không truyền channel -> không gọi YouTube API, chỉ liệt kê ./credentials
+        ("geography.channels", "GET", "/api/geography/", None),
+        ("metrics", "GET", "/metrics", None),
+        ("debug.slow_queries", "GET", "/debug/slow-queries", None),
+    ]
+
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def rss_peak_mb() -> float:
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_endpoint(client, method: str, path: str, body, concurrency: int, requests: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    sizes = 0
+    todo = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, sizes
+        for _ in todo:
+            t0 = time.perf_counter()
+            try:
+                resp = await client.request(method, path, json=body)
+                ok = resp.status_code < 400
+                sizes += len(resp.content)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            errors += not ok
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat),
+        "errors": errors,
+        "throughput_rps": len(lat) / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(lat) / len(lat) if lat else 0.0,
+        "p50_ms": 1000 * percentile(lat, 0.50),
+        "p95_ms": 1000 * percentile(lat, 0.95),
+        "p99_ms": 1000 * percentile(lat, 0.99),
+        "avg_response_bytes": sizes / len(lat) if lat else 0,
+    }
+
+
+async def alloc_peak_kb(client, method: str, path: str, body) -> float:
+    """Peak cấp phát Python của 1 request (đo riêng, ngoài vòng đo thời gian)."""
+    tracemalloc.start()
+    try:
+        await client.request(method, path, json=body)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+async def run_suite(args) -> Dict:
+    import httpx
+    from main import app  # import sau khi đã set PG_URL
+
+    specs = endpoint_specs(args.accounts, args.years)
+    if args.only:
+        specs = [s for s in specs if any(s[0].startswith(p) for p in args.only)]
+
+    results = {}
+    # lỗi trong app -> response 500 (đếm vào errors) thay vì exception
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, method, path, body in specs:
+            for _ in range(args.warmup):
+                await client.request(method, path, json=body)
+            res = await run_endpoint(client, method, path, body, args.concurrency, args.requests)
+            res["alloc_peak_kb"] = await alloc_peak_kb(client, method, path, body)
+            res["rss_peak_mb"] = rss_peak_mb()
+            results[name] = res
+            print(f"  {name:32} {res['throughput_rps']:8.1f} rps  p50 {res['p50_ms']:7.1f}  "
+                  f"p95 {res['p95_ms']:7.1f}  p99 {res['p99_ms']:7.1f} ms  err {res['errors']}")
+    return results
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return ""
+
+
+# ===== compare =====
+_COMPARE_KEYS = [("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False),
+                 ("alloc_peak_kb", False)]
+
+
+def compare(current: Dict, previous: Dict, threshold: float) -> List[str]:
+    """In bảng so sánh; trả về danh sách regression vượt ngưỡng (tỉ lệ, vd 0.10 = 10%)."""
+    regressions = []
+    prev_eps = previous.get("endpoints", {})
+    print(f"\n== so sánh với {previous.get('meta', {}).get('git_rev') or 'previous'} "
+          f"(ngưỡng {threshold:.0%}) ==")
+    for name, cur in current["endpoints"].items():
+        old = prev_eps.get(name)
+        if not old:
+            print(f"  {name:32} (mới)")
+            continue
+        cells = []
+        for key, higher_is_better in _COMPARE_KEYS:
+            a, b = old.get(key, 0.0), cur.get(key, 0.0)
+            delta = (b - a) / a if a else 0.0
+            worse = -delta if higher_is_better else delta
+            flag = "!" if worse > threshold else " "
+            if flag == "!":
+                regressions.append(f"{name}.{key}: {a:.1f} -> {b:.1f} ({delta:+.0%})")
+            cells.append(f"{key} {delta:+6.0%}{flag}")
+        print(f"  {name:32} " + "  ".join(cells))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark các endpoint qua ASGI app.")
+    ap.add_argument("--pg-url", default=os.getenv("PG_URL"))
+    ap.add_argument("--accounts", type=int, default=3, help="khớp với bench.synthetic")
+    ap.add_argument("--years", type=int, default=5, help="khớp với bench.synthetic")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="số request mỗi endpoint")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--only", nargs="*", help="chỉ chạy endpoint có tên bắt đầu bằng các prefix này")
+    ap.add_argument("--out", default=os.path.join(
+        "bench", "results", datetime.now().strftime("%Y%m%d_%H%M%S") + ".json"))
+    ap.add_argument("--compare", help="file JSON của lần chạy trước")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args()
+
+    if args.pg_url:
+        os.environ["PG_URL"] = args.pg_url
+
+    print(f"[bench] concurrency={args.concurrency} requests={args.requests}")
+    endpoints = asyncio.run(run_suite(args))
+    current = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_rev": git_rev(),
+            "python": platform.python_version(),
+            "accounts": args.accounts,
+            "years": args.years,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "endpoints": endpoints,
+    }
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    print(f"[bench] saved {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        regressions = compare(current, previous, args.threshold)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for r in regressions:
+                print("  " + r)
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
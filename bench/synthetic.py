@@ -0,0 +1,238 @@
+# bench/synthetic.py — sinh dữ liệu giả cho traffic_source_daily, videos, video_daily_stats,
+# video_overview, video_retention vào Postgres local (schema tạo bằng chính các hàm DDL của module_*)
+# + file CSV báo cáo trong REPORT_ROOT/<account>/ cho /api/reports.
+#   PG_URL=postgresql+psycopg2://... python -m bench.synthetic --accounts 3 --videos 200 --years 5
+import argparse
+import csv
+import os
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+from sqlalchemy import create_engine
+
+from data_version import bump_data_version
+from module_columnar import RecordBatch
+from module_content import VIDEO_DAILY_SCHEMA, refresh_daily_cum, save_daily_stats, save_metadata
+from module_drilldown import RETENTION_BUCKETS, ensure_drilldown_schema
+from module_overall import create_video_overview_table
+from module_trafficsource import _traffic_engine
+
+
+SOURCES = [
+    "ADVERTISING", "ANNOTATION", "CAMPAIGN_CARD", "END_SCREEN", "EXT_URL", "HASHTAGS",
+    "NO_LINK_OTHER", "NOTIFICATION", "PLAYLIST", "RELATED_VIDEO", "SHORTS", "SUBSCRIBER",
+    "YT_CHANNEL", "YT_OTHER_PAGE", "YT_PLAYLIST_PAGE", "YT_SEARCH",
+]
+
+END_DAY = date(2025, 1, 1)
+PAGE_SIZE = 5000
+# video / account có đường retention (1 window 28 ngày kết thúc ở END_DAY)
+RETENTION_VIDEOS = 200
+# dataset CSV của /api/reports (tên file = tên dataset)
+REPORT_DAILY = "daily_overview"
+REPORT_TRAFFIC = "traffic_sources__28d"
+
+
+def account_tags(accounts: int) -> List[str]:
+    return [f"bench_{i:03d}" for i in range(accounts)]
+
+
+def video_ids(account_tag: str, videos: int) -> List[str]:
+    return [f"{account_tag}_v{j:05d}" for j in range(videos)]
+
+
+def _insert(raw_conn, sql: str, rows: Iterator[Tuple], page_size: int = PAGE_SIZE) -> int:
+    """execute_values theo page (1 round-trip / page thay vì 1 / dòng)."""
+    n, buf = 0, []
+    with raw_conn.cursor() as cur:
+        for r in rows:
+            buf.append(r)
+            if len(buf) >= page_size:
+                execute_values(cur, sql, buf, page_size=page_size)
+                n, buf = n + len(buf), []
+        if buf:
+            execute_values(cur, sql, buf, page_size=page_size)
+            n += len(buf)
+    return n
+
+
+def _traffic_rows(tag: str, days: np.ndarray, rng: np.random.Generator) -> Iterator[Tuple]:
+    n = len(days) * len(SOURCES)
+    views = rng.poisson(200, n)
+    emw = views * rng.integers(1, 8, n)
+    eng = (views * rng.random(n)).astype(int)
+    avp = rng.random(n) * 100
+    day_str = np.datetime_as_string(days).tolist()
+    for k in range(n):
+        d, s = divmod(k, len(SOURCES))
+        v = int(views[k])
+        avd = int(round(emw[k] * 60 / v)) if v else 0
+        yield (tag, "", day_str[d], SOURCES[s], v, int(emw[k]), avd, float(avp[k]), int(eng[k]))
+
+
+def _video_daily(vids: Sequence[str], published: Sequence[np.datetime64], rng) -> RecordBatch:
+    batch = RecordBatch(VIDEO_DAILY_SCHEMA)
+    end = np.datetime64(END_DAY)
+    for vid, pub in zip(vids, published):
+        days = np.arange(pub, end + 1, dtype="datetime64[D]")
+        n = len(days)
+        views = rng.poisson(50, n)
+        batch.extend_rows(
+            list(zip(
+                np.datetime_as_string(days).tolist(),
+                views.tolist(),
+                (views * rng.integers(1, 6, n)).tolist(),
+                rng.integers(10, 900, n).tolist(),
+                (views // 20).tolist(),
+            )),
+            {"day": 0, "views": 1, "estimated_minutes": 2, "average_view_duration": 3, "likes": 4},
+            const={"video_id": vid},
+        )
+    return batch
+
+
+def _retention_rows(tag: str, vids: Sequence[str], rng) -> Iterator[Tuple]:
+    # đường giữ chân giảm dần + nhiễu, cùng shape với retention_curve() (RETENTION_BUCKETS giá trị)
+    start = END_DAY - timedelta(days=27)
+    x = np.linspace(0.0, 1.0, RETENTION_BUCKETS)
+    for vid in vids:
+        decay = rng.uniform(1.0, 4.0)
+        curve = np.clip(np.exp(-decay * x) + rng.normal(0, 0.02, RETENTION_BUCKETS), 0.0, 1.2)
+        yield tag, vid, start, END_DAY, "ORGANIC", [round(float(v), 4) for v in curve]
+
+
+def _write_reports(report_root: str, tag: str, days: np.ndarray, rng) -> int:
+    """CSV giống export của get_data_from_credentials_token: daily theo ngày + traffic source 28 ngày."""
+    account_dir = os.path.join(report_root, tag)
+    os.makedirs(account_dir, exist_ok=True)
+    views = rng.poisson(5000, len(days))
+    with open(os.path.join(account_dir, f"{REPORT_DAILY}.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["day", "views", "estimatedMinutesWatched", "averageViewDuration", "averageViewPercentage",
+                    "subscribersGained", "likes"])
+        for d, v in zip(np.datetime_as_string(days).tolist(), views):
+            w.writerow([d, int(v), int(v * 3), 180, round(float(rng.uniform(20, 60)), 2), int(v // 300),
+                        int(v // 25)])
+    with open(os.path.join(account_dir, f"{REPORT_TRAFFIC}.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["insightTrafficSourceType", "views", "estimatedMinutesWatched", "averageViewDuration",
+                    "averageViewPercentage"])
+        for src in SOURCES:
+            v = int(rng.poisson(20000))
+            w.writerow([src, v, v * 3, 180, round(float(rng.uniform(20, 60)), 2)])
+    return 2
+
+
+def generate(pg_url: str, accounts: int, videos: int, years: int, seed: int = 42,
+             report_root: str = os.getenv("REPORT_ROOT", "reports")) -> Dict[str, int]:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(END_DAY - timedelta(days=365 * years))
+    days = np.arange(start, np.datetime64(END_DAY) + 1, dtype="datetime64[D]")
+    counts = {"traffic_source_daily": 0, "videos": 0, "video_daily_stats": 0, "video_overview": 0,
+              "video_retention": 0, "report_files": 0}
+
+    # schema: dùng lại DDL của ingest
+    _traffic_engine(pg_url)
+    save_metadata([], "", pg_url)
+    save_daily_stats(RecordBatch(VIDEO_DAILY_SCHEMA), pg_url)
+    create_video_overview_table(pg_url)
+
+    engine = create_engine(pg_url, future=True)
+    tags = account_tags(accounts)
+    with engine.begin() as conn:
+        ensure_drilldown_schema(conn)
+        for table in ("video_daily_stats", "video_daily_cum"):
+            conn.exec_driver_sql(
+                f"DELETE FROM {table} WHERE video_id IN "
+                "(SELECT video_id FROM videos WHERE account_tag LIKE 'bench\\_%%')"
+            )
+        for table in ("traffic_source_daily", "videos", "video_overview", "video_retention"):
+            conn.exec_driver_sql(f"DELETE FROM {table} WHERE account_tag LIKE 'bench\\_%%'")
+
+    for tag in tags:
+        vids = video_ids(tag, videos)
+        offsets = rng.integers(0, len(days), videos)
+        published = [days[o] for o in offsets]
+        pub_str = np.datetime_as_string(np.array(published)).tolist()
+        views = rng.poisson(20000, videos)
+
+        with engine.begin() as conn:
+            raw = conn.connection.dbapi_connection
+            counts["traffic_source_daily"] += _insert(raw, """
+                INSERT INTO traffic_source_daily
+                  (account_tag, channel_id, day, source, views, estimated_minutes_watched,
+                   average_view_duration, average_view_percentage, engaged_views)
+                VALUES %s
+            """, _traffic_rows(tag, days, rng))
+
+            counts["videos"] += _insert(raw, """
+                INSERT INTO videos
+                  (video_id, account_tag, title, thumbnail, published_at, duration, views, likes, comments)
+                VALUES %s
+            """, (
+                (vid, tag, f"Synthetic video {vid}", f"https://i.ytimg.com/vi/{vid}/mqdefault.jpg",
+                 pub, "PT10M", int(v), int(v // 25), int(v // 200))
+                for vid, pub, v in zip(vids, pub_str, views)
+            ))
+
+            counts["video_overview"] += _insert(raw, """
+                INSERT INTO video_overview
+                  (account_tag, video_id, title, thumbnail, publish_date, views, likes, comments,
+                   dislikes, engaged_views, annotation_click_through_rate, annotation_close_rate,
+                   average_view_duration_seconds, shares, subscribers_gained, subscribers_lost)
+                VALUES %s
+            """, (
+                (tag, vid, f"Synthetic video {vid}", f"https://i.ytimg.com/vi/{vid}/hqdefault.jpg",
+                 pub, int(v), int(v // 25), int(v // 200), int(v // 1000), int(v // 2),
+                 0.0, 0.0, float(rng.integers(30, 600)), int(v // 300), int(v // 150), int(v // 900))
+                for vid, pub, v in zip(vids, pub_str, views)
+            ))
+
+            daily = _video_daily(vids, published, rng)
+            counts["video_daily_stats"] += _insert(
+                raw,
+                "INSERT INTO video_daily_stats "
+                "(video_id, day, views, estimated_minutes, average_view_duration, likes) VALUES %s",
+                (t for chunk in daily.iter_tuples(PAGE_SIZE) for t in chunk),
+            )
+            refresh_daily_cum(conn, dict(zip(vids, pub_str)))
+
+            counts["video_retention"] += _insert(raw, """
+                INSERT INTO video_retention
+                  (account_tag, video_id, start_date, end_date, audience_type, watch_ratio)
+                VALUES %s
+            """, _retention_rows(tag, vids[:RETENTION_VIDEOS], rng))
+            bump_data_version(conn, tag)
+
+        counts["report_files"] += _write_reports(report_root, tag, days, rng)
+        print(f"[bench] {tag}: {videos} videos, {len(days)} days")
+
+    with engine.begin() as conn:
+        for table in [t for t in counts if t != "report_files"] + ["video_daily_cum"]:
+            conn.exec_driver_sql(f"ANALYZE {table}")
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sinh dữ liệu benchmark vào Postgres (PG_URL).")
+    ap.add_argument("--pg-url", default=os.getenv("PG_URL"))
+    ap.add_argument("--accounts", type=int, default=3)
+    ap.add_argument("--videos", type=int, default=200)
+    ap.add_argument("--years", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--report-root", default=os.getenv("REPORT_ROOT", "reports"),
+                    help="thư mục CSV của /api/reports (mặc định như routes/reports.py)")
+    args = ap.parse_args()
+    if not args.pg_url:
+        raise SystemExit("Thiếu PG_URL (hoặc --pg-url).")
+
+    t0 = time.perf_counter()
+    counts = generate(args.pg_url, args.accounts, args.videos, args.years, args.seed, args.report_root)
+    print(f"[bench] done in {time.perf_counter() - t0:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
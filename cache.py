@@ -0,0 +1,90 @@
+# cache.py — TTL cache in-process cho kết quả endpoint (hit/miss đếm qua metrics.record_cache)
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+from data_version import ALL_ACCOUNTS
+from metrics import record_cache
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU + TTL, thread-safe. Mỗi cache có tên riêng (label của cache_requests_total)."""
+
+    def __init__(self, name: str, ttl_s: float = 60.0, maxsize: int = 256):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        _CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                value = item[1]
+            else:
+                if item is not None:
+                    del self._data[key]
+                value = _MISSING
+        record_cache(self.name, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        # 2 request cùng miss thì cùng tính (không khóa theo key) — chấp nhận được với TTL ngắn
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+
+_CACHES: Dict[str, TTLCache] = {}
+
+
+def get_cache(name: str) -> Optional[TTLCache]:
+    return _CACHES.get(name)
+
+
+def clear_all():
+    for c in list(_CACHES.values()):
+        c.clear()
+
+
+def _mentions(key: Hashable, names: Set[str]) -> bool:
+    if isinstance(key, tuple):
+        return any(_mentions(k, names) for k in key)
+    return isinstance(key, str) and key in names
+
+
+def invalidate_account(account_tag: str) -> int:
+    """
+    Bỏ entry có key chứa account_tag (hoặc "all" / ALL_ACCOUNTS: kết quả gộp mọi account) trong mọi cache,
+    vd sau khi ingest xong 1 account. Trả về số entry đã bỏ.
+    """
+    names = {account_tag, "all", ALL_ACCOUNTS}
+    return sum(c.discard_where(lambda k: _mentions(k, names)) for c in list(_CACHES.values()))
@@ -0,0 +1,193 @@
+# capabilities.py — ghi nhớ các tổ hợp query YouTube Analytics mà API trả "không hỗ trợ",
+# lưu ra file JSON để lần chạy sau không gọi lại (mỗi lần thử hỏng vẫn tốn quota + 1 round-trip).
+# Key = (ids mode, dimensions, metrics, dimension trong filters, có maxResults); ids mode = "channel" | "contentOwner".
+# Entry "unsupported" hết hạn sau CAPABILITY_UNSUPPORTED_TTL_S (API có thể đổi / hint khớp nhầm).
+# Thêm: kết quả probe metric theo (channel/owner ID, metric, dimension), có TTL.
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from googleapiclient.errors import HttpError
+
+
+CAPABILITY_CACHE_PATH = os.getenv("CAPABILITY_CACHE_PATH", os.path.join("reports", "_capabilities.json"))
+# probe theo channel/owner hết hạn sau khoảng này (kênh bật kiếm tiền, được cấp quyền, ...)
+CAPABILITY_TTL_S = float(os.getenv("CAPABILITY_TTL_S", str(7 * 24 * 3600)))
+CAPABILITY_UNSUPPORTED_TTL_S = float(os.getenv("CAPABILITY_UNSUPPORTED_TTL_S", str(30 * 24 * 3600)))
+
+# đoạn message của HTTP 400 khi tổ hợp dimension/metric không hợp lệ (không phải lỗi tạm thời);
+# không dùng "not supported" trơn: khớp cả lỗi chỉ do thiếu filter / sort của riêng request đó
+_UNSUPPORTED_HINTS = (
+    "query is not supported",
+    "unknown identifier",
+)
+
+
+def ids_mode(ids: str) -> str:
+    """'channel==MINE' -> 'channel', 'contentOwner==XYZ' -> 'contentOwner'."""
+    return ids.split("==", 1)[0].strip()
+
+
+def capability_key(ids: str, dimensions: str, metrics: Union[str, Iterable[str]],
+                   filters: str = "", max_results=None) -> str:
+    """
+    Chỉ lấy tên dimension trong filters (không lấy giá trị: video==a,b và video==c cùng 1 key);
+    cùng dims/metrics nhưng có / không filter hay maxResults là tổ hợp khác nhau với API.
+    """
+    if isinstance(metrics, str):
+        metrics = metrics.split(",")
+    mets = ",".join(sorted(m.strip() for m in metrics if m.strip()))
+    fdims = ",".join(sorted({f.split("==", 1)[0].strip() for f in (filters or "").split(";") if f.strip()}))
+    top = "top" if max_results else ""
+    return f"{ids_mode(ids)}|{dimensions}|{mets}|{fdims}|{top}"
+
+
+def probe_key(owner_id: str, metric: str, dimension: str = "day") -> str:
+    return f"{owner_id}|{dimension}|{metric}"
+
+
+def is_unsupported_error(e: HttpError) -> bool:
+    if getattr(e.resp, "status", None) != 400:
+        return False
+    content = e.content or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    content = content.lower()
+    return any(h in content for h in _UNSUPPORTED_HINTS)
+
+
+class CapabilityCache:
+    """
+    Thread-safe, 2 loại entry:
+      unsupported : tổ hợp query API không hỗ trợ (hết hạn sau CAPABILITY_UNSUPPORTED_TTL_S)
+      probes      : metric có dùng được với 1 channel/owner hay không (hết hạn sau CAPABILITY_TTL_S)
+    Ghi vào RAM, flush() merge với file hiện tại rồi ghi atomic (nhiều process dùng chung 1 file).
+    """
+
+    def __init__(self, path: str = CAPABILITY_CACHE_PATH, ttl_s: float = CAPABILITY_TTL_S,
+                 unsupported_ttl_s: float = CAPABILITY_UNSUPPORTED_TTL_S):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.unsupported_ttl_s = unsupported_ttl_s
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries, self._probes = self._load()
+
+    def _load(self) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data.get("unsupported", {}), data.get("probes", {})
+        except (OSError, ValueError) as e:
+            print(f"[capabilities] bỏ qua cache hỏng {self.path}: {e}")
+            return {}, {}
+
+    def unsupported(self, key: str) -> Optional[Dict]:
+        """Entry còn hạn, None nếu chưa biết / đã hết hạn (lần sau gọi API thử lại)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() - entry.get("at", 0) > self.unsupported_ttl_s:
+            return None
+        return entry
+
+    def mark_unsupported(self, key: str, reason: str = ""):
+        with self._lock:
+            self._entries[key] = {"reason": reason[:300], "at": int(time.time())}
+            self._dirty = True
+
+    def probe(self, key: str) -> Optional[bool]:
+        """Kết quả probe còn hạn, None nếu chưa probe / đã hết hạn."""
+        with self._lock:
+            entry = self._probes.get(key)
+        if entry is None or time.time() - entry.get("at", 0) > self.ttl_s:
+            return None
+        return bool(entry["ok"])
+
+    def record_probe(self, key: str, ok: bool):
+        with self._lock:
+            self._probes[key] = {"ok": bool(ok), "at": int(time.time())}
+            self._dirty = True
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            ours = (dict(self._entries), dict(self._probes))
+            self._dirty = False
+        # process khác có thể đã ghi thêm entry từ lúc _load -> merge (entry của mình thắng)
+        disk_entries, disk_probes = self._load()
+        now = time.time()
+        entries = {k: v for k, v in {**disk_entries, **ours[0]}.items()
+                   if now - v.get("at", 0) <= self.unsupported_ttl_s}
+        probes = {k: v for k, v in {**disk_probes, **ours[1]}.items() if now - v.get("at", 0) <= self.ttl_s}
+        with self._lock:
+            self._entries = {**entries, **self._entries}
+            self._probes = {**probes, **self._probes}
+
+        data = {"unsupported": dict(sorted(entries.items())), "probes": dict(sorted(probes.items()))}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+
+_default: Optional[CapabilityCache] = None
+_default_lock = threading.Lock()
+
+
+def get_capabilities() -> CapabilityCache:
+    """Cache dùng chung trong process (đọc file 1 lần)."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = CapabilityCache()
+    return _default
+
+
+# reason (error.errors[].reason) của 403 là quota / rate limit -> lỗi tạm thời, không phải "không có quyền"
+_QUOTA_REASONS = {"quotaExceeded", "rateLimitExceeded", "userRateLimitExceeded", "dailyLimitExceeded"}
+# 403 chắc chắn do kênh / token không có quyền đọc metric
+_FORBIDDEN_REASONS = {"forbidden", "insufficientPermissions"}
+
+
+def _error_reasons(e: HttpError) -> set:
+    content = e.content or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    try:
+        errors = json.loads(content)["error"].get("errors") or []
+        return {x.get("reason") for x in errors if isinstance(x, dict)}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return set()
+
+
+def is_quota_error(e: HttpError) -> bool:
+    if getattr(e.resp, "status", None) not in (403, 429):
+        return False
+    return bool(_error_reasons(e) & _QUOTA_REASONS) or "quota" in error_reason(e).lower()
+
+
+def is_forbidden_error(e: HttpError) -> bool:
+    """403 do thiếu quyền (không phải quota): kết quả probe ghi nhớ được."""
+    if getattr(e.resp, "status", None) != 403 or is_quota_error(e):
+        return False
+    reason = error_reason(e).lower()
+    return (bool(_error_reasons(e) & _FORBIDDEN_REASONS)
+            or "forbidden" in reason or "insufficient" in reason or "permission" in reason)
+
+
+def error_reason(e: HttpError) -> str:
+    content = e.content or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    try:
+        return json.loads(content)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return content
+
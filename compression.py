@@ -0,0 +1,221 @@
+# compression.py — nén response (zstd / br / gzip theo Accept-Encoding), pure ASGI.
+# - body nhỏ hơn ngưỡng: gửi nguyên
+# - response 1 mảnh: nén 1 lần; body lớn -> nén trong threadpool, không chặn event loop
+# - streaming (more_body): nén từng chunk + flush để client nhận dần
+# zstandard / brotli là optional: thiếu thư viện thì chỉ còn gzip.
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# body >= ngưỡng này nén trong threadpool
+COMPRESS_OFFLOAD_SIZE = int(os.getenv("COMPRESS_OFFLOAD_SIZE", str(256 * 1024)))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+
+_COMPRESSIBLE = (
+    "application/json", "application/x-ndjson", "text/", "application/javascript", "application/xml",
+)
+
+
+# ===== Encoders =====
+class _Encoder:
+    """compress(chunk) trả về dữ liệu đã flush (client giải nén được ngay); finish() kết thúc stream."""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        raise NotImplementedError
+
+
+class _GzipEncoder(_Encoder):
+    def __init__(self):
+        self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+class _BrotliEncoder(_Encoder):
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _ZstdEncoder(_Encoder):
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+# thứ tự ưu tiên của server khi client chấp nhận nhiều encoding
+ENCODERS: Dict[str, type] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdEncoder
+if brotli is not None:
+    ENCODERS["br"] = _BrotliEncoder
+ENCODERS["gzip"] = _GzipEncoder
+
+
+def compress_all(encoding: str, body: bytes) -> bytes:
+    enc = ENCODERS[encoding]()
+    return enc.compress(body) + enc.finish()
+
+
+def negotiate(accept_encoding: str, available=None) -> Optional[str]:
+    """Chọn encoding từ header Accept-Encoding (có q-value); None = không nén."""
+    available = list(available or ENCODERS)
+    q: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name] = weight
+
+    best, best_q = None, 0.0
+    for enc in available:
+        weight = q.get(enc, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = enc, weight
+    return best
+
+
+# ===== Middleware =====
+def _vary(start) -> List[Tuple[bytes, bytes]]:
+    """
+    Header của response có thể nén (nén hay không): thêm Vary: Accept-Encoding, ETag -> weak.
+    Cùng ETag cho nhiều encoding phải là weak (If-None-Match so sánh weak vẫn khớp); 200 và 304
+    luôn cùng dạng để client / cache không thấy 2 ETag khác nhau cho 1 biểu diễn.
+    """
+    out, vary = [], []
+    for k, v in start.get("headers", []):
+        lk = k.lower()
+        if lk == b"vary":
+            vary.extend(p.strip() for p in v.split(b",") if p.strip())
+            continue
+        if lk == b"etag" and not v.startswith(b"W/"):
+            v = b"W/" + v
+        out.append((k, v))
+    if b"accept-encoding" not in (p.lower() for p in vary):
+        vary.append(b"Accept-Encoding")
+    out.append((b"vary", b", ".join(vary)))
+    return out
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, offload_size: int = COMPRESS_OFFLOAD_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        state = {"start": None, "encoder": None, "passthrough": False}
+
+        async def _compress(encoder: _Encoder, data: bytes, final: bool) -> bytes:
+            if len(data) >= self.offload_size:
+                out = await run_in_threadpool(encoder.compress, data)
+            else:
+                out = encoder.compress(data)
+            return out + encoder.finish() if final else out
+
+        def _headers(start, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+            out = [(k, v) for k, v in _vary(start) if k.lower() != b"content-length"]
+            out.append((b"content-encoding", encoding.encode()))
+            if length is not None:
+                out.append((b"content-length", str(length).encode()))
+            return out
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                resp_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                ctype = resp_headers.get(b"content-type", b"").decode("latin-1")
+                if message["status"] == 304 or (
+                    encoding is None and ctype.startswith(_COMPRESSIBLE) and b"content-encoding" not in resp_headers
+                ):
+                    # không nén nhưng biểu diễn phụ thuộc Accept-Encoding: cùng Vary + ETag weak như
+                    # response nén, cache dùng chung không trả nhầm bản identity/nén cho client khác
+                    state["passthrough"] = True
+                    await send({**message, "headers": _vary(message)})
+                elif (
+                    encoding is None
+                    or message["status"] < 200 or message["status"] == 204
+                    or b"content-encoding" in resp_headers
+                    or not ctype.startswith(_COMPRESSIBLE)
+                ):
+                    state["passthrough"] = True
+                    await send(message)
+                else:
+                    state["start"] = message  # chờ body đầu tiên mới quyết định
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            start = state["start"]
+
+            if start is not None:
+                state["start"] = None
+                if not more:
+                    # response 1 mảnh
+                    if len(body) < self.minimum_size:
+                        state["passthrough"] = True
+                        await send({**start, "headers": _vary(start)})
+                        await send(message)
+                        return
+                    data = await _compress(ENCODERS[encoding](), body, final=True)
+                    await send({**start, "headers": _headers(start, len(data))})
+                    await send({"type": "http.response.body", "body": data, "more_body": False})
+                    return
+                # streaming: không biết tổng kích thước -> bỏ content-length, nén từng chunk
+                state["encoder"] = ENCODERS[encoding]()
+                await send({**start, "headers": _headers(start, None)})
+
+            data = await _compress(state["encoder"], body, final=not more)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, _send)
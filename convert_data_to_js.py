@@ -1,9 +1,13 @@
-import csv, io, os, sys, hashlib, re, glob
+import argparse, json, os, sys, hashlib, re
+from concurrent.futures import ProcessPoolExecutor
 
+from csv_stream import JsArrayWriter, atomic_output
+from report_datasets import extract_period, traffic_items
 
-INPUT_ROOT = r"C:\Users\Admin\Documents\dev\26_8_2025\python_backend\reports"
 
-OUTPUT_ROOT = r"C:\Users\Admin\Documents\dev\26_8_2025\react-dashboard\src\data\channels"
+INPUT_ROOT = os.getenv("CONVERT_INPUT_ROOT", r"C:\Users\Admin\Documents\dev\26_8_2025\python_backend\reports")
+
+OUTPUT_ROOT = os.getenv("CONVERT_OUTPUT_ROOT", r"C:\Users\Admin\Documents\dev\26_8_2025\react-dashboard\src\data\channels")
 
 BASE_OUTNAME = "TrafficSource"
 
@@ -12,64 +16,8 @@ PERIODS = {"7d", "28d", "90d", "365d", "30d", "lifetime", "2025", "2024"}
 
 # ============ HELPERS ============
 
-def sniff_delimiter(sample_bytes: bytes, fallback=","):
-    try:
-        dialect = csv.Sniffer().sniff(sample_bytes.decode("utf-8", errors="ignore"))
-        return dialect.delimiter
-    except Exception:
-        return fallback
-
-def hsl_from_text(s: str) -> str:
-    h = int(hashlib.md5(s.encode("utf-8")).hexdigest(), 16) % 360
-    return f"hsl({h}, 70%, 50%)"
-
-def to_number(s, default=0.0):
-    try:
-        return float((s or "0").replace(",", ""))
-    except Exception:
-        return default
-
-def safe_js_str(s: str) -> str:
-    return s.replace("\\", "\\\\").replace('"', '\\"')
-
 def parse_csv_items(csv_path: str):
-    with open(csv_path, "rb") as fb:
-        raw = fb.read()
-    if not raw.strip():
-        return []
-
-    delim = sniff_delimiter(raw[:4096])
-    text = raw.decode("utf-8-sig", errors="replace")
-    reader = csv.DictReader(io.StringIO(text), delimiter=delim)
-    if not reader.fieldnames:
-        return []
-
-    rows = [
-        {(k or "").strip(): (v or "").strip() for k, v in r.items()}
-        for r in reader
-        if any((v or "").strip() for v in r.values())
-    ]
-
-    items = []
-    for r in rows:
-        idv = r.get("insightTrafficSourceType") or r.get("id") or ""
-        if not idv:
-            continue
-        item = {
-            "id": idv,
-            "label": idv,
-            "value": to_number(r.get("views", "0")),
-            "color": hsl_from_text(idv),
-            "views": int(to_number(r.get("views", "0"))),
-            "estimatedMinutesWatched": int(to_number(r.get("estimatedMinutesWatched", "0"))),
-            "averageViewDuration": int(to_number(r.get("averageViewDuration", "0"))),
-            "averageViewPercentage": float(to_number(r.get("averageViewPercentage", "0"))),
-            "engagedViews": int(to_number(r.get("engagedViews", "0"))),
-        }
-        items.append(item)
-
-    items.sort(key=lambda x: x["views"], reverse=True)
-    return items
+    return traffic_items(csv_path)
 
 _SANITIZE_RE = re.compile(r"[^A-Za-z0-9_\-\.]+")
 def sanitize_path_component(name: str) -> str:
@@ -84,81 +32,160 @@ def extract_period_or_basename(csv_path: str):
       - Ngược lại: (basename_khong_ext_sanitized, False)
     """
     name = os.path.splitext(os.path.basename(csv_path))[0]
-    rx = re.compile(
-        r"^traffic[_\-\.\s]*sources?[_\-\.\s]+(7d|28d|90d|365d|30d|lifetime|2025|2024)$",
-        re.IGNORECASE,
-    )
-    m = rx.match(name)
-    if m:
-        return (m.group(1).lower(), True)
+    period = extract_period(name)
+    if period:
+        return (period, True)
     # fallback: dùng chính basename
     return (sanitize_path_component(name), False)
 
-def write_js(out_path: str, items, tag: str, is_period: bool):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as out:
-        out.write("// Auto-generated. Do not edit manually.\n")
-        if is_period:
-            out.write(f'export const period = "{tag}";\n')
-        else:
-            out.write(f'export const datasetTag = "{tag}";\n')
-        out.write("export const traffic_source = [\n")
-        for it in items:
-            out.write("  {\n")
-            for k, v in it.items():
-                if isinstance(v, (int, float)):
-                    out.write(f"    {k}: {v},\n")
-                else:
-                    out.write(f'    {k}: "{safe_js_str(v)}",\n')
-            out.write("  },\n")
-        out.write("];\n")
-        out.write("export default traffic_source;\n")
+def write_js(out_path: str, items, tag: str, is_period: bool) -> bool:
+    """
+    Ghi dần ra file tạm rồi mới thay thế: chỉ os.replace khi nội dung khác file cũ
+    (không đổi mtime -> dev server React không rebuild). Trả về True nếu file đã thay đổi.
+    """
+    preamble = ["// Auto-generated. Do not edit manually."]
+    if is_period:
+        preamble.append(f'export const period = "{tag}";')
+    else:
+        preamble.append(f'export const datasetTag = "{tag}";')
+    with atomic_output(out_path) as out:
+        with JsArrayWriter(out, "traffic_source", preamble, default_export=True) as js:
+            for it in items:
+                js.write(it)
+    return out.changed
+
+# ============ INCREMENTAL BUILD ============
+# manifest: csv (tương đối INPUT_ROOT) -> size, mtime_ns, sha1 nội dung, file js (tương đối OUTPUT_ROOT)
+# - size + mtime giống -> bỏ qua không cần đọc file
+# - khác mtime nhưng sha1 giống (copy lại, touch) -> chỉ cập nhật manifest
+# - converter đổi code -> "converter" khác -> build lại toàn bộ
+MANIFEST_NAME = ".convert_manifest.json"
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def converter_version() -> str:
+    # code parse/format nằm ở cả csv_stream + report_datasets
+    here = os.path.dirname(os.path.abspath(__file__))
+    return "".join(file_sha1(os.path.join(here, f))[:12]
+                   for f in ("convert_data_to_js.py", "csv_stream.py", "report_datasets.py"))
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("converter") != converter_version():
+        return {}
+    return data.get("files", {})
+
+def save_manifest(path: str, files: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"converter": converter_version(), "files": files}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def output_path_for(csv_path: str) -> str:
+    # Tính đường dẫn tương đối so với INPUT_ROOT để giữ cấu trúc
+    rel_dir = os.path.relpath(os.path.dirname(csv_path), INPUT_ROOT)
+    # Sanitize từng thành phần thư mục để tránh ký tự lạ
+    safe_parts = [sanitize_path_component(p) for p in rel_dir.split(os.sep) if p not in (".", "")]
+    base_no_ext = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(OUTPUT_ROOT, *safe_parts, base_no_ext + ".js")
+
+def discover_csv_files():
+    for dirpath, dirnames, filenames in os.walk(INPUT_ROOT):
+        for f in sorted(filenames):
+            if f.lower().endswith(".csv"):
+                yield os.path.join(dirpath, f)
+
+def convert_one(csv_path: str, out_path: str):
+    """Chạy trong process pool: (số item, file js có đổi không, lỗi)."""
+    try:
+        items = parse_csv_items(csv_path)
+        tag, is_period = extract_period_or_basename(csv_path)
+        return len(items), write_js(out_path, items, tag, is_period), None
+    except Exception as e:
+        return 0, False, str(e)
+
+def build(full: bool = False, workers: int = 0):
+    manifest_path = os.path.join(OUTPUT_ROOT, MANIFEST_NAME)
+    old = {} if full else load_manifest(manifest_path)
+    new = {}
+    todo = []  # (rel, csv_path, out_path, entry)
+    unchanged = 0
+
+    for csv_path in discover_csv_files():
+        rel = os.path.relpath(csv_path, INPUT_ROOT)
+        out_path = output_path_for(csv_path)
+        st = os.stat(csv_path)
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                 "out": os.path.relpath(out_path, OUTPUT_ROOT)}
+        prev = old.get(rel)
+        if prev and prev.get("out") == entry["out"] and os.path.exists(out_path):
+            if prev["size"] == entry["size"] and prev["mtime_ns"] == entry["mtime_ns"]:
+                new[rel] = prev
+                unchanged += 1
+                continue
+            entry["sha1"] = file_sha1(csv_path)
+            if entry["sha1"] == prev.get("sha1"):
+                new[rel] = entry
+                unchanged += 1
+                continue
+        entry.setdefault("sha1", None)
+        todo.append((rel, csv_path, out_path, entry))
+
+    made = rewritten = skipped = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or None) as ex:
+            results = ex.map(convert_one, [t[1] for t in todo], [t[2] for t in todo])
+            for (rel, csv_path, out_path, entry), (n_items, changed, err) in zip(todo, results):
+                if err:
+                    print(f"✗ Lỗi đọc {csv_path}: {err}")
+                    skipped += 1
+                    continue
+                entry["sha1"] = entry["sha1"] or file_sha1(csv_path)
+                new[rel] = entry
+                made += 1
+                rewritten += changed
+                print(f"→ Xuất {out_path} ({n_items} items{'' if changed else ', không đổi'})")
+
+    # CSV đã bị xóa -> xóa file js do converter sinh ra trước đó
+    removed = 0
+    for rel, prev in old.items():
+        if rel not in new and not os.path.exists(os.path.join(INPUT_ROOT, rel)):
+            out_path = os.path.join(OUTPUT_ROOT, prev["out"])
+            if os.path.exists(out_path):
+                os.remove(out_path)
+                removed += 1
+                print(f"✗ Xóa {out_path} (CSV nguồn không còn)")
+
+    save_manifest(manifest_path, new)
+    return {"made": made, "rewritten": rewritten, "unchanged": unchanged, "skipped": skipped, "removed": removed}
 
 # ============ MAIN ============
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="CSV (reports/) -> JS (react-dashboard), chỉ build lại file đã đổi.")
+    ap.add_argument("--full", action="store_true", help="bỏ qua manifest, convert lại toàn bộ")
+    ap.add_argument("--workers", type=int, default=0, help="số process (mặc định = số CPU)")
+    args = ap.parse_args()
+
     if not os.path.isdir(INPUT_ROOT):
         print(f"Không tìm thấy thư mục: {INPUT_ROOT}")
         sys.exit(1)
 
-    made = 0
-    skipped = 0
-
-    # Duyệt đệ quy qua tất cả thư mục con
-    for dirpath, dirnames, filenames in os.walk(INPUT_ROOT):
-        # Lấy danh sách *.csv trong thư mục hiện tại
-        csv_files = [os.path.join(dirpath, f) for f in filenames if f.lower().endswith(".csv")]
-        if not csv_files:
-            continue
-
-        # Tính đường dẫn tương đối so với INPUT_ROOT để giữ cấu trúc
-        rel_dir = os.path.relpath(dirpath, INPUT_ROOT)
-        # Sanitize từng thành phần thư mục để tránh ký tự lạ
-        safe_parts = [sanitize_path_component(p) for p in rel_dir.split(os.sep) if p not in (".", "")]
-        safe_rel_dir = os.path.join(*safe_parts) if safe_parts else ""
-        out_base_dir = os.path.join(OUTPUT_ROOT, safe_rel_dir)
-
-        # Xử lý từng CSV
-        for csv_path in sorted(csv_files):
-            try:
-                items = parse_csv_items(csv_path)
-            except Exception as e:
-                print(f"✗ Lỗi đọc {csv_path}: {e}")
-                skipped += 1
-                continue
-
-            tag, is_period = extract_period_or_basename(csv_path)  
-            base_no_ext = os.path.splitext(os.path.basename(csv_path))[0]
-            out_name = base_no_ext + ".js"  
-            out_path = os.path.join(out_base_dir, out_name)
-
-
-            write_js(out_path, items, tag, is_period)
-            made += 1
-            print(f"→ Xuất {out_path} ({len(items)} items)")
+    stats = build(full=args.full, workers=args.workers)
 
-    if made == 0:
+    if stats["made"] == 0 and stats["unchanged"] == 0:
         print("Không tạo được file JS nào.")
         sys.exit(1)
 
-    print(f"Hoàn tất: đã tạo {made} file JS trong {OUTPUT_ROOT}. Skipped: {skipped}.")
+    print(f"Hoàn tất: {stats['made']} file convert ({stats['rewritten']} thay đổi), "
+          f"{stats['unchanged']} không đổi, {stats['removed']} xóa trong {OUTPUT_ROOT}. Skipped: {stats['skipped']}.")
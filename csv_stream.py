@@ -0,0 +1,251 @@
+# csv_stream.py — đọc CSV export (reports/) dạng stream + ghi JS/JSON dần, dùng chung cho các script convert_*.
+# - dò delimiter từ SNIFF_BYTES đầu file, decode utf-8-sig, không đọc cả file vào RAM
+# - converter theo cột được "compile" 1 lần theo header (không try/except từng ô ở đường nhanh)
+# - JsArrayWriter / JsonArrayWriter ghi từng item; atomic_output chỉ thay file khi nội dung khác
+import csv
+import filecmp
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+SNIFF_BYTES = 4096
+
+
+# ===== Helpers =====
+def sniff_delimiter(sample_bytes: bytes, fallback=","):
+    try:
+        dialect = csv.Sniffer().sniff(sample_bytes.decode("utf-8", errors="ignore"))
+        return dialect.delimiter
+    except Exception:
+        return fallback
+
+
+def hsl_from_text(s: str) -> str:
+    h = int(hashlib.md5(s.encode("utf-8")).hexdigest(), 16) % 360
+    return f"hsl({h}, 70%, 50%)"
+
+
+def safe_js_str(s: str) -> str:
+    return s.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# ===== Converters =====
+# ô rỗng -> 0; "1,234" -> 1234 (export của YouTube Studio có dấu phẩy hàng nghìn)
+def _to_float(s: str) -> float:
+    return float(s.replace(",", "")) if s else 0.0
+
+
+def _to_int(s: str) -> int:
+    return int(float(s.replace(",", ""))) if s else 0
+
+
+def _to_str(s: str) -> str:
+    return s
+
+
+CONVERTERS: Dict[str, Callable[[str], object]] = {"float": _to_float, "int": _to_int, "str": _to_str}
+_DEFAULTS = {"float": 0.0, "int": 0, "str": ""}
+
+
+def compile_row_parser(fieldnames: Sequence[str], types: Optional[Dict[str, str]] = None):
+    """
+    Header + {cột: "int"|"float"|"str"} -> hàm list[str] -> dict (cột không khai báo giữ str).
+    Đường nhanh convert cả dòng không try/except từng ô; dòng có ô hỏng mới convert từng ô với default.
+    """
+    types = types or {}
+    plan: List[Tuple[str, int, Callable, object]] = []
+    for i, name in enumerate(fieldnames):
+        kind = types.get(name, "str")
+        plan.append((name, i, CONVERTERS[kind], _DEFAULTS[kind]))
+    width = len(fieldnames)
+
+    def _slow(cells: List[str]) -> Dict:
+        out = {}
+        for name, i, conv, default in plan:
+            try:
+                out[name] = conv(cells[i])
+            except ValueError:
+                out[name] = default
+        return out
+
+    def parse(raw: List[str]) -> Dict:
+        cells = [c.strip() for c in raw[:width]]
+        if len(cells) < width:
+            cells.extend([""] * (width - len(cells)))
+        try:
+            return {name: conv(cells[i]) for name, i, conv, _ in plan}
+        except ValueError:
+            return _slow(cells)
+
+    return parse
+
+
+class CsvStream:
+    """
+    Iterate các dòng (dict đã convert) của 1 file CSV, bỏ dòng trống.
+    fieldnames / delimiter có sau khi bắt đầu iterate (hoặc gọi open_header()).
+    """
+
+    def __init__(self, path: str, types: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.types = types or {}
+        self.delimiter: Optional[str] = None
+        self.fieldnames: Optional[List[str]] = None
+
+    def _sniff(self):
+        with open(self.path, "rb") as fb:
+            self.delimiter = sniff_delimiter(fb.read(SNIFF_BYTES))
+
+    def open_header(self) -> Optional[List[str]]:
+        """Chỉ đọc header (vd để kiểm tra cột trước khi convert); None nếu file rỗng."""
+        self._sniff()
+        with open(self.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            header = next(csv.reader(f, delimiter=self.delimiter), None)
+        self.fieldnames = [h.strip() for h in header] if header else None
+        return self.fieldnames
+
+    def __iter__(self) -> Iterator[Dict]:
+        self._sniff()
+        with open(self.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, None)
+            if not header:
+                return
+            self.fieldnames = [h.strip() for h in header]
+            parse = compile_row_parser(self.fieldnames, self.types)
+            for raw in reader:
+                if any(c.strip() for c in raw):
+                    yield parse(raw)
+
+
+# ===== Day gap filling (stream) =====
+class UnsortedDaysError(ValueError):
+    """Dòng không theo thứ tự ngày tăng dần / ngày không parse được -> cần đường bù ngày đầy đủ (pandas)."""
+
+
+def fill_day_gaps(rows: Iterable[Dict], fieldnames: Sequence[str], day_key: str = "day",
+                  numeric_fields: Sequence[str] = ()) -> Iterator[Dict]:
+    """
+    Bù ngày thiếu cho dữ liệu đã sort theo ngày (export reports.query sort=day), không giữ cả file.
+    Dòng bù: cột số -> 0, cột khác -> "". Gặp ngày lùi / không hợp lệ -> UnsortedDaysError.
+    """
+    numeric = set(numeric_fields)
+    prev: Optional[date] = None
+    for r in rows:
+        try:
+            cur = date.fromisoformat(str(r.get(day_key, ""))[:10])
+        except ValueError:
+            raise UnsortedDaysError(f"ngày không hợp lệ: {r.get(day_key)!r}")
+        if prev is not None:
+            if cur < prev:
+                raise UnsortedDaysError(f"{cur} sau {prev}")
+            d = prev + timedelta(days=1)
+            while d < cur:
+                filler = {k: (0 if k in numeric else "") for k in fieldnames}
+                filler[day_key] = d.isoformat()
+                yield filler
+                d += timedelta(days=1)
+        prev = cur
+        yield r
+
+
+# ===== Writers =====
+@contextmanager
+def atomic_output(out_path: str):
+    """
+    Ghi vào file tạm; xong mới os.replace và chỉ khi nội dung khác file cũ
+    (mtime không đổi -> dev server React không rebuild). `changed` của handle cho biết kết quả.
+    """
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    handle = _Output(tmp_path)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            handle.file = f
+            yield handle
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if os.path.exists(out_path) and filecmp.cmp(tmp_path, out_path, shallow=False):
+        os.remove(tmp_path)
+        handle.changed = False
+    else:
+        os.replace(tmp_path, out_path)
+        handle.changed = True
+
+
+class _Output:
+    def __init__(self, tmp_path: str):
+        self.tmp_path = tmp_path
+        self.file = None
+        self.changed = False
+
+    def write(self, s: str):
+        self.file.write(s)
+
+
+class JsArrayWriter:
+    """
+    `export const <name> = [ {...}, ... ];` ghi dần từng object.
+    formats: {key: "{:.2f}"} cho số cần format cố định.
+    """
+
+    def __init__(self, out, name: str, preamble: Sequence[str] = (), default_export: bool = False,
+                 formats: Optional[Dict[str, str]] = None):
+        self.out = out
+        self.name = name
+        self.preamble = preamble
+        self.default_export = default_export
+        self.formats = formats or {}
+        self.count = 0
+
+    def __enter__(self):
+        for line in self.preamble:
+            self.out.write(line + "\n")
+        self.out.write(f"export const {self.name} = [\n")
+        return self
+
+    def write(self, item: Dict):
+        out = self.out
+        out.write("  {\n")
+        for k, v in item.items():
+            if isinstance(v, (int, float)):
+                fmt = self.formats.get(k)
+                out.write(f"    {k}: {fmt.format(v) if fmt else v},\n")
+            else:
+                out.write(f'    {k}: "{safe_js_str(v)}",\n')
+        out.write("  },\n")
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.out.write("];\n")
+            if self.default_export:
+                self.out.write(f"export default {self.name};\n")
+        return False
+
+
+class JsonArrayWriter:
+    """Mảng JSON ghi dần từng item (1 item / dòng)."""
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def __enter__(self):
+        self.out.write("[")
+        return self
+
+    def write(self, item: Dict):
+        self.out.write(("\n" if self.count == 0 else ",\n") + json.dumps(item, ensure_ascii=False))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.out.write("\n]\n")
+        return False
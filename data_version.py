@@ -0,0 +1,50 @@
+# data_version.py — version dữ liệu theo account_tag, tăng mỗi lần ingest ghi xong.
+# Dùng để tính ETag / Last-Modified (http_cache.py) mà không cần chạy query chính.
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+
+
+# dòng "*" tăng cùng mọi account -> version chung cho request không gắn với account cụ thể
+ALL_ACCOUNTS = "*"
+
+_DDL = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        account_tag TEXT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+_BUMP = """
+    INSERT INTO data_versions (account_tag, version, updated_at)
+    VALUES (:tag, 1, now()), (:all, 1, now())
+    ON CONFLICT (account_tag)
+    DO UPDATE SET
+        version = data_versions.version + 1,
+        updated_at = now();
+"""
+
+
+def bump_data_version(conn, account_tag: str):
+    """Gọi trong transaction ghi dữ liệu của account (commit cùng lúc với dữ liệu)."""
+    conn.execute(text(_DDL))
+    conn.execute(text(_BUMP), {"tag": account_tag, "all": ALL_ACCOUNTS})
+
+
+def read_data_versions(conn, account_tags: Iterable[str]) -> Dict[str, Tuple[int, object]]:
+    """account_tag -> (version, updated_at); account chưa ingest lần nào thì không có trong dict."""
+    tags = list(account_tags)
+    if not tags:
+        return {}
+    rows = conn.execute(
+        text("SELECT account_tag, version, updated_at FROM data_versions WHERE account_tag = ANY(:tags)"),
+        {"tags": tags},
+    ).all()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def latest(versions: Dict[str, Tuple[int, object]]) -> Optional[object]:
+    """updated_at mới nhất trong các version (None nếu rỗng)."""
+    stamps = [v[1] for v in versions.values() if v[1] is not None]
+    return max(stamps) if stamps else None
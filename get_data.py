@@ -3,6 +3,7 @@ import os
 from module_trafficsource import *
 from module_content import *
 from module_overall import *
+from module_monetization import process_monetization
 
 
 def main():
@@ -23,8 +24,9 @@ def main():
         print("All credentials have tokens. Processing all accounts...")
         for cred_file in files:
             process_one(cred_file)
-            process_content(files[choice])
-            process_overall(files[choice])
+            process_content(cred_file)
+            process_monetization(cred_file)
+            process_overall(cred_file)
     else:
         print("Available credentials files:")
         for i, file in enumerate(files):
@@ -36,6 +38,7 @@ def main():
                 return
             process_one(files[choice])
             process_content(files[choice])
+            process_monetization(files[choice])
             process_overall(files[choice])
         except ValueError:
             print("Invalid input. Please enter a number.")
@@ -3,7 +3,8 @@ import os
 import csv
 import pickle
 import re
-from typing import Dict, Any, List
+from functools import partial
+from typing import Dict, Any, List, Optional
 
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
@@ -11,6 +12,9 @@ from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 from module import *
 
+from capabilities import get_capabilities
+from report_runner import UnsupportedQuery, query_report, run_ordered, supported_metrics
+
 # =========================
 # Paths / Settings
 # =========================
@@ -167,12 +171,14 @@ def build_reports():
         # --- NEW: Impressions reports (để lấy impressions + CTR) ---
         {"name": "Impressions by day",
          "dimensions": "day",
+         "requires": ["impressions"],
          "metrics": ["impressions", "impressionsClickThroughRate",
                      "views", "estimatedMinutesWatched",
                      "averageViewDuration", "averageViewPercentage", "engagedViews"]},
 
         {"name": "Impressions by video",
          "dimensions": "video",
+         "requires": ["impressions"],
          "metrics": ["impressions", "impressionsClickThroughRate",
                      "views", "estimatedMinutesWatched",
                      "averageViewDuration", "averageViewPercentage", "engagedViews"],
@@ -181,10 +187,10 @@ def build_reports():
 
     if IS_OWNER_MODE:
         owner_reports = [
-            {"name": "Owner revenue by day", "dimensions": "day",
+            {"name": "Owner revenue by day", "dimensions": "day", "requires": ["estimatedRevenue"],
              "metrics": ["estimatedRevenue", "estimatedAdRevenue", "grossRevenue",
                          "cpm", "playbackBasedCpm", "adImpressions", "monetizedPlaybacks"]},
-            {"name": "Owner revenue by country", "dimensions": "country",
+            {"name": "Owner revenue by country", "dimensions": "country", "requires": ["estimatedRevenue"],
              "metrics": ["estimatedRevenue", "estimatedAdRevenue", "grossRevenue",
                          "cpm", "playbackBasedCpm", "adImpressions", "monetizedPlaybacks"]},
             {"name": "Ad type", "dimensions": "adType",
@@ -202,8 +208,41 @@ def build_reports():
 # =========================
 # Fetcher (save CSVs vào thư mục con theo credentials)
 # =========================
-def run_reports_to_csv(credentials, account_tag: str, date_rage):
-    yta = build("youtubeAnalytics", "v2", credentials=credentials)
+def _export_report(credentials, spec, base_req, account_dir, caps) -> str:
+    """Chạy 1 spec, ghi CSV; trả về dòng log (in theo thứ tự spec ở run_reports_to_csv)."""
+    dims = spec["dimensions"]
+    mets = ",".join(spec["metrics"])
+    req = {**base_req, "dimensions": dims, "metrics": mets, **spec.get("params", {})}
+
+    # Tên file CSV trong thư mục con
+    report_name = sanitize_filename(spec["name"])
+    out_csv = os.path.join(account_dir, f"{report_name}.csv")
+
+    try:
+        resp = query_report(credentials, req, caps)
+        headers = [h.get("name", "") for h in resp.get("columnHeaders", [])]
+        rows = resp.get("rows", [])
+
+        if rows:
+            save_csv(out_csv, headers, rows)
+            return f"  ✓ {spec['name']}: {len(rows)} rows -> {out_csv}"
+        # vẫn tạo CSV rỗng với header (nếu có)
+        if headers:
+            save_csv(out_csv, headers, [])
+        return f"  · {spec['name']}: no_data"
+    except (HttpError, UnsupportedQuery) as e:
+        # Audience retention có thể không có dữ liệu với một số kênh/date range -> tạo CSV rỗng thay vì fail
+        if "audienceWatchRatio" in mets and "elapsedVideoTimeRatio" in dims:
+            save_csv(out_csv, ["elapsedVideoTimeRatio", "audienceWatchRatio"], [])
+            return f"  · {spec['name']}: no_data (audience retention)"
+        if isinstance(e, UnsupportedQuery):
+            return f"  · {spec['name']}: unsupported{' (cached)' if e.cached else ''} → skip"
+        return f"  ✗ {spec['name']}: error ({e.status_code})"
+    except Exception as e:
+        return f"  ✗ {spec['name']}: error ({e.__class__.__name__})"
+
+
+def run_reports_to_csv(credentials, account_tag: str, date_rage, channel_id: Optional[str] = None):
     start_date, end_date = get_date_range(date_rage)
     reports = build_reports()
 
@@ -217,49 +256,33 @@ def run_reports_to_csv(credentials, account_tag: str, date_rage):
         mf.write(f"Mode: {'CONTENT OWNER' if IS_OWNER_MODE else 'CHANNEL'}\n")
         mf.write(f"Date Range: {start_date} to {end_date}\n")
 
+    base_req = {
+        "ids": ("contentOwner==" + CONTENT_OWNER_ID) if IS_OWNER_MODE else "channel==MINE",
+        "startDate": start_date,
+        "endDate": end_date,
+    }
+    if IS_OWNER_MODE:
+        base_req["onBehalfOfContentOwner"] = CONTENT_OWNER_ID
+
+    # spec có "requires": chỉ chạy khi channel/owner dùng được các metric đó (probe, nhớ theo TTL)
+    owner_id = CONTENT_OWNER_ID if IS_OWNER_MODE else (channel_id or account_tag)
+    required = sorted({m for spec in reports for m in spec.get("requires", [])})
+    available = set(supported_metrics(credentials, owner_id, base_req, required)) if required else set()
     for spec in reports:
-        dims = spec["dimensions"]
-        mets = ",".join(spec["metrics"])
-        params = spec.get("params", {})
-
-        req = {
-            "ids": ("contentOwner==" + CONTENT_OWNER_ID) if IS_OWNER_MODE else "channel==MINE",
-            "startDate": start_date,
-            "endDate": end_date,
-            "dimensions": dims,
-            "metrics": mets,
-        }
-        req.update(params)
-        if IS_OWNER_MODE:
-            req["onBehalfOfContentOwner"] = CONTENT_OWNER_ID
-
-        # Tên file CSV trong thư mục con
-        report_name = sanitize_filename(spec["name"])
-        out_csv = os.path.join(account_dir, f"{report_name}.csv")
+        missing = [m for m in spec.get("requires", []) if m not in available]
+        if missing:
+            print(f"  · {spec['name']}: {','.join(missing)} not available → skip")
+    reports = [s for s in reports if all(m in available for m in s.get("requires", []))]
 
-        try:
-            resp = yta.reports().query(**req).execute()
-            headers = [h.get("name", "") for h in resp.get("columnHeaders", [])]
-            rows = resp.get("rows", [])
-
-            if rows:
-                save_csv(out_csv, headers, rows)
-                print(f"  ✓ {spec['name']}: {len(rows)} rows -> {out_csv}")
-            else:
-                # vẫn tạo CSV rỗng với header (nếu có)
-                if headers:
-                    save_csv(out_csv, headers, [])
-                print(f"  · {spec['name']}: no_data")
-        except HttpError as e:
-            # Audience retention có thể không có dữ liệu với một số kênh/date range -> tạo CSV rỗng thay vì fail
-            if "audienceWatchRatio" in mets and "elapsedVideoTimeRatio" in dims:
-                if headers := ["elapsedVideoTimeRatio", "audienceWatchRatio"]:
-                    save_csv(out_csv, headers, [])
-                print(f"  · {spec['name']}: no_data (audience retention)")
-            else:
-                print(f"  ✗ {spec['name']}: error ({e.status_code})")
-        except Exception as e:
-            print(f"  ✗ {spec['name']}: error ({e.__class__.__name__})")
+    # các spec độc lập -> chạy song song (REPORT_WORKERS), log vẫn theo thứ tự build_reports()
+    caps = get_capabilities()
+    try:
+        for line in run_ordered(
+            partial(_export_report, credentials, spec, base_req, account_dir, caps) for spec in reports
+        ):
+            print(line)
+    finally:
+        caps.flush()
 
 # =========================
 # Main
@@ -293,7 +316,7 @@ def main():
         run_traffic_reports_to_csv(creds, account_tag, PERIODS)
 
         # (tuỳ chọn) nếu vẫn muốn xuất toàn bộ báo cáo khác:
-        run_reports_to_csv(creds, account_tag, date_rage="30d")
+        run_reports_to_csv(creds, account_tag, date_rage="30d", channel_id=ch["channel_id"] if ch else None)
 
     if len(files) == len(token_files):
         print("All credentials have tokens. Processing all accounts...")
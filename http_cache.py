@@ -0,0 +1,167 @@
+# http_cache.py — ETag / Last-Modified / 304 cho endpoint đọc trong /api/ (pure ASGI).
+# ETag = hash(method, path, query, body, version dữ liệu của các account trong request),
+# version lấy từ data_versions (cache vài giây) -> không chạy query chính để trả 304.
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from starlette.concurrency import run_in_threadpool
+
+from cache import TTLCache
+from data_version import ALL_ACCOUNTS, latest, read_data_versions
+from db import read_conn
+
+
+# endpoint không lấy dữ liệu từ DB ingest (YouTube API trực tiếp, file CSV reports/) hoặc tự xử lý riêng
+ETAG_EXCLUDE = ("/api/geography", "/api/batch", "/api/admin", "/api/reports")
+# chu kỳ ingest: dữ liệu không đổi trước updated_at + INGEST_INTERVAL_S -> max-age
+INGEST_INTERVAL_S = int(os.getenv("INGEST_INTERVAL_S", "3600"))
+
+_versions = TTLCache("data_version", ttl_s=float(os.getenv("DATA_VERSION_CACHE_TTL_S", "5")), maxsize=1024)
+_UNKNOWN = object()
+
+
+def account_tags_of(query: Dict[str, str], body) -> Tuple[str, ...]:
+    """account_tag mà request đọc (theo tên field các route đang dùng); không rõ -> "*"."""
+    tags = set()
+    for src in (query, body if isinstance(body, dict) else {}):
+        for key in ("accountTag", "channelId"):
+            v = src.get(key)
+            if isinstance(v, str) and v.strip():
+                tags.add(v.strip())
+        root = src.get("channelRoot")
+        if isinstance(root, str) and root.strip():
+            tags.add(root.split("__", 1)[0].strip())
+        many = src.get("accountTags")
+        if many == "all":
+            tags.add(ALL_ACCOUNTS)
+        elif isinstance(many, list):
+            tags.update(t.strip() for t in many if isinstance(t, str) and t.strip())
+    return tuple(sorted(tags)) or (ALL_ACCOUNTS,)
+
+
+def _load_versions(tags: Tuple[str, ...]):
+    try:
+        with read_conn() as conn:
+            return read_data_versions(conn, tags)
+    except Exception as e:
+        # chưa có bảng data_versions (chưa ingest lần nào) -> không gắn ETag
+        print("[http_cache] data_versions unavailable:", e)
+        return None
+
+
+async def get_versions(tags: Tuple[str, ...]):
+    versions = _versions.get(tags, _UNKNOWN)
+    if versions is _UNKNOWN:
+        versions = await run_in_threadpool(_load_versions, tags)
+        _versions.set(tags, versions)
+    return versions
+
+
+def make_etag(method: str, path: str, query: bytes, body: bytes, tags, versions) -> str:
+    h = hashlib.sha1()
+    for part in (method.encode(), path.encode(), query, body):
+        h.update(part)
+        h.update(b"\0")
+    for t in tags:
+        h.update(f"{t}={versions.get(t, (0, None))[0]};".encode())
+    return '"' + h.hexdigest()[:24] + '"'
+
+
+def cache_control(last_modified: Optional[datetime]) -> str:
+    # dữ liệu chỉ đổi sau lần ingest kế tiếp; quá hạn ingest -> max-age=0 (luôn revalidate, rẻ nhờ 304)
+    if last_modified is None:
+        return "public, max-age=0, must-revalidate"
+    age = (datetime.now(timezone.utc) - last_modified).total_seconds()
+    return f"public, max-age={max(0, int(INGEST_INTERVAL_S - age))}, must-revalidate"
+
+
+def _not_modified(headers: Dict[bytes, bytes], etag: str, last_modified: Optional[datetime]) -> bool:
+    inm = headers.get(b"if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.decode("latin-1").split(",")]
+        return "*" in tags or etag in tags or ("W/" + etag) in tags
+    ims = headers.get(b"if-modified-since")
+    if ims is not None and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(ims.decode("latin-1"))
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+class ConditionalMiddleware:
+    """
+    GET/POST trong /api/: If-None-Match / If-Modified-Since khớp -> 304 không gọi route;
+    response 200 được gắn ETag, Last-Modified, Cache-Control.
+    (POST: frontend tự gửi If-None-Match từ ETag đã nhận; GET: browser/CDN tự xử lý.)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or scope.get("method") not in ("GET", "POST")
+            or not path.startswith("/api/")
+            or path.startswith(ETAG_EXCLUDE)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # body JSON nhỏ: đọc hết rồi phát lại cho app
+        chunks: List[bytes] = []
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+        replayed = False
+
+        async def _receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = None  # để route trả 422 như bình thường
+        query_string = scope.get("query_string", b"")
+        tags = account_tags_of(dict(parse_qsl(query_string.decode("latin-1"))), payload)
+
+        versions = await get_versions(tags)
+        if versions is None:
+            await self.app(scope, _receive, send)
+            return
+
+        etag = make_etag(scope["method"], path, query_string, body, tags, versions)
+        last_modified = latest(versions)
+        extra = [(b"etag", etag.encode()), (b"cache-control", cache_control(last_modified).encode())]
+        if last_modified is not None:
+            stamp = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+            extra.append((b"last-modified", stamp.encode()))
+
+        if _not_modified(dict(scope.get("headers", [])), etag, last_modified):
+            await send({"type": "http.response.start", "status": 304, "headers": extra})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def _send(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        await self.app(scope, _receive, _send)
@@ -1,22 +1,82 @@
-
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.traffic_timeseries import router as ts_router
 from routes.geography import router as geo_router
 from routes.content import router as content_router
 from routes.overview import router as overview_router
-app = FastAPI()
+from routes.metrics import router as metrics_router
+from routes.debug import router as debug_router
+from routes.batch import router as batch_router
+from routes.portfolio import router as portfolio_router
+from routes.reports import router as reports_router
+from routes.retention import router as retention_router
+from routes.admin import router as admin_router
+from metrics import MetricsMiddleware, TimedJSONResponse
+from http_cache import ConditionalMiddleware
+from compression import CompressionMiddleware
+from scheduler import ingest_lifespan
+from module_content import ensure_daily_cum
+from db import PG_URL, QueryTimeout
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+def _backfill_daily_cum():
+    # /api/content/list, /top đọc video_daily_cum: deploy lần đầu -> build ngay, không chờ lượt ingest
+    try:
+        n = ensure_daily_cum(PG_URL)
+        if n:
+            print(f"[startup] video_daily_cum: backfill {n} rows")
+    except Exception as e:
+        print("[startup] video_daily_cum backfill failed:", e)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # chạy nền (không chặn startup, DB chưa lên cũng không làm app fail)
+    backfill = asyncio.get_running_loop().run_in_executor(None, _backfill_daily_cum)
+    # scheduler ingest nền khi INGEST_SCHEDULER=1 (xem scheduler.py)
+    async with ingest_lifespan(app):
+        yield
+    await backfill
+
+
+app = FastAPI(default_response_class=TimedJSONResponse, lifespan=lifespan)
+
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request: Request, exc: QueryTimeout):
+    # hết statement_timeout: 503 + no-store (ConditionalMiddleware chỉ gắn ETag cho 200) -> không bị cache thành dữ liệu rỗng
+    print(f"[db] statement timeout {request.method} {request.url.path}: {exc}")
+    return JSONResponse({"detail": "query timeout"}, status_code=503,
+                        headers={"Retry-After": "5", "Cache-Control": "no-store"})
 
 
+# ETag/304: nằm trong CORS để response 304 vẫn có header CORS
+app.add_middleware(ConditionalMiddleware)
+# nén ngoài ConditionalMiddleware (ETag -> weak khi nén), trong CORS/Metrics (đo bytes thật gửi đi)
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # hoặc chỉ http://localhost:3000
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],  # frontend đọc ETag để gửi If-None-Match (POST)
 )
+# add sau cùng = lớp ngoài cùng: đo cả thời gian CORS
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(ts_router)
 app.include_router(geo_router)
 app.include_router(content_router)
-app.include_router(overview_router)
\ No newline at end of file
+app.include_router(overview_router)
+app.include_router(metrics_router)
+app.include_router(debug_router)
+app.include_router(batch_router)
+app.include_router(portfolio_router)
+app.include_router(reports_router)
+app.include_router(retention_router)
+app.include_router(admin_router)
@@ -0,0 +1,275 @@
+# metrics.py — in-process metrics + Prometheus text format (không cần prometheus_client)
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+# ===== Primitives =====
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str):
+        self.name = name
+        self.doc = doc
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Optional[Dict[str, str]]) -> LabelKey:
+        return tuple(sorted((labels or {}).items()))
+
+    @staticmethod
+    def _fmt_labels(key: Iterable[Tuple[str, str]]) -> str:
+        parts = []
+        for k, v in key:
+            v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+            parts.append(f'{k}="{v}"')
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str):
+        super().__init__(name, doc)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._fmt_labels(k)} {v:g}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str):
+        super().__init__(name, doc)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._fmt_labels(k)} {v:g}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, row in items:
+            for b, n in zip(self.buckets, row):
+                out.append(f"{self.name}_bucket{self._fmt_labels(key + (('le', f'{b:g}'),))} {n}")
+            out.append(f"{self.name}_bucket{self._fmt_labels(key + (('le', '+Inf'),))} {row[-2]}")
+            out.append(f"{self.name}_sum{self._fmt_labels(key)} {row[-1]:g}")
+            out.append(f"{self.name}_count{self._fmt_labels(key)} {row[-2]}")
+        return out
+
+
+# ===== Registry =====
+_REGISTRY: List[_Metric] = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+REQUEST_LATENCY = _register(Histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request theo route template."))
+RESPONSE_SIZE = _register(Histogram(
+    "http_response_size_bytes", "Kích thước body response.", SIZE_BUCKETS))
+REQUESTS = _register(Counter(
+    "http_requests_total", "Số request theo route/method/status."))
+REQUEST_DB_TIME = _register(Histogram(
+    "http_request_db_seconds", "Tổng thời gian chạy SQL trong 1 request."))
+REQUEST_SERIALIZE_TIME = _register(Histogram(
+    "http_request_serialize_seconds", "Thời gian render JSON response trong 1 request."))
+
+DB_QUERY_TIME = _register(Histogram(
+    "db_query_duration_seconds", "Thời gian từng câu SQL (cursor execute)."))
+DB_ERRORS = _register(Counter(
+    "db_errors_total", "Lỗi DB theo loại exception (kể cả lỗi bị query_all_safe nuốt)."))
+POOL_CHECKOUT_WAIT = _register(Histogram(
+    "db_pool_checkout_wait_seconds", "Thời gian chờ lấy connection từ pool."))
+POOL_IN_USE = _register(Gauge(
+    "db_pool_connections_in_use", "Số connection đang được checkout."))
+
+CACHE_REQUESTS = _register(Counter(
+    "cache_requests_total", "Lookup cache theo tên cache và kết quả (hit/miss)."))
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ===== Per-request accumulator =====
+# {"db": giây SQL, "serialize": giây render} — object mutable nên thread của
+# run_in_threadpool (copy context) cộng dồn vào cùng 1 dict.
+_request_stats: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stats", default=None)
+
+
+def _add_request_time(key: str, seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[key] = stats.get(key, 0.0) + seconds
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse đo thời gian render (dùng làm default_response_class của app)."""
+
+    def render(self, content) -> bytes:
+        t0 = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            _add_request_time("serialize", time.perf_counter() - t0)
+
+
+# ===== SQLAlchemy engine hooks =====
+def instrument_engine(engine, name: str = "primary"):
+    """Gắn event đo SQL time, lỗi DB, chờ checkout và số connection đang dùng."""
+    if getattr(engine, "_metrics_instrumented", False):
+        return engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_metrics_t0")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        DB_QUERY_TIME.observe(elapsed, engine=name)
+        _add_request_time("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        conn = ctx.connection
+        if conn is not None and conn.info.get("_metrics_t0"):
+            conn.info["_metrics_t0"].pop()
+        DB_ERRORS.inc(engine=name, error=type(ctx.original_exception).__name__)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        POOL_IN_USE.inc(engine=name)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        POOL_IN_USE.dec(engine=name)
+
+    # Pool không có event "trước khi chờ" -> bọc pool.connect để đo thời gian chờ
+    pool = engine.pool
+    pool_connect = pool.connect
+
+    def _timed_connect():
+        t0 = time.perf_counter()
+        try:
+            return pool_connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - t0, engine=name)
+
+    pool.connect = _timed_connect
+    engine._metrics_instrumented = True
+    return engine
+
+
+# ===== ASGI middleware =====
+class MetricsMiddleware:
+    """
+    Pure ASGI (không buffer body, an toàn với streaming): latency, status,
+    kích thước body, DB time và serialize time theo route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"db": 0.0, "serialize": 0.0}
+        token = _request_stats.set(stats)
+        state = {"status": 500, "size": 0}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _request_stats.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+
+            REQUESTS.inc(route=path, method=method, status=str(state["status"]))
+            REQUEST_LATENCY.observe(elapsed, route=path, method=method)
+            RESPONSE_SIZE.observe(state["size"], route=path, method=method)
+            REQUEST_DB_TIME.observe(stats["db"], route=path, method=method)
+            REQUEST_SERIALIZE_TIME.observe(stats["serialize"], route=path, method=method)
@@ -0,0 +1,236 @@
+# module_columnar.py — columnar transforms (numpy/pandas) dùng chung cho ingest + convert_*
+from array import array
+from datetime import date
+from itertools import repeat
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+DateLike = Union[str, date]
+
+# Định dạng ngày mà các CSV export có thể dùng (thứ tự = độ ưu tiên)
+DAY_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y")
+
+# ===== Struct-of-arrays batch =====
+# kind -> typecode của array.array; kind khác ("str") lưu bằng list
+_TYPECODES = {"int": "q", "float": "d"}
+_DTYPES = {"int": "int64", "float": "float64"}
+
+
+class RecordBatch:
+    """
+    Struct-of-arrays cho ingest: cột số là array.array ('q'/'d', 8 byte/giá trị),
+    cột text là list. Ép kiểu đúng 1 lần khi nạp từ API, bind xuống DB dưới dạng tuple.
+    """
+
+    __slots__ = ("names", "kinds", "columns")
+
+    def __init__(self, schema: Sequence[Tuple[str, str]]):
+        self.names = [n for n, _ in schema]
+        self.kinds = [k for _, k in schema]
+        self.columns = [array(_TYPECODES[k]) if k in _TYPECODES else [] for k in self.kinds]
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name: str):
+        return self.columns[self.names.index(name)]
+
+    def extend_rows(self, rows: Sequence[Sequence], index: Dict[str, int], const: Optional[Dict] = None):
+        """
+        Nạp `rows` của API. `index`: tên cột -> vị trí trong row,
+        `const`: cột hằng cho cả response (vd video_id).
+        Cột không có trong index/const -> 0 (số) hoặc "" (text); None -> 0 với cột số.
+        """
+        const = const or {}
+        for name, kind, col in zip(self.names, self.kinds, self.columns):
+            i = index.get(name)
+            if name in const:
+                col.extend(repeat(const[name], len(rows)))
+            elif i is None:
+                col.extend(repeat(0 if kind in _TYPECODES else "", len(rows)))
+            elif kind == "int":
+                col.extend(int(r[i] or 0) for r in rows)
+            elif kind == "float":
+                col.extend(float(r[i] or 0.0) for r in rows)
+            else:
+                col.extend(r[i] for r in rows)
+
+    def extend_response(self, resp: Dict, names: Optional[Dict[str, str]] = None, const: Optional[Dict] = None):
+        """`rows` + `columnHeaders` của YouTube Analytics; `names`: cột batch -> tên cột API."""
+        rows = resp.get("rows") or []
+        if not rows:
+            return
+        names = names or {}
+        col = {c["name"]: i for i, c in enumerate(resp.get("columnHeaders", []))}
+        index = {n: col[names.get(n, n)] for n in self.names if names.get(n, n) in col}
+        self.extend_rows(rows, index, const)
+
+    def extend(self, other: "RecordBatch"):
+        for col, more in zip(self.columns, other.columns):
+            col.extend(more)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        DataFrame trên cùng buffer: cột số dùng np.frombuffer (không copy),
+        cột `day` -> datetime64, text khác -> object.
+        """
+        data = {}
+        for name, kind, col in zip(self.names, self.kinds, self.columns):
+            if kind in _TYPECODES:
+                data[name] = np.frombuffer(col, dtype=_DTYPES[kind]) if len(col) else np.empty(0, _DTYPES[kind])
+            elif name == "day":
+                data[name] = np.array(col, dtype="datetime64[D]").astype("datetime64[ns]")
+            else:
+                data[name] = np.array(col, dtype=object)
+        return pd.DataFrame(data, copy=False)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, schema: Sequence[Tuple[str, str]]) -> "RecordBatch":
+        """Copy thẳng buffer numpy vào array.array (không tạo object Python cho cột số)."""
+        batch = cls(schema)
+        for name, kind, col in zip(batch.names, batch.kinds, batch.columns):
+            if kind in _TYPECODES:
+                col.frombytes(frame[name].to_numpy(dtype=_DTYPES[kind]).tobytes())
+            elif name == "day" and pd.api.types.is_datetime64_any_dtype(frame[name]):
+                col.extend(day_strings(frame[name]).tolist())
+            else:
+                col.extend(frame[name].tolist())
+        return batch
+
+    def iter_tuples(self, size: int, prefix: Sequence = ()) -> Iterator[List[Tuple]]:
+        """Từng batch list[tuple] cho executemany; `prefix` = các giá trị hằng đứng đầu tuple."""
+        consts = [repeat(v) for v in prefix]
+        for i in range(0, len(self), size):
+            yield list(zip(*consts, *(c[i:i + size] for c in self.columns)))
+
+
+# ===== Traffic source schema =====
+TRAFFIC_KEY = "insightTrafficSourceType"
+
+# thứ tự cột = thứ tự bind của _PG_UPSERT_ROWS (sau account_tag, channel_id)
+TRAFFIC_SCHEMA: List[Tuple[str, str]] = [
+    ("day", "str"),
+    (TRAFFIC_KEY, "str"),
+    ("views", "int"),
+    ("estimatedMinutesWatched", "int"),
+    ("averageViewDuration", "int"),
+    ("averageViewPercentage", "float"),
+    ("engagedViews", "int"),
+]
+
+
+# ===== Dates =====
+def parse_days(values: pd.Series, formats: Sequence[str] = DAY_FORMATS) -> pd.Series:
+    """Parse cột ngày dạng text theo nhiều format, vectorized. Không parse được -> NaT."""
+    s = values.astype("string").str.strip()
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    for fmt in formats:
+        out = out.fillna(pd.to_datetime(s, format=fmt, errors="coerce"))
+    return out
+
+
+def day_strings(values: pd.Series) -> np.ndarray:
+    """datetime64 -> mảng 'YYYY-MM-DD' (format 1 lần cho cả cột)."""
+    return np.datetime_as_string(values.to_numpy().astype("datetime64[D]"))
+
+
+# ===== Densify =====
+def densify_daily(
+    frame: pd.DataFrame,
+    start: DateLike,
+    end: DateLike,
+    key: str = TRAFFIC_KEY,
+    fill: Optional[Dict[str, object]] = None,
+) -> pd.DataFrame:
+    """
+    Zero-fill lưới (day × key) trên [start, end], sort theo (day, key).
+    Dòng trùng (day, key) -> giữ dòng sau cùng (giống ghi đè dict cũ).
+    """
+    fill = fill or {}
+    if frame.empty:
+        return frame.iloc[0:0].reset_index(drop=True)
+
+    days = pd.date_range(start, end, freq="D", name="day")
+    keys = pd.Index(np.sort(frame[key].unique()), name=key)
+    grid = pd.MultiIndex.from_product([days, keys])
+    dense = (
+        frame.drop_duplicates(["day", key], keep="last")
+        .set_index(["day", key])
+        .reindex(grid)
+    )
+    for col in dense.columns:
+        dense[col] = dense[col].fillna(fill.get(col, 0)).astype(frame[col].dtype)
+    return dense.reset_index()
+
+
+def fill_missing_days(
+    frame: pd.DataFrame,
+    day_col: str = "day",
+    numeric_fields: Sequence[str] = (),
+) -> pd.DataFrame:
+    """
+    Bù ngày thiếu giữa min/max của cột `day_col` (dạng text), sort ổn định theo ngày.
+    Dòng bù: số -> "0", còn lại -> "". Dòng không parse được ngày nằm đầu.
+    """
+    parsed = parse_days(frame[day_col])
+    have = pd.DatetimeIndex(parsed.dropna().unique())
+    if have.empty:
+        return frame
+
+    missing = pd.date_range(have.min(), have.max(), freq="D").difference(have)
+    if len(missing):
+        numeric = set(numeric_fields)
+        filler = pd.DataFrame({
+            col: ("0" if col in numeric else "") for col in frame.columns if col != day_col
+        }, index=range(len(missing)))
+        filler[day_col] = missing.strftime("%Y-%m-%d")
+        frame = pd.concat([frame, filler[frame.columns]], ignore_index=True)
+        parsed = pd.concat([parsed, pd.Series(missing)], ignore_index=True)
+
+    order = np.argsort(parsed.fillna(pd.Timestamp.min).to_numpy(), kind="stable")
+    return frame.iloc[order].reset_index(drop=True)
+
+
+# ===== Traffic source pipeline =====
+def traffic_frame(batch: RecordBatch) -> pd.DataFrame:
+    """
+    RecordBatch (TRAFFIC_SCHEMA) -> DataFrame để densify.
+    averageViewDuration (giây) tự tính lại từ emw / views.
+    """
+    frame = batch.to_frame()
+    views = frame["views"].to_numpy()
+    emw = frame["estimatedMinutesWatched"].to_numpy()
+    avd = np.where(views > 0, np.rint(emw * 60 / np.maximum(views, 1)), 0)
+    frame["averageViewDuration"] = avd.astype("int64")
+    return frame
+
+
+# ===== Downsampling =====
+def lttb_indices(x: Sequence[float], y: Sequence[float], n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: chọn n_out điểm (gồm điểm đầu/cuối) giữ hình dạng
+    của series (x tăng dần). Trả về index đã sắp xếp; n_out >= len hoặc < 3 -> giữ tất cả.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+
+    out = np.empty(n_out, dtype="int64")
+    out[0], out[-1] = 0, n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        # bucket hiện tại [lo, hi), bucket kế tiếp [hi, nxt) -> điểm trung bình của nó
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nxt = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[hi:nxt].mean(), y[hi:nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
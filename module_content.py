@@ -1,8 +1,14 @@
+import argparse
 import os
-from typing import List, Dict
-from googleapiclient.discovery import build
+from typing import List, Dict, Optional
 from sqlalchemy import create_engine, text
 
+from module_columnar import RecordBatch
+from module_transport import get_transport
+from data_version import bump_data_version
+from module_jobs import is_item_error, open_job, run_units
+from module_monetization import ensure_monetization_schema
+
 from module_trafficsource import (
     create_token_from_credentials,
     sanitize_filename
@@ -10,8 +16,8 @@ from module_trafficsource import (
 
 
 
-def get_upload_playlist_id(credentials):
-    yt = build("youtube", "v3", credentials=credentials)
+def get_upload_playlist_id(credentials, transport=None):
+    yt = get_transport(transport).build("youtube", "v3", credentials=credentials)
     resp = yt.channels().list(
         part="contentDetails",
         mine=True
@@ -24,8 +30,8 @@ def get_upload_playlist_id(credentials):
     return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
 
-def get_video_list(credentials, playlist_id: str) -> List[str]:
-    yt = build("youtube", "v3", credentials=credentials)
+def get_video_list(credentials, playlist_id: str, transport=None) -> List[str]:
+    yt = get_transport(transport).build("youtube", "v3", credentials=credentials)
     video_ids = []
 
     req = yt.playlistItems().list(
@@ -49,8 +55,8 @@ def get_video_list(credentials, playlist_id: str) -> List[str]:
 # VIDEO METADATA (DATA API)
 # ============================
 
-def get_video_metadata(credentials, video_ids: List[str]) -> List[Dict]:
-    yt = build("youtube", "v3", credentials=credentials)
+def get_video_metadata(credentials, video_ids: List[str], transport=None) -> List[Dict]:
+    yt = get_transport(transport).build("youtube", "v3", credentials=credentials)
     results = []
 
     for i in range(0, len(video_ids), 50):
@@ -82,10 +88,36 @@ def get_video_metadata(credentials, video_ids: List[str]) -> List[Dict]:
 # DAILY METRICS (ANALYTICS API)
 # ============================
 
+# cột video_daily_stats theo đúng thứ tự bind của _DAILY_UPSERT_ROWS
+VIDEO_DAILY_SCHEMA = [
+    ("video_id", "str"),
+    ("day", "str"),
+    ("views", "int"),
+    ("estimated_minutes", "int"),
+    ("average_view_duration", "int"),
+    ("likes", "int"),
+]
+
+# tên cột video_daily_stats -> tên metric trong response (cột trùng tên không cần khai báo)
+_DAILY_API_NAMES = {
+    "estimated_minutes": "estimatedMinutesWatched",
+    "average_view_duration": "averageViewDuration",
+    "likes": "likes",
+}
+
+
+def parse_video_daily(resp: Dict, video_id: str) -> RecordBatch:
+    batch = RecordBatch(VIDEO_DAILY_SCHEMA)
+    batch.extend_response(resp, _DAILY_API_NAMES, const={"video_id": video_id})
+    return batch
+
+
 def get_video_daily_analytics(credentials, video_id: str,
-                              start_date: str, end_date: str) -> List[Dict]:
+                              start_date: str, end_date: str, transport=None,
+                              strict: bool = False) -> RecordBatch:
+    """strict: lỗi không phải của riêng video (quota, token, mạng) -> raise để unit backfill được chạy lại."""
 
-    yta = build("youtubeAnalytics", "v2", credentials=credentials)
+    yta = get_transport(transport).build("youtubeAnalytics", "v2", credentials=credentials)
 
     q = {
         "ids": "channel==MINE",
@@ -105,33 +137,12 @@ def get_video_daily_analytics(credentials, video_id: str,
     try:
         resp = yta.reports().query(**q).execute() or {}
     except Exception as e:
+        if strict and not is_item_error(e):
+            raise
         print(f"[ERROR] Failed daily analytics for {video_id}: {e}")
-        return []
-
-    rows = resp.get("rows") or []
-    if not rows:
-        return []
-
-    col = {c["name"]: i for i, c in enumerate(resp["columnHeaders"])}
-
-    i_day = col["day"]
-    i_views = col["views"]
-    i_emw = col["estimatedMinutesWatched"]
-    i_avd = col["averageViewDuration"]
-    i_likes = col["likes"]
-
-    results = []
-    for r in rows:
-        results.append({
-            "video_id": video_id,
-            "day": r[i_day],
-            "views": int(r[i_views]),
-            "estimated_minutes": int(r[i_emw]),
-            "average_view_duration": int(r[i_avd]),
-            "likes": int(r[i_likes]),
-        })
+        return RecordBatch(VIDEO_DAILY_SCHEMA)
 
-    return results
+    return parse_video_daily(resp, video_id)
 
 def save_metadata(videos, account_tag: str, pg_url: str):
     engine = create_engine(pg_url, future=True)
@@ -150,6 +161,11 @@ def save_metadata(videos, account_tag: str, pg_url: str):
                 comments INTEGER DEFAULT 0
             );
         """))
+        # /api/content/list, /top lọc theo account_tag
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_videos_account_published
+            ON videos (account_tag, published_at DESC);
+        """))
 
         for v in videos:
             conn.execute(text("""
@@ -177,7 +193,142 @@ def save_metadata(videos, account_tag: str, pg_url: str):
             })
 
 
-def save_daily_stats(daily_rows, pg_url: str):
+_DAILY_UPSERT_ROWS = """
+    INSERT INTO video_daily_stats
+        (video_id, day, views, estimated_minutes, average_view_duration, likes)
+    VALUES
+        (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (video_id, day)
+    DO UPDATE SET
+        views = EXCLUDED.views,
+        estimated_minutes = EXCLUDED.estimated_minutes,
+        average_view_duration = EXCLUDED.average_view_duration;
+"""
+
+
+# ============================
+# PREFIX SUM (video_daily_cum)
+# ============================
+# cum_*[video, day] = tổng từ ngày đầu tiên tới `day` (gồm day) của video_daily_stats
+#   => tổng [start, end] = cum[ngày cuối <= end] - cum[ngày cuối < start] (2 lookup PK / video)
+
+_CUM_DDL = """
+    CREATE TABLE IF NOT EXISTS video_daily_cum (
+        video_id TEXT NOT NULL,
+        day DATE NOT NULL,
+        cum_views BIGINT NOT NULL,
+        cum_minutes BIGINT NOT NULL,
+        cum_likes BIGINT NOT NULL,
+        PRIMARY KEY (video_id, day)
+    );
+"""
+
+# Tính lại cum từ from_day trở đi cho các video bị chạm; base = cum ngay trước from_day
+# (các ngày trước from_day không đổi nên cum của chúng vẫn đúng).
+_CUM_REFRESH = """
+    WITH touched AS (
+        SELECT * FROM unnest(%s::text[], %s::date[]) AS t(video_id, from_day)
+    ),
+    base AS (
+        SELECT t.video_id, t.from_day,
+               COALESCE(c.cum_views, 0)   AS views,
+               COALESCE(c.cum_minutes, 0) AS minutes,
+               COALESCE(c.cum_likes, 0)   AS likes
+        FROM touched t
+        LEFT JOIN LATERAL (
+            SELECT cum_views, cum_minutes, cum_likes
+            FROM video_daily_cum c
+            WHERE c.video_id = t.video_id AND c.day < t.from_day
+            ORDER BY c.day DESC
+            LIMIT 1
+        ) c ON true
+    )
+    INSERT INTO video_daily_cum (video_id, day, cum_views, cum_minutes, cum_likes)
+    SELECT
+        s.video_id,
+        s.day,
+        b.views   + SUM(COALESCE(s.views, 0))             OVER w,
+        b.minutes + SUM(COALESCE(s.estimated_minutes, 0)) OVER w,
+        b.likes   + SUM(COALESCE(s.likes, 0))             OVER w
+    FROM base b
+    JOIN video_daily_stats s
+      ON s.video_id = b.video_id
+     AND s.day >= b.from_day
+    WINDOW w AS (PARTITION BY s.video_id ORDER BY s.day ROWS UNBOUNDED PRECEDING)
+    ON CONFLICT (video_id, day)
+    DO UPDATE SET
+        cum_views = EXCLUDED.cum_views,
+        cum_minutes = EXCLUDED.cum_minutes,
+        cum_likes = EXCLUDED.cum_likes;
+"""
+
+# Lần đầu tạo bảng trên DB đã có dữ liệu: build toàn bộ 1 lần
+_CUM_BACKFILL = """
+    INSERT INTO video_daily_cum (video_id, day, cum_views, cum_minutes, cum_likes)
+    SELECT
+        video_id,
+        day,
+        SUM(COALESCE(views, 0))             OVER w,
+        SUM(COALESCE(estimated_minutes, 0)) OVER w,
+        SUM(COALESCE(likes, 0))             OVER w
+    FROM video_daily_stats
+    WHERE NOT EXISTS (SELECT 1 FROM video_daily_cum)
+    WINDOW w AS (PARTITION BY video_id ORDER BY day ROWS UNBOUNDED PRECEDING)
+    ON CONFLICT (video_id, day) DO NOTHING;
+"""
+
+
+def refresh_daily_cum(conn, from_days: Dict[str, str]):
+    """from_days: video_id -> ngày nhỏ nhất vừa ghi vào video_daily_stats."""
+    if not from_days:
+        return
+    conn.exec_driver_sql(_CUM_REFRESH, (list(from_days.keys()), list(from_days.values())))
+
+
+def _min_day_per_video(batch: RecordBatch) -> Dict[str, str]:
+    # day dạng YYYY-MM-DD nên so sánh chuỗi = so sánh ngày
+    out: Dict[str, str] = {}
+    for vid, day in zip(batch.column("video_id"), batch.column("day")):
+        cur = out.get(vid)
+        if cur is None or day < cur:
+            out[vid] = day
+    return out
+
+
+def rebuild_daily_cum(pg_url: str):
+    """Build lại toàn bộ video_daily_cum (vd sau khi sửa/xóa tay video_daily_stats)."""
+    engine = create_engine(pg_url, future=True)
+    with engine.begin() as conn:
+        conn.execute(text(_CUM_DDL))
+        conn.exec_driver_sql("TRUNCATE video_daily_cum")
+        conn.exec_driver_sql(_CUM_BACKFILL)
+
+
+def ensure_daily_cum(pg_url: str) -> int:
+    """
+    Deploy lên DB đã có video_daily_stats nhưng chưa có / chưa build video_daily_cum:
+    build 1 lần ngay (không chờ lượt ingest kế tiếp), trả về số dòng đã ghi (0 = không cần).
+    /api/content/list, /top chỉ đọc bảng cum -> trước khi build chúng trả rỗng.
+    """
+    engine = create_engine(pg_url, future=True)
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT to_regclass('video_daily_stats')").scalar() is None:
+            return 0
+        # nhiều worker uvicorn cùng start -> 1 process build, process khác bỏ qua
+        if not conn.exec_driver_sql("SELECT pg_try_advisory_xact_lock(hashtext('video_daily_cum'))").scalar():
+            return 0
+        conn.execute(text(_CUM_DDL))
+        n = conn.exec_driver_sql(_CUM_BACKFILL).rowcount
+        if n:
+            # response rỗng đã cache theo data_version cũ -> tăng version để ETag đổi
+            if conn.exec_driver_sql("SELECT to_regclass('videos')").scalar() is not None:
+                for (tag,) in conn.exec_driver_sql("SELECT DISTINCT account_tag FROM videos").all():
+                    bump_data_version(conn, tag)
+    return max(n, 0)
+
+
+def save_daily_stats(daily_rows: RecordBatch, pg_url: str, batch_size: int = 5000,
+                     account_tag: Optional[str] = None):
     engine = create_engine(pg_url, future=True)
 
     with engine.begin() as conn:
@@ -193,69 +344,99 @@ def save_daily_stats(daily_rows, pg_url: str):
                 PRIMARY KEY (video_id, day)
             );
         """))
+        conn.execute(text(_CUM_DDL))
+        conn.exec_driver_sql(_CUM_BACKFILL)
+        # /api/content/list, /timeseries LEFT JOIN bảng này -> tạo sẵn (rỗng) nếu stage monetization chưa chạy
+        ensure_monetization_schema(conn)
 
-        for r in daily_rows:
-            conn.execute(text("""
-                INSERT INTO video_daily_stats
-                    (video_id, day, views, estimated_minutes, average_view_duration, likes)
-                VALUES
-                    (:id, :day, :views, :emw, :avd, :likes)
-                ON CONFLICT (video_id, day)
-                DO UPDATE SET
-                    views = EXCLUDED.views,
-                    estimated_minutes = EXCLUDED.estimated_minutes,
-                    average_view_duration = EXCLUDED.average_view_duration;
-            """), {
-                "id": r["video_id"],
-                "day": r["day"],
-                "views": r["views"],
-                "emw": r["estimated_minutes"],
-                "avd": r["average_view_duration"],
-                "likes": r["likes"],
-            })
+        # tuple theo VIDEO_DAILY_SCHEMA, executemany theo chunk
+        for chunk in daily_rows.iter_tuples(batch_size):
+            conn.exec_driver_sql(_DAILY_UPSERT_ROWS, chunk)
+
+        # cùng transaction: cum luôn khớp với video_daily_stats
+        refresh_daily_cum(conn, _min_day_per_video(daily_rows))
+
+        # metadata (save_metadata) đã ghi trước đó -> tăng version 1 lần khi cả 2 đã xong
+        if account_tag:
+            bump_data_version(conn, account_tag)
 
 
 # ============================
 # RUNNER
 # ============================
 
-def run_content_v3_hybrid(credentials, account_tag, pg_url):
-    playlist_id = get_upload_playlist_id(credentials)
+# số video / unit checkpoint (module_jobs): 1 transaction ghi video_daily_stats + cum mỗi unit
+CONTENT_UNIT_VIDEOS = 50
+
+
+def plan_content_units(credentials, account_tag, pg_url, transport=None):
+    """Danh sách video + metadata (ghi luôn bảng videos) -> unit (key, [[video_id, published_at], ...])."""
+    playlist_id = get_upload_playlist_id(credentials, transport=transport)
     if not playlist_id:
         print("Không tìm thấy uploads playlist.")
-        return
+        return []
 
     print("→ Fetching video list...")
-    video_ids = get_video_list(credentials, playlist_id)
+    video_ids = get_video_list(credentials, playlist_id, transport=transport)
     print(f"→ Found {len(video_ids)} videos")
 
     print("→ Fetching video metadata...")
-    videos = get_video_metadata(credentials, video_ids)
+    videos = get_video_metadata(credentials, video_ids, transport=transport)
 
     print("→ Saving metadata to PostgreSQL...")
     save_metadata(videos, account_tag, pg_url)
 
-    print("→ Fetching DAILY analytics via YouTube Analytics API...")
-    daily_rows = []
+    pairs = [[v["video_id"], v["published_at"]] for v in videos]
+    return [
+        (f"videos:{i // CONTENT_UNIT_VIDEOS:05d}", pairs[i:i + CONTENT_UNIT_VIDEOS])
+        for i in range(0, len(pairs), CONTENT_UNIT_VIDEOS)
+    ]
 
-    for v in videos:
-        video_id = v["video_id"]
-        published = v["published_at"]
 
-        d = get_video_daily_analytics(credentials, video_id, published, "2099-01-01")
+def _content_unit(credentials, account_tag, pg_url, transport, payload) -> int:
+    daily_rows = RecordBatch(VIDEO_DAILY_SCHEMA)
+    for video_id, published in payload:
+        d = get_video_daily_analytics(credentials, video_id, published, "2099-01-01",
+                                      transport=transport, strict=True)
         daily_rows.extend(d)
+    save_daily_stats(daily_rows, pg_url, account_tag=account_tag)
+    return len(daily_rows)
 
-    print("→ Saving daily stats...")
-    save_daily_stats(daily_rows, pg_url)
 
-    print("✔ DONE: Metadata + DAILY stats saved successfully")
+def run_content_v3_hybrid(credentials, account_tag, pg_url, transport=None):
+    transport = get_transport(transport)
+    # job dang dở (process chết giữa chừng) -> tiếp các unit chưa xong, không list lại video
+    job = open_job(pg_url, account_tag, "content",
+                   lambda: plan_content_units(credentials, account_tag, pg_url, transport))
+
+    print("→ Fetching DAILY analytics via YouTube Analytics API...")
+    counts = run_units(job, lambda payload: _content_unit(credentials, account_tag, pg_url, transport, payload))
+
+    if counts["status"] == "done":
+        print("✔ DONE: Metadata + DAILY stats saved successfully")
+    return counts
 
 
-def process_content(cred_file: str):
+def process_content(cred_file: str, transport=None):
+    transport = get_transport(transport)
     cred_path = os.path.join("credentials", cred_file)
     pg_url = os.getenv("PG_URL")
 
-    credentials = create_token_from_credentials(cred_path)
+    credentials = None if transport.offline else create_token_from_credentials(cred_path)
     account_tag = sanitize_filename(os.path.splitext(cred_file)[0])
 
-    run_content_v3_hybrid(credentials, account_tag, pg_url)
+    run_content_v3_hybrid(credentials, account_tag, pg_url, transport=transport)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build bảng prefix sum video_daily_cum từ video_daily_stats.")
+    ap.add_argument("--rebuild", action="store_true", help="xóa và build lại toàn bộ (mặc định: chỉ khi bảng rỗng)")
+    args = ap.parse_args()
+    pg_url = os.getenv("PG_URL")
+    if not pg_url:
+        raise SystemExit("Missing PG_URL environment variable")
+    if args.rebuild:
+        rebuild_daily_cum(pg_url)
+        print("✔ video_daily_cum: rebuilt")
+    else:
+        print(f"✔ video_daily_cum: {ensure_daily_cum(pg_url)} rows backfilled")
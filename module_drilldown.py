@@ -0,0 +1,318 @@
+# module_drilldown.py — drill-down theo từng video (retention, traffic source detail, playback location detail)
+# 1) 1-2 query tổng hợp (video x insightTrafficSourceType, video x insightPlaybackLocationType)
+#    để biết tổ hợp nào thực sự có views
+# 2) chỉ fetch detail cho các tổ hợp đó, song song qua report_runner (rate limit + capability cache chung)
+# 3) ghi vào PostgreSQL (video_traffic_detail / video_playback_detail / video_retention) trong 1 transaction
+import os
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine, text
+
+from capabilities import get_capabilities
+from data_version import bump_data_version
+from module_trafficsource import create_token_from_credentials, sanitize_filename
+from module_transport import get_transport
+from report_runner import REPORT_WORKERS, UnsupportedQuery, query_report, run_ordered
+
+
+# ===== Config =====
+# source type có insightTrafficSourceDetail (các type khác API trả 400)
+DETAIL_SOURCE_TYPES = ("YT_SEARCH", "RELATED_VIDEO", "PLAYLIST", "YT_CHANNEL", "YT_OTHER_PAGE", "NO_LINK_OTHER")
+PLAYBACK_LOCATION_TYPES = ("WATCH", "EMBEDDED", "CHANNEL", "OTHER")
+# tổ hợp (video, type) có ít views hơn ngưỡng này thì không drill-down
+DRILLDOWN_MIN_VIEWS = int(os.getenv("DRILLDOWN_MIN_VIEWS", "1"))
+# số video trong 1 filter video==a,b,c của query tổng hợp
+MATRIX_VIDEO_CHUNK = 200
+RETENTION_BUCKETS = 100
+# process_retention: maxResults của query top video (giới hạn của API cho dimension=video là 200)
+RETENTION_BACKFILL_LIMIT = 200
+
+DETAIL_METRICS = "views,estimatedMinutesWatched,averageViewDuration,averageViewPercentage,engagedViews"
+
+
+DRILL_KINDS = ("retention", "traffic", "playback")
+
+
+class DrillTask(NamedTuple):
+    kind: str       # "retention" | "traffic" | "playback"
+    video_id: str
+    type: str = ""  # source type / playback location type ("" với retention)
+
+
+# ===== Pruning =====
+def views_matrix(credentials, base_req: Dict, video_ids: List[str], dimension: str,
+                 caps=None, transport=None) -> Dict[Tuple[str, str], int]:
+    """(video_id, <dimension>) -> views, bằng query tổng hợp `video,<dimension>` theo chunk video."""
+    out: Dict[Tuple[str, str], int] = {}
+    for i in range(0, len(video_ids), MATRIX_VIDEO_CHUNK):
+        chunk = video_ids[i:i + MATRIX_VIDEO_CHUNK]
+        req = {**base_req, "dimensions": f"video,{dimension}", "metrics": "views",
+               "filters": "video==" + ",".join(chunk)}
+        resp = query_report(credentials, req, caps, transport=transport)
+        for vid, typ, views in resp.get("rows") or []:
+            out[(vid, typ)] = int(views or 0)
+    return out
+
+
+def plan_drilldown(video_ids: List[str],
+                   source_views: Dict[Tuple[str, str], int],
+                   playback_views: Optional[Dict[Tuple[str, str], int]] = None,
+                   min_views: int = DRILLDOWN_MIN_VIEWS,
+                   kinds: Tuple[str, ...] = DRILL_KINDS) -> List[DrillTask]:
+    """Danh sách task sau khi bỏ tổ hợp không có views (video không có views -> bỏ cả retention)."""
+    total = defaultdict(int)
+    for (vid, _), v in source_views.items():
+        total[vid] += v
+
+    tasks: List[DrillTask] = []
+    for vid in video_ids:
+        if total[vid] < min_views:
+            continue
+        if "retention" in kinds:
+            tasks.append(DrillTask("retention", vid))
+        if "traffic" in kinds:
+            tasks.extend(DrillTask("traffic", vid, t) for t in DETAIL_SOURCE_TYPES
+                         if source_views.get((vid, t), 0) >= min_views)
+        if "playback" not in kinds:
+            continue
+        if playback_views is None:
+            # không có ma trận playback (query tổng hợp bị từ chối) -> thử đủ các type
+            tasks.extend(DrillTask("playback", vid, t) for t in PLAYBACK_LOCATION_TYPES)
+        else:
+            tasks.extend(DrillTask("playback", vid, t) for t in PLAYBACK_LOCATION_TYPES
+                         if playback_views.get((vid, t), 0) >= min_views)
+    return tasks
+
+
+# ===== Fetch =====
+def _task_request(task: DrillTask, base_req: Dict) -> Dict:
+    if task.kind == "retention":
+        return {**base_req, "dimensions": "elapsedVideoTimeRatio", "metrics": "audienceWatchRatio",
+                "filters": f"video=={task.video_id};audienceType==ORGANIC"}
+    if task.kind == "traffic":
+        return {**base_req, "dimensions": "insightTrafficSourceDetail", "metrics": DETAIL_METRICS,
+                "filters": f"video=={task.video_id};insightTrafficSourceType=={task.type}", "sort": "-views"}
+    return {**base_req, "dimensions": "insightPlaybackLocationDetail", "metrics": DETAIL_METRICS,
+            "filters": f"video=={task.video_id};insightPlaybackLocationType=={task.type}", "sort": "-views"}
+
+
+def _fetch_task(credentials, base_req: Dict, transport, task: DrillTask):
+    """
+    (task, rows, error) — không raise để run_ordered không dừng giữa chừng.
+    Không dùng capability cache: lỗi ở đây phụ thuộc filter video (vd video quá ít dữ liệu),
+    không có nghĩa tổ hợp dimension/metric không được hỗ trợ.
+    """
+    try:
+        resp = query_report(credentials, _task_request(task, base_req), transport=transport)
+        return task, resp.get("rows") or [], None
+    except HttpError as e:
+        return task, [], f"http {e.resp.status}"
+    except Exception as e:
+        return task, [], e.__class__.__name__
+
+
+def retention_curve(rows: List[List]) -> List[Optional[float]]:
+    """Các dòng (elapsedVideoTimeRatio, audienceWatchRatio) -> mảng RETENTION_BUCKETS phần tử (ratio 0.01..1.00)."""
+    curve: List[Optional[float]] = [None] * RETENTION_BUCKETS
+    for ratio, watch in rows:
+        i = min(RETENTION_BUCKETS, max(1, round(float(ratio) * RETENTION_BUCKETS))) - 1
+        curve[i] = float(watch)
+    return curve
+
+
+# ===== PostgreSQL =====
+_DDL = """
+CREATE TABLE IF NOT EXISTS video_traffic_detail (
+  account_tag   TEXT NOT NULL,
+  video_id      TEXT NOT NULL,
+  start_date    DATE NOT NULL,
+  end_date      DATE NOT NULL,
+  source_type   TEXT NOT NULL,
+  source_detail TEXT NOT NULL,
+  views                     BIGINT,
+  estimated_minutes_watched DOUBLE PRECISION,
+  average_view_duration     DOUBLE PRECISION,
+  average_view_percentage   DOUBLE PRECISION,
+  engaged_views             BIGINT,
+  PRIMARY KEY (account_tag, video_id, start_date, end_date, source_type, source_detail)
+);
+CREATE TABLE IF NOT EXISTS video_playback_detail (
+  account_tag     TEXT NOT NULL,
+  video_id        TEXT NOT NULL,
+  start_date      DATE NOT NULL,
+  end_date        DATE NOT NULL,
+  location_type   TEXT NOT NULL,
+  location_detail TEXT NOT NULL,
+  views                     BIGINT,
+  estimated_minutes_watched DOUBLE PRECISION,
+  average_view_duration     DOUBLE PRECISION,
+  average_view_percentage   DOUBLE PRECISION,
+  engaged_views             BIGINT,
+  PRIMARY KEY (account_tag, video_id, start_date, end_date, location_type, location_detail)
+);
+CREATE TABLE IF NOT EXISTS video_retention (
+  account_tag   TEXT NOT NULL,
+  video_id      TEXT NOT NULL,
+  start_date    DATE NOT NULL,
+  end_date      DATE NOT NULL,
+  audience_type TEXT NOT NULL DEFAULT 'ORGANIC',
+  watch_ratio   REAL[] NOT NULL,
+  PRIMARY KEY (account_tag, video_id, start_date, end_date, audience_type)
+)
+"""
+
+# window được drill lại -> xóa kết quả cũ của các video đó (detail có thể biến mất giữa 2 lần chạy)
+_DELETE_WINDOW = """
+DELETE FROM {table}
+WHERE account_tag = %s AND start_date = %s AND end_date = %s AND video_id = ANY(%s)
+"""
+
+_INSERT_TRAFFIC = """
+INSERT INTO video_traffic_detail
+  (account_tag, video_id, start_date, end_date, source_type, source_detail,
+   views, estimated_minutes_watched, average_view_duration, average_view_percentage, engaged_views)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT DO NOTHING
+"""
+
+_INSERT_PLAYBACK = """
+INSERT INTO video_playback_detail
+  (account_tag, video_id, start_date, end_date, location_type, location_detail,
+   views, estimated_minutes_watched, average_view_duration, average_view_percentage, engaged_views)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT DO NOTHING
+"""
+
+_INSERT_RETENTION = """
+INSERT INTO video_retention (account_tag, video_id, start_date, end_date, audience_type, watch_ratio)
+VALUES (%s, %s, %s, %s, 'ORGANIC', %s)
+ON CONFLICT DO NOTHING
+"""
+
+
+def ensure_drilldown_schema(conn):
+    for stmt in _DDL.strip().split(";\n"):
+        conn.execute(text(stmt))
+
+
+def save_drilldown(results, account_tag: str, start_date: str, end_date: str,
+                   video_ids: List[str], pg_url: str, kinds: Tuple[str, ...] = DRILL_KINDS):
+    traffic, playback, retention = [], [], []
+    failed = defaultdict(set)  # kind -> video lỗi: giữ nguyên kết quả lần trước của video đó
+    for task, rows, err in results:
+        if err:
+            failed[task.kind].add(task.video_id)
+            continue
+        key = (account_tag, task.video_id, start_date, end_date)
+        if task.kind == "retention":
+            if rows:
+                retention.append(key + (retention_curve(rows),))
+        elif task.kind == "traffic":
+            traffic.extend(key + (task.type, *r) for r in rows)
+        else:
+            playback.extend(key + (task.type, *r) for r in rows)
+    traffic = [r for r in traffic if r[1] not in failed["traffic"]]
+    playback = [r for r in playback if r[1] not in failed["playback"]]
+
+    engine = create_engine(pg_url, future=True)
+    with engine.begin() as conn:
+        ensure_drilldown_schema(conn)
+        for kind, table in (("traffic", "video_traffic_detail"), ("playback", "video_playback_detail"),
+                            ("retention", "video_retention")):
+            if kind not in kinds:
+                continue  # loại không fetch lần này: giữ nguyên kết quả cũ
+            done = [v for v in video_ids if v not in failed[kind]]
+            conn.exec_driver_sql(_DELETE_WINDOW.format(table=table), (account_tag, start_date, end_date, done))
+        if traffic:
+            conn.exec_driver_sql(_INSERT_TRAFFIC, traffic)
+        if playback:
+            conn.exec_driver_sql(_INSERT_PLAYBACK, playback)
+        if retention:
+            conn.exec_driver_sql(_INSERT_RETENTION, retention)
+        bump_data_version(conn, account_tag)
+
+    return {"traffic_rows": len(traffic), "playback_rows": len(playback), "retention_curves": len(retention)}
+
+
+# ===== Runner =====
+def run_drilldown(credentials, account_tag: str, base_req: Dict, video_ids: List[str],
+                  pg_url: Optional[str] = None, transport=None, workers: int = REPORT_WORKERS,
+                  kinds: Tuple[str, ...] = DRILL_KINDS):
+    """
+    Drill-down cho `video_ids` trong window base_req[startDate..endDate].
+    pg_url=None -> chỉ fetch, trả về kết quả (không ghi DB).
+    kinds: chỉ chạy một số loại (vd ("retention",) để backfill retention cho nhiều video).
+    """
+    transport = get_transport(transport)
+    caps = get_capabilities()
+    naive = len(video_ids) * (("retention" in kinds)
+                              + len(DETAIL_SOURCE_TYPES) * ("traffic" in kinds)
+                              + len(PLAYBACK_LOCATION_TYPES) * ("playback" in kinds))
+
+    try:
+        try:
+            source_views = views_matrix(credentials, base_req, video_ids, "insightTrafficSourceType",
+                                        caps, transport)
+        except (HttpError, UnsupportedQuery) as e:
+            print(f"  ✗ drill-down: không lấy được ma trận video x traffic source ({e}) → skip")
+            return None
+        playback_views = None
+        if "playback" in kinds:
+            try:
+                playback_views = views_matrix(credentials, base_req, video_ids, "insightPlaybackLocationType",
+                                              caps, transport)
+            except (HttpError, UnsupportedQuery):
+                pass
+
+        tasks = plan_drilldown(video_ids, source_views, playback_views, kinds=kinds)
+        print(f"  → drill-down: {len(tasks)} / {naive} queries sau khi lọc tổ hợp không có views")
+
+        results = list(run_ordered(
+            (partial(_fetch_task, credentials, base_req, transport, t) for t in tasks),
+            max_workers=workers,
+        ))
+    finally:
+        caps.flush()
+
+    errors = defaultdict(int)
+    for _, _, err in results:
+        if err:
+            errors[err] += 1
+    if errors:
+        print("  · drill-down lỗi:", dict(errors))
+
+    if not pg_url:
+        return results
+    stats = save_drilldown(results, account_tag, base_req["startDate"], base_req["endDate"], video_ids, pg_url,
+                           kinds)
+    print(f"  ✓ drill-down saved: {stats}")
+    return stats
+
+
+def process_drilldown(cred_file: str, start_date: str, end_date: str, limit: int = 50, transport=None,
+                      kinds: Tuple[str, ...] = DRILL_KINDS):
+    """Top `limit` video theo views trong [start_date, end_date] của 1 account (channel mode)."""
+    transport = get_transport(transport)
+    cred_path = os.path.join("credentials", cred_file)
+    pg_url = os.getenv("PG_URL")
+
+    credentials = None if transport.offline else create_token_from_credentials(cred_path)
+    account_tag = sanitize_filename(os.path.splitext(cred_file)[0])
+
+    base_req = {"ids": "channel==MINE", "startDate": start_date, "endDate": end_date}
+    resp = query_report(credentials, {**base_req, "dimensions": "video", "metrics": "views",
+                                      "sort": "-views", "maxResults": limit}, transport=transport)
+    video_ids = [r[0] for r in resp.get("rows") or []]
+    if not video_ids:
+        print("  · drill-down: không có video nào có views")
+        return None
+    return run_drilldown(credentials, account_tag, base_req, video_ids, pg_url, transport=transport, kinds=kinds)
+
+
+def process_retention(cred_file: str, start_date: str, end_date: str, limit: int = RETENTION_BACKFILL_LIMIT,
+                      transport=None):
+    """Chỉ retention (1 query / video có views), cho tối đa `limit` video nhiều views nhất."""
+    return process_drilldown(cred_file, start_date, end_date, limit, transport=transport, kinds=("retention",))
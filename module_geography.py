@@ -1,8 +1,9 @@
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-def fetch_geography(credentials, start_date: str, end_date: str):
-    yta = build("youtubeAnalytics", "v2", credentials=credentials)
+from module_transport import get_transport
+
+def fetch_geography(credentials, start_date: str, end_date: str, transport=None):
+    yta = get_transport(transport).build("youtubeAnalytics", "v2", credentials=credentials)
 
     metrics = ",".join([
         "views",
@@ -0,0 +1,290 @@
+# module_jobs.py — checkpoint cho backfill dài (stage content / overall của get_data.py)
+# 1 job = 1 lần chạy (account_tag, stage), chia thành unit (batch video) lưu sẵn payload trong ingest_units.
+# Mỗi unit ghi dữ liệu xong -> đánh dấu done; process chết giữa chừng (token hết hạn, quota, crash)
+# -> lần chạy sau tiếp job đang dở, bỏ qua unit đã done thay vì chạy lại từ đầu.
+# Ghi dữ liệu của unit đều là upsert -> chết giữa "ghi dữ liệu" và "đánh dấu done" chỉ làm lại đúng unit đó.
+#
+# CLI:
+#   python module_jobs.py list [--account X] [--stage content]
+#   python module_jobs.py show <job_id>
+#   python module_jobs.py requeue <job_id> [--unit videos:00003 ...]
+import argparse
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine, text
+
+
+# ===== Config =====
+# unit lỗi được tự chạy lại ở các lần sau tối đa JOB_MAX_ATTEMPTS lần, quá thì chờ requeue bằng CLI
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# lỗi liên tiếp (thường là quota / token) -> dừng stage, unit còn lại giữ pending cho lần sau
+JOB_MAX_CONSECUTIVE_FAILURES = int(os.getenv("JOB_MAX_CONSECUTIVE_FAILURES", "3"))
+
+Unit = Tuple[str, object]  # (unit key, payload JSON)
+
+
+# ===== PostgreSQL =====
+_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  job_id      BIGSERIAL PRIMARY KEY,
+  account_tag TEXT NOT NULL,
+  stage       TEXT NOT NULL,
+  status      TEXT NOT NULL DEFAULT 'running',
+  created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_account_stage
+ON ingest_jobs (account_tag, stage, job_id DESC);
+CREATE TABLE IF NOT EXISTS ingest_units (
+  job_id     BIGINT NOT NULL REFERENCES ingest_jobs (job_id) ON DELETE CASCADE,
+  unit       TEXT NOT NULL,
+  payload    JSONB NOT NULL,
+  status     TEXT NOT NULL DEFAULT 'pending',
+  attempts   INTEGER NOT NULL DEFAULT 0,
+  rows       BIGINT,
+  error      TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (job_id, unit)
+)
+"""
+# status job: running (còn unit chưa xong) | done | failed (chỉ còn unit lỗi quá JOB_MAX_ATTEMPTS)
+# status unit: pending | done | failed
+
+_OPEN_JOB = """
+SELECT job_id FROM ingest_jobs
+WHERE account_tag = %s AND stage = %s AND status = 'running'
+ORDER BY job_id DESC
+LIMIT 1
+"""
+
+_NEW_JOB = """
+INSERT INTO ingest_jobs (account_tag, stage) VALUES (%s, %s) RETURNING job_id
+"""
+
+_ADD_UNIT = """
+INSERT INTO ingest_units (job_id, unit, payload) VALUES (%s, %s, %s::jsonb)
+"""
+
+_TODO = """
+SELECT unit, payload FROM ingest_units
+WHERE job_id = %s AND (status = 'pending' OR (status = 'failed' AND attempts < %s))
+ORDER BY unit
+"""
+
+_UNIT_DONE = """
+UPDATE ingest_units
+SET status = 'done', attempts = attempts + 1, rows = %s, error = NULL, updated_at = now()
+WHERE job_id = %s AND unit = %s
+"""
+
+_UNIT_FAILED = """
+UPDATE ingest_units
+SET status = 'failed', attempts = attempts + 1, error = %s, updated_at = now()
+WHERE job_id = %s AND unit = %s
+"""
+
+_COUNTS = """
+SELECT status, count(*), COALESCE(sum(rows), 0), count(*) FILTER (WHERE attempts < %s)
+FROM ingest_units WHERE job_id = %s GROUP BY status
+"""
+
+_FINISH_JOB = """
+UPDATE ingest_jobs SET status = %s, finished_at = now() WHERE job_id = %s
+"""
+
+
+def _engine(pg_url: Optional[str]):
+    pg_url = pg_url or os.getenv("PG_URL")
+    if not pg_url:
+        raise RuntimeError("Missing PG_URL environment variable")
+    engine = create_engine(pg_url, future=True)
+    with engine.begin() as conn:
+        for stmt in _DDL.strip().split(";\n"):
+            conn.execute(text(stmt))
+    return engine
+
+
+def is_item_error(e: Exception) -> bool:
+    """Lỗi chỉ của 1 item (video bị xóa / private -> 400/404): bỏ qua item, không tính unit lỗi."""
+    return isinstance(e, HttpError) and e.resp.status in (400, 404)
+
+
+# ===== Job =====
+class Job:
+    def __init__(self, engine, job_id: int, account_tag: str, stage: str, resumed: bool):
+        self.engine = engine
+        self.job_id = job_id
+        self.account_tag = account_tag
+        self.stage = stage
+        self.resumed = resumed
+
+    def todo(self) -> List[Unit]:
+        with self.engine.connect() as conn:
+            return [(r[0], r[1]) for r in conn.exec_driver_sql(_TODO, (self.job_id, JOB_MAX_ATTEMPTS))]
+
+    def mark_done(self, unit: str, rows: int):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_UNIT_DONE, (rows, self.job_id, unit))
+
+    def mark_failed(self, unit: str, error: str):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(_UNIT_FAILED, (error[:2000], self.job_id, unit))
+
+    def counts(self) -> Dict[str, int]:
+        out = {"pending": 0, "done": 0, "failed": 0, "retryable": 0, "rows": 0}
+        with self.engine.connect() as conn:
+            for status, n, rows, retryable in conn.exec_driver_sql(_COUNTS, (JOB_MAX_ATTEMPTS, self.job_id)):
+                out[status] = n
+                out["rows"] += rows
+                if status == "failed":
+                    out["retryable"] = retryable
+        return out
+
+    def finish(self) -> Dict[str, int]:
+        """Đóng job nếu không còn gì để chạy; còn unit pending / lỗi chạy lại được -> giữ running."""
+        counts = self.counts()
+        if not counts["pending"] and not counts["retryable"]:
+            status = "failed" if counts["failed"] else "done"
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql(_FINISH_JOB, (status, self.job_id))
+            counts["status"] = status
+        else:
+            counts["status"] = "running"
+        return counts
+
+
+def open_job(pg_url: Optional[str], account_tag: str, stage: str, plan: Callable[[], List[Unit]]) -> Job:
+    """
+    Job đang chạy dở của (account_tag, stage) nếu có (không gọi plan), không thì tạo job mới
+    với các unit do plan() trả về. Unit key nên sort được theo thứ tự chạy (vd "videos:00012").
+    """
+    engine = _engine(pg_url)
+    with engine.connect() as conn:
+        job_id = conn.exec_driver_sql(_OPEN_JOB, (account_tag, stage)).scalar()
+    if job_id is not None:
+        return Job(engine, job_id, account_tag, stage, resumed=True)
+
+    units = plan()
+    with engine.begin() as conn:
+        job_id = conn.exec_driver_sql(_NEW_JOB, (account_tag, stage)).scalar()
+        if units:
+            conn.exec_driver_sql(_ADD_UNIT, [(job_id, key, json.dumps(payload)) for key, payload in units])
+    return Job(engine, job_id, account_tag, stage, resumed=False)
+
+
+def run_units(job: Job, work: Callable[[object], int]) -> Dict[str, int]:
+    """
+    Chạy work(payload) cho từng unit chưa xong (tuần tự, theo unit key); work trả về số dòng đã ghi.
+    Exception của 1 unit -> unit failed, chạy tiếp; JOB_MAX_CONSECUTIVE_FAILURES lỗi liền nhau -> dừng.
+    """
+    todo = job.todo()
+    tag = f"[job {job.job_id}] [{job.account_tag}/{job.stage}]"
+    if job.resumed:
+        print(f"{tag} resume: còn {len(todo)} unit")
+    consecutive = 0
+    for unit, payload in todo:
+        try:
+            rows = work(payload)
+        except Exception as e:
+            consecutive += 1
+            job.mark_failed(unit, f"{e.__class__.__name__}: {e}")
+            print(f"{tag} ✗ {unit}: {e.__class__.__name__}: {e}")
+            if consecutive >= JOB_MAX_CONSECUTIVE_FAILURES:
+                print(f"{tag} {consecutive} unit lỗi liên tiếp → dừng, chạy lại sau để tiếp tục")
+                break
+            continue
+        consecutive = 0
+        job.mark_done(unit, rows)
+        print(f"{tag} ✓ {unit}: {rows} rows")
+
+    counts = job.finish()
+    print(f"{tag} {counts['status']}: done={counts['done']} pending={counts['pending']} failed={counts['failed']}")
+    return counts
+
+
+# ===== Status =====
+_RECENT_JOBS = """
+SELECT j.job_id, j.account_tag, j.stage, j.status, j.created_at, j.finished_at,
+       count(u.unit), count(u.unit) FILTER (WHERE u.status = 'done'),
+       count(u.unit) FILTER (WHERE u.status = 'failed'), COALESCE(sum(u.rows), 0)
+FROM ingest_jobs j
+LEFT JOIN ingest_units u ON u.job_id = j.job_id
+WHERE (%(account)s::text IS NULL OR j.account_tag = %(account)s)
+  AND (%(stage)s::text IS NULL OR j.stage = %(stage)s)
+GROUP BY j.job_id
+ORDER BY j.job_id DESC
+LIMIT %(limit)s
+"""
+
+
+def recent_jobs(conn, account: Optional[str] = None, stage: Optional[str] = None, limit: int = 20) -> List[Dict]:
+    rows = conn.exec_driver_sql(_RECENT_JOBS, {"account": account, "stage": stage, "limit": limit}).all()
+    return [{
+        "jobId": r[0], "account": r[1], "stage": r[2], "status": r[3],
+        "createdAt": r[4], "finishedAt": r[5],
+        "units": r[6], "done": r[7], "failed": r[8], "rows": r[9],
+    } for r in rows]
+
+
+# ===== CLI =====
+def _list(engine, account: Optional[str], stage: Optional[str], limit: int):
+    with engine.connect() as conn:
+        jobs = recent_jobs(conn, account, stage, limit)
+    print(f"{'job':>6}  {'account':<28} {'stage':<10} {'status':<8} {'units':>11} {'failed':>6} {'rows':>10}  created")
+    for j in jobs:
+        progress = f"{j['done']}/{j['units']}"
+        print(f"{j['jobId']:>6}  {j['account']:<28} {j['stage']:<10} {j['status']:<8} {progress:>11} "
+              f"{j['failed']:>6} {j['rows']:>10}  {j['createdAt']:%Y-%m-%d %H:%M}")
+
+
+def _show(engine, job_id: int):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT unit, status, attempts, rows, error, updated_at FROM ingest_units "
+            "WHERE job_id = %s AND status <> 'done' ORDER BY unit", (job_id,)
+        ).all()
+    if not rows:
+        print(f"job {job_id}: không có unit chưa xong")
+    for unit, status, attempts, _, error, updated in rows:
+        print(f"{unit:<16} {status:<8} attempts={attempts} {updated:%Y-%m-%d %H:%M}  {error or ''}")
+
+
+def _requeue(engine, job_id: int, units: Optional[List[str]]):
+    with engine.begin() as conn:
+        n = conn.exec_driver_sql(
+            "UPDATE ingest_units SET status = 'pending', attempts = 0, error = NULL, updated_at = now() "
+            "WHERE job_id = %s AND status = 'failed' AND (%s::text[] IS NULL OR unit = ANY(%s::text[]))",
+            (job_id, units, units),
+        ).rowcount
+        if n:
+            # job mở lại -> stage tương ứng chạy tiếp job này ở lần chạy sau
+            conn.exec_driver_sql(
+                "UPDATE ingest_jobs SET status = 'running', finished_at = NULL WHERE job_id = %s", (job_id,)
+            )
+    print(f"job {job_id}: requeue {n} unit")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Xem / requeue checkpoint backfill (ingest_jobs, ingest_units).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_list = sub.add_parser("list", help="các job gần nhất")
+    p_list.add_argument("--account")
+    p_list.add_argument("--stage")
+    p_list.add_argument("--limit", type=int, default=20)
+    p_show = sub.add_parser("show", help="unit chưa xong / lỗi của 1 job")
+    p_show.add_argument("job_id", type=int)
+    p_requeue = sub.add_parser("requeue", help="đưa unit lỗi về pending (mặc định: mọi unit lỗi của job)")
+    p_requeue.add_argument("job_id", type=int)
+    p_requeue.add_argument("--unit", action="append")
+    args = ap.parse_args()
+
+    engine = _engine(None)
+    if args.cmd == "list":
+        _list(engine, args.account, args.stage, args.limit)
+    elif args.cmd == "show":
+        _show(engine, args.job_id)
+    else:
+        _requeue(engine, args.job_id, args.unit)
@@ -0,0 +1,237 @@
+# module_monetization.py — revenue / impressions theo (video, ngày) -> video_daily_monetization
+# 1) metric nào kênh đọc được (estimatedRevenue cần scope monetary + kênh bật kiếm tiền, impressions
+#    không phải kênh nào cũng có): probe 1 lần / kênh qua report_runner.supported_metrics (cache có TTL)
+# 2) query gộp `day,video` theo chunk video x window ngày; tổ hợp bị API từ chối -> capability cache
+#    nhớ lại, lần sau đi thẳng đường fallback 1 query `day` / video (song song, rate limit chung)
+# 3) incremental theo account: từ ngày cuối đã có (lùi MONETIZATION_LOOKBACK_DAYS vì revenue còn được
+#    điều chỉnh vài ngày sau), mỗi window ghi trong 1 transaction
+import os
+from datetime import date, timedelta
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine, text
+
+from capabilities import get_capabilities, is_forbidden_error
+from data_version import bump_data_version
+from module_trafficsource import create_token_from_credentials, sanitize_filename
+from module_transport import get_transport
+from report_runner import REPORT_WORKERS, UnsupportedQuery, query_report, run_ordered, supported_metrics
+
+
+# ===== Config =====
+# metric API -> cột video_daily_monetization
+MONETIZATION_COLUMNS = {
+    "estimatedRevenue": "estimated_revenue",
+    "impressions": "impressions",
+    "impressionsClickThroughRate": "impressions_ctr",
+}
+MONETIZATION_CURRENCY = os.getenv("MONETIZATION_CURRENCY", "USD")
+MONETIZATION_LOOKBACK_DAYS = int(os.getenv("MONETIZATION_LOOKBACK_DAYS", "3"))
+# 1 query gộp = tối đa VIDEO_CHUNK x WINDOW_DAYS dòng
+MONETIZATION_VIDEO_CHUNK = 50
+MONETIZATION_WINDOW_DAYS = 90
+
+
+# ===== PostgreSQL =====
+# PK (video_id, day) trùng video_daily_stats -> /api/content join theo range trên PK
+MONETIZATION_DDL = """
+CREATE TABLE IF NOT EXISTS video_daily_monetization (
+  video_id          TEXT NOT NULL,
+  day               DATE NOT NULL,
+  account_tag       TEXT NOT NULL,
+  estimated_revenue DOUBLE PRECISION,
+  impressions       BIGINT,
+  impressions_ctr   DOUBLE PRECISION,
+  PRIMARY KEY (video_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_vdm_account_day
+ON video_daily_monetization (account_tag, day)
+"""
+
+_UPSERT = """
+INSERT INTO video_daily_monetization
+  (video_id, day, account_tag, estimated_revenue, impressions, impressions_ctr)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON CONFLICT (video_id, day)
+DO UPDATE SET
+  account_tag = EXCLUDED.account_tag,
+  estimated_revenue = EXCLUDED.estimated_revenue,
+  impressions = EXCLUDED.impressions,
+  impressions_ctr = EXCLUDED.impressions_ctr
+"""
+
+# video đã có metadata (save_metadata của stage content) + ngày publish sớm nhất
+_VIDEOS = """
+SELECT video_id, published_at FROM videos WHERE account_tag = %s ORDER BY published_at
+"""
+
+_LAST_DAY = """
+SELECT max(day) FROM video_daily_monetization WHERE account_tag = %s
+"""
+
+
+def ensure_monetization_schema(conn):
+    for stmt in MONETIZATION_DDL.strip().split(";\n"):
+        conn.execute(text(stmt))
+
+
+def _rows_to_tuples(rows: List[List], metrics: List[str], account_tag: str) -> List[Tuple]:
+    """Dòng API (day, video, *metrics) -> tuple theo thứ tự bind của _UPSERT (metric không lấy -> NULL)."""
+    out = []
+    for r in rows:
+        values = dict(zip(metrics, r[2:]))
+        out.append((r[1], r[0], account_tag,
+                    *(values.get(m) for m in MONETIZATION_COLUMNS)))
+    return out
+
+
+# ===== Fetch =====
+def _windows(start: date, end: date, days: int = MONETIZATION_WINDOW_DAYS) -> List[Tuple[date, date]]:
+    out, cur = [], start
+    while cur <= end:
+        stop = min(end, cur + timedelta(days=days - 1))
+        out.append((cur, stop))
+        cur = stop + timedelta(days=1)
+    return out
+
+
+def _base_request(metrics: List[str], start: date, end: date) -> Dict:
+    req = {"ids": "channel==MINE", "startDate": start.isoformat(), "endDate": end.isoformat(),
+           "metrics": ",".join(metrics), "sort": "day"}
+    if "estimatedRevenue" in metrics:
+        req["currency"] = MONETIZATION_CURRENCY
+    return req
+
+
+def _fetch_chunk(credentials, req: Dict, video_ids: List[str], caps, transport) -> List[List]:
+    """Query gộp `day,video` cho 1 chunk video; raise UnsupportedQuery nếu API không nhận tổ hợp này."""
+    resp = query_report(credentials, {**req, "dimensions": "day,video",
+                                      "filters": "video==" + ",".join(video_ids)}, caps, transport=transport)
+    return resp.get("rows") or []
+
+
+def _fetch_video(credentials, req: Dict, transport, video_id: str):
+    """Fallback 1 video: (video_id, rows dạng (day, video, *metrics), error)."""
+    try:
+        resp = query_report(credentials, {**req, "dimensions": "day", "filters": f"video=={video_id}"},
+                            transport=transport)
+        return video_id, [[r[0], video_id, *r[1:]] for r in resp.get("rows") or []], None
+    except HttpError as e:
+        if e.resp.status in (400, 404) or is_forbidden_error(e):
+            # video bị xóa / private / không thuộc kênh: không có dữ liệu, không tính là lỗi
+            # (nếu không window sẽ kẹt mãi); 403 quota vẫn là lỗi
+            return video_id, [], None
+        return video_id, [], f"http {e.resp.status}"
+    except Exception as e:
+        return video_id, [], e.__class__.__name__
+
+
+def fetch_window(credentials, metrics: List[str], start: date, end: date, video_ids: List[str],
+                 caps=None, transport=None, workers: int = REPORT_WORKERS) -> Tuple[List[List], List[str]]:
+    """
+    (rows, video lỗi) của 1 window. Chunk gộp song song; chunk bị từ chối (tổ hợp không hỗ trợ,
+    400 / 403) -> các video của chunk đó chạy fallback từng video.
+    """
+    req = _base_request(metrics, start, end)
+    chunks = [video_ids[i:i + MONETIZATION_VIDEO_CHUNK] for i in range(0, len(video_ids), MONETIZATION_VIDEO_CHUNK)]
+
+    def _chunk(chunk):
+        try:
+            return chunk, _fetch_chunk(credentials, req, chunk, caps, transport), None
+        except UnsupportedQuery as e:
+            return chunk, None, e
+        except HttpError as e:
+            if e.resp.status == 400 or is_forbidden_error(e):
+                # thường do 1 video trong chunk (bị xóa / private / không thuộc kênh) làm hỏng cả query:
+                # chạy lại từng video, video lỗi thật do _fetch_video xử lý (không kẹt window mãi);
+                # 403 quota thì gọi thêm 50 query cũng vô ích -> lỗi cả chunk như cũ
+                return chunk, None, e
+            return chunk, [], f"http {e.resp.status}"
+
+    rows: List[List] = []
+    failed: List[str] = []
+    fallback: List[str] = []
+    for chunk, chunk_rows, err in run_ordered((partial(_chunk, c) for c in chunks), max_workers=workers):
+        if isinstance(err, (UnsupportedQuery, HttpError)):
+            fallback.extend(chunk)
+        elif err:
+            failed.extend(chunk)
+        else:
+            rows.extend(chunk_rows)
+
+    if fallback:
+        for vid, video_rows, err in run_ordered(
+            (partial(_fetch_video, credentials, req, transport, v) for v in fallback), max_workers=workers
+        ):
+            if err:
+                failed.append(vid)
+            rows.extend(video_rows)
+    return rows, failed
+
+
+# ===== Runner =====
+def run_monetization(credentials, account_tag: str, pg_url: str, transport=None,
+                     start: Optional[date] = None, end: Optional[date] = None,
+                     workers: int = REPORT_WORKERS):
+    """
+    Incremental cho 1 account (channel mode). start=None -> tiếp từ ngày cuối đã có
+    (lần đầu: ngày publish sớm nhất trong bảng videos). Window lỗi -> dừng, lần sau chạy lại từ đó.
+    """
+    transport = get_transport(transport)
+    engine = create_engine(pg_url, future=True)
+    with engine.begin() as conn:
+        ensure_monetization_schema(conn)
+        videos = conn.exec_driver_sql(_VIDEOS, (account_tag,)).all()
+        last = conn.exec_driver_sql(_LAST_DAY, (account_tag,)).scalar()
+    if not videos:
+        print("  · monetization: chưa có video (chạy stage content trước)")
+        return None
+
+    caps = get_capabilities()
+    yt = transport.build("youtube", "v3", credentials=credentials)
+    channel = (yt.channels().list(part="id", mine=True).execute().get("items") or [{}])[0]
+    base_req = {"ids": "channel==MINE"}
+    metrics = supported_metrics(credentials, channel.get("id", account_tag), base_req,
+                                list(MONETIZATION_COLUMNS), caps=caps, transport=transport)
+    if not {"estimatedRevenue", "impressions"} & set(metrics):
+        print("  · monetization: kênh không đọc được revenue / impressions → skip")
+        return None
+
+    end = end or date.today()
+    if start is None:
+        start = last - timedelta(days=MONETIZATION_LOOKBACK_DAYS) if last else videos[0][1]
+    print(f"→ monetization {account_tag}: {start} → {end}, metrics={','.join(metrics)}")
+
+    saved = 0
+    try:
+        for w_start, w_end in _windows(start, end):
+            vids = [vid for vid, published in videos if published is None or published <= w_end]
+            if not vids:
+                continue
+            rows, failed = fetch_window(credentials, metrics, w_start, w_end, vids, caps, transport, workers)
+            if failed:
+                # ghi phần đã xong trước window này; window lỗi không ghi để ngày cuối không vượt qua chỗ thiếu
+                print(f"  ✗ monetization {w_start}..{w_end}: {len(failed)} video lỗi → dừng")
+                break
+            with engine.begin() as conn:
+                if rows:
+                    conn.exec_driver_sql(_UPSERT, _rows_to_tuples(rows, metrics, account_tag))
+                bump_data_version(conn, account_tag)
+            saved += len(rows)
+            print(f"  ✓ {w_start}..{w_end}: {len(rows)} rows")
+    finally:
+        caps.flush()
+    return {"rows": saved, "metrics": metrics}
+
+
+def process_monetization(cred_file: str, transport=None):
+    transport = get_transport(transport)
+    cred_path = os.path.join("credentials", cred_file)
+    pg_url = os.getenv("PG_URL")
+
+    credentials = None if transport.offline else create_token_from_credentials(cred_path)
+    account_tag = sanitize_filename(os.path.splitext(cred_file)[0])
+
+    return run_monetization(credentials, account_tag, pg_url, transport=transport)
@@ -1,13 +1,16 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from sqlalchemy import create_engine, text
 
-from module_trafficsource import create_token_from_credentials
+from module_trafficsource import create_token_from_credentials, get_youtube_data
 from module_content import get_upload_playlist_id, get_video_list
+from module_transport import get_transport
+from data_version import bump_data_version
+from module_jobs import is_item_error, open_job, run_units
+from report_runner import supported_metrics
 
 
 # ======================================================================
@@ -28,23 +31,32 @@ ANALYTICS_METRICS = [
 ]
 
 
+# số video / unit checkpoint (module_jobs)
+OVERALL_UNIT_VIDEOS = 50
+
+
 # ======================================================================
 # YOUTUBE ANALYTICS AGGREGATE QUERY
 # ======================================================================
-def get_yt_analytics(credentials, video_id: str) -> Dict:
-    yta = build("youtubeAnalytics", "v2", credentials=credentials)
+def get_yt_analytics(credentials, video_id: str, transport=None,
+                     metrics: Optional[List[str]] = None, strict: bool = False) -> Dict:
+    """strict: HttpError không phải của riêng video (quota, 5xx) -> raise để unit backfill được chạy lại."""
+    metrics = metrics or ANALYTICS_METRICS
+    yta = get_transport(transport).build("youtubeAnalytics", "v2", credentials=credentials)
 
     query = {
         "ids": "channel==MINE",
         "startDate": "2000-01-01",
         "endDate": "2099-01-01",
-        "metrics": ",".join(ANALYTICS_METRICS),
+        "metrics": ",".join(metrics),
         "filters": f"video=={video_id}",
     }
 
     try:
         resp = yta.reports().query(**query).execute()
     except HttpError as e:
+        if strict and not is_item_error(e):
+            raise
         print(f"[ERROR] Analytics failed for {video_id}:", e)
         return {}
 
@@ -59,7 +71,7 @@ def get_yt_analytics(credentials, video_id: str) -> Dict:
     idx = {h["name"]: i for i, h in enumerate(headers)}
 
     out: Dict[str, float | None] = {}
-    for m in ANALYTICS_METRICS:
+    for m in metrics:
         i = idx.get(m)
         if i is not None:
             try:
@@ -73,8 +85,8 @@ def get_yt_analytics(credentials, video_id: str) -> Dict:
 # ======================================================================
 # LẤY THÔNG TIN VIDEO (Data API)
 # ======================================================================
-def get_video_snippet_map(credentials, video_ids: List[str]) -> Dict[str, Dict]:
-    youtube = build("youtube", "v3", credentials=credentials)
+def get_video_snippet_map(credentials, video_ids: List[str], transport=None) -> Dict[str, Dict]:
+    youtube = get_transport(transport).build("youtube", "v3", credentials=credentials)
     result: Dict[str, Dict] = {}
 
     for i in range(0, len(video_ids), 50):
@@ -195,7 +207,8 @@ def save_video_overview(pg_url: str, video_data: dict):
 # ======================================================================
 # MAIN PIPELINE
 # ======================================================================
-def process_overall(cred_file: str):
+def process_overall(cred_file: str, transport=None):
+    transport = get_transport(transport)
     pg_url = os.getenv("PG_URL")
     if not pg_url:
         raise RuntimeError("Missing PG_URL environment variable")
@@ -206,24 +219,48 @@ def process_overall(cred_file: str):
     # Derive account_tag từ tên file credential, ví dụ: mychannel.json -> "mychannel"
     account_tag = os.path.splitext(os.path.basename(cred_file))[0]
 
-    # Load credentials
-    credentials = create_token_from_credentials(os.path.join("credentials", cred_file))
-
-    # Lấy toàn bộ video trên kênh
-    playlist_id = get_upload_playlist_id(credentials)
-    video_ids = get_video_list(credentials, playlist_id)
-
-    print(f"[INFO] [{account_tag}] Found {len(video_ids)} videos.")
-
-    # Snippet info
-    snippet_map = get_video_snippet_map(credentials, video_ids)
+    # Load credentials (transport offline: không cần OAuth)
+    credentials = None if transport.offline else create_token_from_credentials(
+        os.path.join("credentials", cred_file)
+    )
+
+    # 1 metric không hỗ trợ làm cả query từng video 400 -> lọc trước (probe nhớ theo kênh, có TTL)
+    ch = get_youtube_data(credentials, transport=transport)
+    metrics = supported_metrics(credentials, ch["channel_id"] if ch else account_tag,
+                                {"ids": "channel==MINE"}, ANALYTICS_METRICS, transport=transport)
+    if len(metrics) < len(ANALYTICS_METRICS):
+        print(f"[INFO] [{account_tag}] Skip unsupported metrics: {sorted(set(ANALYTICS_METRICS) - set(metrics))}")
+
+    def plan():
+        # Lấy toàn bộ video trên kênh
+        playlist_id = get_upload_playlist_id(credentials, transport=transport)
+        video_ids = get_video_list(credentials, playlist_id, transport=transport)
+        print(f"[INFO] [{account_tag}] Found {len(video_ids)} videos.")
+        return [
+            (f"videos:{i // OVERALL_UNIT_VIDEOS:05d}", video_ids[i:i + OVERALL_UNIT_VIDEOS])
+            for i in range(0, len(video_ids), OVERALL_UNIT_VIDEOS)
+        ]
+
+    # job dang dở -> chỉ chạy các batch video chưa xong (checkpoint: module_jobs)
+    job = open_job(pg_url, account_tag, "overall", plan)
+    counts = run_units(job, lambda video_ids: _overall_unit(credentials, account_tag, pg_url,
+                                                            video_ids, metrics, transport))
+    if counts["status"] == "done":
+        print(f"[DONE] [{account_tag}] All videos processed & saved to database.")
+    return counts
+
+
+def _overall_unit(credentials, account_tag: str, pg_url: str, video_ids: List[str],
+                  metrics: List[str], transport) -> int:
+    # Snippet info (1 request / 50 video)
+    snippet_map = get_video_snippet_map(credentials, video_ids, transport=transport)
 
     # ETL từng video
     for vid in video_ids:
         print(f"[INFO] [{account_tag}] Processing video {vid} ...")
 
         base = snippet_map.get(vid, {})
-        ana = get_yt_analytics(credentials, vid)
+        ana = get_yt_analytics(credentials, vid, transport=transport, metrics=metrics, strict=True)
 
         video_data = {
             "account_tag": account_tag,
@@ -251,4 +288,6 @@ def process_overall(cred_file: str):
 
         save_video_overview(pg_url, video_data)
 
-    print(f"[DONE] [{account_tag}] All videos processed & saved to database.")
+    with create_engine(pg_url, future=True).begin() as conn:
+        bump_data_version(conn, account_tag)
+    return len(video_ids)
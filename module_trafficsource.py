@@ -2,16 +2,19 @@
 import os
 import pickle
 import re
-from typing import Dict, Tuple, Iterator, Optional, Set, List
+from typing import Dict, Tuple, Iterator, Optional, List
 from datetime import datetime, timedelta
 
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
 from sqlalchemy import create_engine, text
 
+from module_columnar import TRAFFIC_SCHEMA, RecordBatch, densify_daily, traffic_frame
+from module_transport import get_transport
+from data_version import bump_data_version
+
 
 
 # ===== Config =====
@@ -56,9 +59,9 @@ def create_token_from_credentials(cred_path: str):
             pickle.dump(creds, f)
     return creds
 
-def get_youtube_data(credentials):
+def get_youtube_data(credentials, transport=None):
     try:
-        youtube = build("youtube", "v3", credentials=credentials)
+        youtube = get_transport(transport).build("youtube", "v3", credentials=credentials)
         resp = youtube.channels().list(part="snippet,contentDetails,statistics", mine=True).execute()
         items = resp.get("items", [])
         if items:
@@ -101,6 +104,9 @@ CREATE TABLE IF NOT EXISTS traffic_source_daily (
 CREATE INDEX IF NOT EXISTS idx_tsd_day    ON traffic_source_daily(day);
 CREATE INDEX IF NOT EXISTS idx_tsd_source ON traffic_source_daily(source);
 CREATE INDEX IF NOT EXISTS idx_tsd_acct   ON traffic_source_daily(account_tag);
+-- covering cho /api/portfolio: index-only scan theo (account_tag, day)
+CREATE INDEX IF NOT EXISTS idx_tsd_acct_day_cover ON traffic_source_daily(account_tag, day)
+  INCLUDE (views, estimated_minutes_watched, engaged_views, average_view_duration, average_view_percentage);
 """
 
 _PG_UPSERT = """
@@ -118,6 +124,21 @@ ON CONFLICT (account_tag, channel_id, day, source) DO UPDATE SET
   engaged_views             = EXCLUDED.engaged_views
 """
 
+# Cùng câu upsert, bind theo vị trí (tuple theo thứ tự TRAFFIC_SCHEMA, có account_tag/channel_id đứng đầu)
+_PG_UPSERT_ROWS = """
+INSERT INTO traffic_source_daily
+ (account_tag, channel_id, day, source,
+  views, estimated_minutes_watched, average_view_duration,
+  average_view_percentage, engaged_views)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (account_tag, channel_id, day, source) DO UPDATE SET
+  views                     = EXCLUDED.views,
+  estimated_minutes_watched = EXCLUDED.estimated_minutes_watched,
+  average_view_duration     = EXCLUDED.average_view_duration,
+  average_view_percentage   = EXCLUDED.average_view_percentage,
+  engaged_views             = EXCLUDED.engaged_views
+"""
+
 def _chunks(seq: List[Dict], size: int):
     for i in range(0, len(seq), size):
         yield seq[i:i+size]
@@ -146,9 +167,9 @@ def _safe_date_ymd(d: str) -> str:
     return d[:10]
 
 # ===== Channel helpers =====
-def get_mine_channel_id(credentials) -> Optional[str]:
+def get_mine_channel_id(credentials, transport=None) -> Optional[str]:
     try:
-        yt = build("youtube", "v3", credentials=credentials)
+        yt = get_transport(transport).build("youtube", "v3", credentials=credentials)
         resp = yt.channels().list(part="id", mine=True, maxResults=1).execute() or {}
         items = resp.get("items", [])
         if items:
@@ -157,8 +178,8 @@ def get_mine_channel_id(credentials) -> Optional[str]:
         print(f"[WARN] get_mine_channel_id failed: {e}")
     return None
 
-def get_channel_created_date(credentials, channel_id: Optional[str] = None) -> Optional[str]:
-    yt = build("youtube", "v3", credentials=credentials)
+def get_channel_created_date(credentials, channel_id: Optional[str] = None, transport=None) -> Optional[str]:
+    yt = get_transport(transport).build("youtube", "v3", credentials=credentials)
     try:
         if IS_OWNER_MODE and CONTENT_OWNER_ID:
             if channel_id:
@@ -203,25 +224,28 @@ def _ids_extra_filters_for_owner(owner_channel_id: Optional[str]) -> Tuple[str,
     return "channel==MINE", {}, None
 
 # ===== DB write =====
-def save_traffic_source_daily_to_postgres(
-    out_rows: List[Dict],
-    account_tag: str,
-    channel_id: Optional[str] = None,
-    db_url: Optional[str] = None,
-    batch_size: int = 5000,
-):
+def _traffic_engine(db_url: Optional[str]):
     db_url = db_url or os.getenv("PG_URL")
     if not db_url:
         raise ValueError("Thiếu db_url. Truyền db_url hoặc đặt biến môi trường PG_URL.")
 
-    ch_id = channel_id or ""  # NOT NULL DEFAULT '' theo PK
     engine = create_engine(db_url, pool_pre_ping=True, future=True)
-
     with engine.begin() as conn:
         for stmt in _PG_DDL.strip().split(";\n"):
             s = stmt.strip()
             if s:
                 conn.execute(text(s))
+    return engine
+
+def save_traffic_source_daily_to_postgres(
+    out_rows: List[Dict],
+    account_tag: str,
+    channel_id: Optional[str] = None,
+    db_url: Optional[str] = None,
+    batch_size: int = 5000,
+):
+    ch_id = channel_id or ""  # NOT NULL DEFAULT '' theo PK
+    engine = _traffic_engine(db_url)
 
     payload = [{
         "account_tag": account_tag,
@@ -238,6 +262,25 @@ def save_traffic_source_daily_to_postgres(
     with engine.begin() as conn:
         for chunk in _chunks(payload, batch_size):
             conn.execute(text(_PG_UPSERT), chunk)
+        bump_data_version(conn, account_tag)
+
+def save_traffic_batch_to_postgres(
+    batch: RecordBatch,
+    account_tag: str,
+    channel_id: Optional[str] = None,
+    db_url: Optional[str] = None,
+    batch_size: int = 5000,
+):
+    """
+    Ghi RecordBatch (TRAFFIC_SCHEMA) thẳng xuống DB theo batch tuple.
+    Kiểu dữ liệu đã được ép 1 lần lúc parse, không có dict trung gian theo dòng.
+    """
+    engine = _traffic_engine(db_url)
+
+    with engine.begin() as conn:
+        for chunk in batch.iter_tuples(batch_size, prefix=(account_tag, channel_id or "")):
+            conn.exec_driver_sql(_PG_UPSERT_ROWS, chunk)
+        bump_data_version(conn, account_tag)
 
 # ===== Main fetcher → Postgres =====
 def run_traffic_source_lifetime_daily_to_postgres(
@@ -246,16 +289,19 @@ def run_traffic_source_lifetime_daily_to_postgres(
     owner_channel_id: Optional[str] = None,
     chunk_days: int = _CHUNK_DAYS_DEFAULT,
     pg_url: Optional[str] = None,
+    transport=None,
 ) -> int:
     """
     Lấy Traffic Source theo NGÀY (từ ngày kênh được tạo) và lưu thẳng vào PostgreSQL.
     Trả về số dòng (day,source) đã ghi (sau khi fill).
+    transport: xem module_transport (mặc định theo YT_TRANSPORT, tức API thật).
     """
+    transport = get_transport(transport)
     ids, extra, owner_filters = _ids_extra_filters_for_owner(owner_channel_id)
 
     # lifetime window, clamped by channel creation date
     start_date, end_date = get_date_range("lifetime")
-    created = get_channel_created_date(credentials, channel_id=owner_channel_id)
+    created = get_channel_created_date(credentials, channel_id=owner_channel_id, transport=transport)
     if created:
         try:
             s0 = datetime.strptime(start_date, "%Y-%m-%d").date()
@@ -269,10 +315,10 @@ def run_traffic_source_lifetime_daily_to_postgres(
     if IS_OWNER_MODE:
         channel_id_for_db = owner_channel_id or ""  # gộp nhiều kênh => rỗng
     else:
-        channel_id_for_db = get_mine_channel_id(credentials) or ""
+        channel_id_for_db = get_mine_channel_id(credentials, transport=transport) or ""
 
     # Query YouTube Analytics by chunks
-    yta = build("youtubeAnalytics", "v2", credentials=credentials)
+    yta = transport.build("youtubeAnalytics", "v2", credentials=credentials)
     metrics = ",".join([
         "views",
         "estimatedMinutesWatched",
@@ -281,8 +327,7 @@ def run_traffic_source_lifetime_daily_to_postgres(
         "averageViewPercentage",
     ])
 
-    data_map: Dict[Tuple[str, str], Dict] = {}
-    source_set: Set[str] = set()
+    raw = RecordBatch(TRAFFIC_SCHEMA)
 
     for sd, ed in _iter_day_chunks(start_date, end_date, chunk_days=chunk_days):
         q = {
@@ -303,59 +348,16 @@ def run_traffic_source_lifetime_daily_to_postgres(
             print(f"[WARN] Analytics query failed {sd}..{ed}: {he}")
             continue
 
-        rows = resp.get("rows") or []
-        if not rows:
-            continue
+        # ép kiểu ngay khi nhận (1 lần), không giữ lại response thô
+        raw.extend_response(resp)
 
-        col_index = {c["name"]: i for i, c in enumerate(resp.get("columnHeaders", []))}
-        i_day = col_index.get("day")
-        i_src = col_index.get("insightTrafficSourceType")
-        i_v   = col_index.get("views")
-        i_emw = col_index.get("estimatedMinutesWatched")
-        i_eng = col_index.get("engagedViews")
-        i_avp = col_index.get("averageViewPercentage")
-
-        for r in rows:
-            day = r[i_day]
-            src = r[i_src]
-            views = int(r[i_v] or 0)
-            emw = int(r[i_emw] or 0)
-            eng = int(r[i_eng] or 0)
-
-            # averageViewDuration (giây) tự tính từ emw/ views
-            avd = int(round((emw * 60) / views)) if views > 0 else 0
-            avp = float(r[i_avp]) if (i_avp is not None and r[i_avp] is not None) else 0.0
-
-            data_map[(day, src)] = {
-                "day": day,
-                "insightTrafficSourceType": src,
-                "views": views,
-                "estimatedMinutesWatched": emw,
-                "averageViewDuration": avd,
-                "averageViewPercentage": avp,
-                "engagedViews": eng,
-            }
-            source_set.add(src)
-
-    # Fill missing (day, source) with zeros so charts/aggregates are continuous
-    all_days = list(_iter_days(start_date, end_date))
-    for d in all_days:
-        for s in source_set:
-            if (d, s) not in data_map:
-                data_map[(d, s)] = {
-                    "day": d,
-                    "insightTrafficSourceType": s,
-                    "views": 0,
-                    "estimatedMinutesWatched": 0,
-                    "averageViewDuration": 0,
-                    "averageViewPercentage": 0.0,
-                    "engagedViews": 0,
-                }
-
-    out_rows = sorted(data_map.values(), key=lambda x: (x["day"], x["insightTrafficSourceType"]))
+    # Typed columns + fill missing (day, source) with zeros so charts/aggregates are continuous
+    dense = densify_daily(traffic_frame(raw), start_date, end_date)
+    out_rows = RecordBatch.from_frame(dense, TRAFFIC_SCHEMA)
+    del dense, raw
 
     # Save to Postgres
-    save_traffic_source_daily_to_postgres(
+    save_traffic_batch_to_postgres(
         out_rows,
         account_tag=account_tag,
         channel_id=channel_id_for_db,
@@ -365,14 +367,16 @@ def run_traffic_source_lifetime_daily_to_postgres(
     return len(out_rows)
 
 # ===== One-account runner =====
-def process_one(cred_file: str):
+def process_one(cred_file: str, transport=None):
+    transport = get_transport(transport)
     cred_path = os.path.join(CREDENTIALS_FOLDER, cred_file)
     account_tag = sanitize_filename(os.path.splitext(os.path.basename(cred_file))[0])
 
     print(f"\nProcessing {cred_file} (mode: {'OWNER' if IS_OWNER_MODE else 'CHANNEL'})...")
-    creds = create_token_from_credentials(cred_path)
+    # transport offline (replay/synthetic) không cần OAuth
+    creds = None if transport.offline else create_token_from_credentials(cred_path)
 
-    ch = get_youtube_data(creds)
+    ch = get_youtube_data(creds, transport=transport)
     if ch:
         print(f"  Channel: {ch['title']} ({ch['channel_id']}) | subs={ch['subs']} views={ch['views']} videos={ch['videos']}")
 
@@ -382,4 +386,5 @@ def process_one(cred_file: str):
         account_tag=account_tag,
         owner_channel_id=None,  # set UCxxx nếu muốn lọc 1 kênh trong OWNER mode
         pg_url=os.getenv("PG_URL"),  # hoặc truyền thẳng chuỗi URL
+        transport=transport,
     )
\ No newline at end of file
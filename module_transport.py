@@ -0,0 +1,425 @@
+# module_transport.py — transport cho YouTube Data/Analytics API, inject vào các module ingest.
+#   LiveTransport      : googleapiclient thật (cache service theo thread)
+#   RecordTransport    : gọi thật + ghi response xuống đĩa (cassette)
+#   ReplayTransport    : đọc lại cassette, có thể thêm latency / tỉ lệ lỗi giả lập
+#   SyntheticTransport : sinh response cho kênh có kích thước tùy ý (không cần credentials)
+# Chọn qua env YT_TRANSPORT = live | record:<dir> | replay:<dir> | synthetic:<videos>[:<years>]
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+
+# service đã build / thread của LiveTransport (ingest 1 account chỉ cần vài cái)
+LIVE_SERVICE_CACHE = int(os.getenv("LIVE_SERVICE_CACHE", "8"))
+
+
+# ===== Fake service (dùng chung cho replay/synthetic/record) =====
+# handler(service, resource, method, kwargs) -> response dict
+Handler = Callable[[str, str, str, Dict], Dict]
+
+
+class _Request:
+    def __init__(self, handler: Handler, service: str, resource: str, method: str, kwargs: Dict):
+        self._handler = handler
+        self.service = service
+        self.resource = resource
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, num_retries: int = 0):
+        return self._handler(self.service, self.resource, self.method, self.kwargs)
+
+
+class _Resource:
+    def __init__(self, handler: Handler, service: str, resource: str):
+        self._handler = handler
+        self._service = service
+        self._resource = resource
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(**kwargs):
+            return _Request(self._handler, self._service, self._resource, method, kwargs)
+        return call
+
+    def list_next(self, previous_request: _Request, previous_response: Dict) -> Optional[_Request]:
+        token = (previous_response or {}).get("nextPageToken")
+        if not token:
+            return None
+        return _Request(self._handler, self._service, self._resource, previous_request.method,
+                        {**previous_request.kwargs, "pageToken": token})
+
+
+class _Service:
+    def __init__(self, handler: Handler, service: str):
+        self._handler = handler
+        self._service = service
+
+    def __getattr__(self, resource: str):
+        if resource.startswith("_"):
+            raise AttributeError(resource)
+        return lambda: _Resource(self._handler, self._service, resource)
+
+
+def _http_error(status: int, content: bytes = b"", reason: str = "") -> HttpError:
+    resp = httplib2.Response({"status": status})
+    resp.reason = reason
+    return HttpError(resp, content)
+
+
+# ===== Transports =====
+class LiveTransport:
+    """
+    googleapiclient.build, cache service theo (thread, service, version, credentials).
+    Cache mỗi thread là LRU nhỏ: service giữ reference tới credentials, route nạp credentials mới
+    mỗi request (geography) -> không giới hạn thì mỗi request thêm 1 entry mãi mãi.
+    """
+
+    offline = False
+
+    def __init__(self, maxsize: int = LIVE_SERVICE_CACHE):
+        self.maxsize = maxsize
+        self._local = threading.local()
+
+    def build(self, service: str, version: str, credentials=None):
+        cache = getattr(self._local, "services", None)
+        if cache is None:
+            cache = self._local.services = OrderedDict()
+        # id() an toàn khi còn trong cache (service giữ credentials -> id không bị tái sử dụng)
+        key = (service, version, id(credentials))
+        svc = cache.get(key)
+        if svc is not None:
+            cache.move_to_end(key)
+            return svc
+        svc = cache[key] = build(service, version, credentials=credentials, cache_discovery=False)
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return svc
+
+
+def _cassette_key(service: str, resource: str, method: str, kwargs: Dict) -> str:
+    raw = json.dumps([service, resource, method, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _cassette_path(root: str, service: str, resource: str, method: str, key: str) -> str:
+    return os.path.join(root, service, f"{resource}.{method}", key + ".json")
+
+
+class RecordTransport:
+    """Gọi API thật qua `inner`, ghi mỗi response (hoặc HttpError) thành 1 file JSON."""
+
+    offline = False
+
+    def __init__(self, cassette_dir: str, inner: Optional[LiveTransport] = None):
+        self.cassette_dir = cassette_dir
+        self.inner = inner or LiveTransport()
+
+    def build(self, service: str, version: str, credentials=None):
+        real = self.inner.build(service, version, credentials=credentials)
+
+        def handler(svc, resource, method, kwargs):
+            req = getattr(getattr(real, resource)(), method)(**kwargs)
+            entry = {"request": {"service": svc, "resource": resource, "method": method, "kwargs": kwargs}}
+            # chỉ ghi cassette khi có response hoặc HttpError; lỗi mạng / token không ghi
+            # (entry thiếu "response" sẽ làm replay hỏng thay vì tái hiện lỗi)
+            try:
+                resp = req.execute()
+            except HttpError as e:
+                entry["error"] = {
+                    "status": e.resp.status,
+                    "reason": getattr(e.resp, "reason", ""),
+                    "content": (e.content or b"").decode("utf-8", errors="replace"),
+                }
+                self._write(svc, resource, method, kwargs, entry)
+                raise
+            entry["response"] = resp
+            self._write(svc, resource, method, kwargs, entry)
+            return resp
+
+        return _Service(handler, service)
+
+    def _write(self, svc: str, resource: str, method: str, kwargs: Dict, entry: Dict):
+        path = _cassette_path(self.cassette_dir, svc, resource, method,
+                              _cassette_key(svc, resource, method, kwargs))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+
+class _Faults:
+    """Latency + lỗi giả lập, tất định theo seed."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self):
+        with self._lock:
+            delay = self.latency_ms + (self._rnd.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+            fail = self.error_rate > 0 and self._rnd.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fail:
+            raise _http_error(self.error_status, b'{"error": {"message": "injected fault"}}', "Injected")
+
+
+class ReplayMissError(KeyError):
+    """Không có cassette cho request này (chưa record)."""
+
+
+class ReplayTransport:
+    """Đọc lại cassette của RecordTransport; thiếu cassette -> ReplayMissError."""
+
+    offline = True
+
+    def __init__(self, cassette_dir: str, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, seed: int = 0):
+        self.cassette_dir = cassette_dir
+        self.faults = _Faults(latency_ms, jitter_ms, error_rate, error_status, seed)
+
+    def build(self, service: str, version: str, credentials=None):
+        def handler(svc, resource, method, kwargs):
+            self.faults.apply()
+            path = _cassette_path(self.cassette_dir, svc, resource, method,
+                                  _cassette_key(svc, resource, method, kwargs))
+            if not os.path.exists(path):
+                raise ReplayMissError(f"{svc}.{resource}.{method}({kwargs}) -> {path}")
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            if "error" in entry:
+                err = entry["error"]
+                raise _http_error(err["status"], err.get("content", "").encode("utf-8"), err.get("reason", ""))
+            return entry["response"]
+
+        return _Service(handler, service)
+
+
+# ===== Synthetic =====
+SYNTH_SOURCES = [
+    "ADVERTISING", "END_SCREEN", "EXT_URL", "NO_LINK_OTHER", "NOTIFICATION", "PLAYLIST",
+    "RELATED_VIDEO", "SHORTS", "SUBSCRIBER", "YT_CHANNEL", "YT_OTHER_PAGE", "YT_SEARCH",
+]
+SYNTH_PLAYBACK_LOCATIONS = ["WATCH", "EMBEDDED", "CHANNEL", "BROWSE", "SEARCH", "OTHER"]
+SYNTH_COUNTRIES = ["US", "VN", "IN", "BR", "GB", "DE", "JP", "KR", "FR", "CA", "ID", "PH", "MX", "TH", "RU"]
+_FLOAT_HINTS = ("Percentage", "Rate", "Ratio", "Revenue", "cpm", "Cpm", "viewerPercentage")
+
+
+def _is_float_metric(name: str) -> bool:
+    return any(h in name for h in _FLOAT_HINTS)
+
+
+class SyntheticTransport:
+    """
+    Kênh giả `videos` video trong `years` năm: channels/playlistItems/videos.list và
+    reports.query cho các dimension mà ingest dùng. Response tất định theo (seed, request).
+    """
+
+    offline = True
+
+    def __init__(self, videos: int = 100, years: int = 5, seed: int = 0,
+                 end: Optional[date] = None, page_size: int = 50,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500):
+        self.seed = seed
+        self.end = end or date.today()
+        self.start = self.end - timedelta(days=365 * years)
+        self.page_size = page_size
+        self.channel_id = f"UCsynthetic{seed:011d}"
+        self.uploads = "UU" + self.channel_id[2:]
+        self.faults = _Faults(latency_ms, jitter_ms, error_rate, error_status, seed)
+
+        rnd = random.Random(seed)
+        span = (self.end - self.start).days
+        self.video_ids = [f"synth{seed:03d}v{i:06d}" for i in range(videos)]
+        self.published = {
+            vid: self.start + timedelta(days=rnd.randint(0, span)) for vid in self.video_ids
+        }
+
+    def build(self, service: str, version: str, credentials=None):
+        def handler(svc, resource, method, kwargs):
+            self.faults.apply()
+            fn = getattr(self, f"_{resource}_{method}", None)
+            if fn is None:
+                raise _http_error(400, f"synthetic: {resource}.{method} not supported".encode())
+            return fn(kwargs)
+
+        return _Service(handler, service)
+
+    def _rnd(self, kwargs: Dict) -> random.Random:
+        raw = json.dumps(kwargs, sort_keys=True, default=str)
+        return random.Random(f"{self.seed}:{raw}")
+
+    # ----- Data API -----
+    def _channels_list(self, kw: Dict) -> Dict:
+        return {"items": [{
+            "id": self.channel_id,
+            "snippet": {"title": f"Synthetic channel {self.seed}",
+                        "publishedAt": self.start.isoformat() + "T00:00:00Z"},
+            "contentDetails": {"relatedPlaylists": {"uploads": self.uploads}},
+            "statistics": {"subscriberCount": "1000", "viewCount": str(1000 * len(self.video_ids)),
+                           "videoCount": str(len(self.video_ids))},
+        }]}
+
+    def _playlistItems_list(self, kw: Dict) -> Dict:
+        if kw.get("playlistId") != self.uploads:
+            raise _http_error(404, b"playlistNotFound")
+        size = min(int(kw.get("maxResults", 5)), self.page_size)
+        offset = int(kw.get("pageToken") or 0)
+        page = self.video_ids[offset:offset + size]
+        resp = {"items": [{"contentDetails": {"videoId": v}} for v in page]}
+        if offset + size < len(self.video_ids):
+            resp["nextPageToken"] = str(offset + size)
+        return resp
+
+    def _videos_list(self, kw: Dict) -> Dict:
+        items = []
+        for vid in (kw.get("id") or "").split(","):
+            if vid not in self.published:
+                continue
+            rnd = self._rnd({"video": vid})
+            views = rnd.randint(100, 500000)
+            thumb = {"url": f"https://i.ytimg.com/vi/{vid}/mqdefault.jpg"}
+            items.append({
+                "id": vid,
+                "snippet": {"title": f"Synthetic video {vid}",
+                            "publishedAt": self.published[vid].isoformat() + "T00:00:00Z",
+                            "thumbnails": {"default": thumb, "medium": thumb, "high": thumb}},
+                "contentDetails": {"duration": f"PT{rnd.randint(1, 59)}M{rnd.randint(0, 59)}S"},
+                "statistics": {"viewCount": str(views), "likeCount": str(views // 25),
+                               "commentCount": str(views // 200)},
+            })
+        return {"items": items}
+
+    # ----- Analytics API -----
+    def _dimension_values(self, dim: str, start: date, end: date, filters: Dict[str, str]) -> List:
+        if dim == "day":
+            return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        if dim == "month":
+            months, cur = [], date(start.year, start.month, 1)
+            while cur <= end:
+                months.append(cur.strftime("%Y-%m"))
+                cur = date(cur.year + cur.month // 12, cur.month % 12 + 1, 1)
+            return months
+        if dim == "insightTrafficSourceType":
+            return list(SYNTH_SOURCES)
+        if dim == "insightPlaybackLocationType":
+            return list(SYNTH_PLAYBACK_LOCATIONS)
+        if dim == "country":
+            return list(SYNTH_COUNTRIES)
+        if dim == "video":
+            pool = filters["video"].split(",") if "video" in filters else self.video_ids
+            return [v for v in pool if self.published[v] <= end]
+        if dim == "elapsedVideoTimeRatio":
+            return [round(i / 100, 2) for i in range(1, 101)]
+        return [f"{dim}_{i}" for i in range(3)]
+
+    def _reports_query(self, kw: Dict) -> Dict:
+        dims = [d for d in (kw.get("dimensions") or "").split(",") if d]
+        metrics = [m for m in (kw.get("metrics") or "").split(",") if m]
+        filters = dict(
+            f.split("==", 1) for f in (kw.get("filters") or "").split(";") if "==" in f
+        )
+
+        start = max(datetime.strptime(kw["startDate"], "%Y-%m-%d").date(), self.start)
+        end = min(datetime.strptime(kw["endDate"], "%Y-%m-%d").date(), self.end)
+        vids = [v for v in filters.get("video", "").split(",") if v]
+        if any(v not in self.published for v in vids):
+            raise _http_error(400, b"invalid video filter")
+        if len(vids) == 1:
+            start = max(start, self.published[vids[0]])
+
+        headers = [{"name": d, "columnType": "DIMENSION", "dataType": "STRING"} for d in dims] + [
+            {"name": m, "columnType": "METRIC", "dataType": "FLOAT" if _is_float_metric(m) else "INTEGER"}
+            for m in metrics
+        ]
+        if start > end:
+            return {"kind": "youtubeAnalytics#resultTable", "columnHeaders": headers, "rows": []}
+
+        combos: List[Tuple] = [()]
+        for d in dims:
+            combos = [c + (v,) for c in combos for v in self._dimension_values(d, start, end, filters)]
+
+        rnd = self._rnd(kw)
+        rows = []
+        for combo in combos:
+            views = rnd.randint(0, 2000)
+            row = list(combo)
+            for m in metrics:
+                if m == "views":
+                    row.append(views)
+                elif m == "estimatedMinutesWatched":
+                    row.append(views * rnd.randint(1, 6))
+                elif m == "averageViewDuration":
+                    row.append(rnd.randint(10, 900))
+                elif _is_float_metric(m):
+                    row.append(round(rnd.random() * (1.0 if "Ratio" in m else 100.0), 4))
+                else:
+                    row.append(views // rnd.randint(2, 40))
+            rows.append(row)
+
+        sort = kw.get("sort")
+        if sort:
+            names = [h["name"] for h in headers]
+            for key in reversed(sort.split(",")):
+                desc = key.startswith("-")
+                i = names.index(key.lstrip("-"))
+                rows.sort(key=lambda r: r[i], reverse=desc)
+        if kw.get("maxResults"):
+            rows = rows[:int(kw["maxResults"])]
+
+        return {"kind": "youtubeAnalytics#resultTable", "columnHeaders": headers, "rows": rows}
+
+
+# ===== Default =====
+_default = None
+_default_lock = threading.Lock()
+
+
+def transport_from_env(spec: Optional[str] = None):
+    spec = (spec if spec is not None else os.getenv("YT_TRANSPORT", "live")).strip()
+    kind, _, arg = spec.partition(":")
+    if kind in ("", "live"):
+        return LiveTransport()
+    if kind == "record":
+        return RecordTransport(arg or "cassettes")
+    if kind == "replay":
+        return ReplayTransport(
+            arg or "cassettes",
+            latency_ms=float(os.getenv("YT_REPLAY_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("YT_REPLAY_JITTER_MS", "0")),
+            error_rate=float(os.getenv("YT_REPLAY_ERROR_RATE", "0")),
+        )
+    if kind == "synthetic":
+        videos, _, years = arg.partition(":")
+        return SyntheticTransport(videos=int(videos or 100), years=int(years or 5))
+    raise ValueError(f"YT_TRANSPORT không hợp lệ: {spec}")
+
+
+def get_transport(transport=None):
+    """Transport truyền vào, hoặc transport mặc định (theo YT_TRANSPORT, tạo 1 lần)."""
+    global _default
+    if transport is not None:
+        return transport
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = transport_from_env()
+    return _default
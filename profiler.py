@@ -0,0 +1,216 @@
+# profiler.py — SQL profiler (SQLAlchemy events): fingerprint, params, rowcount, duration,
+# slow query -> EXPLAIN (ANALYZE, BUFFERS) + rotating JSONL log.
+# Tắt mặc định: chỉ gắn event khi SQL_PROFILE=1, nên khi tắt không tốn gì trên đường query.
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+
+SQL_PROFILE = os.getenv("SQL_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+SLOW_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+SLOW_LOG = os.getenv("SQL_SLOW_LOG", os.path.join("logs", "slow_queries.jsonl"))
+SLOW_LOG_MAX_BYTES = int(os.getenv("SQL_SLOW_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_LOG_BACKUPS = int(os.getenv("SQL_SLOW_LOG_BACKUPS", "5"))
+# EXPLAIN ANALYZE chạy lại câu query -> mỗi fingerprint tối đa 1 lần / khoảng này
+EXPLAIN_INTERVAL_S = float(os.getenv("SQL_EXPLAIN_INTERVAL_S", "300"))
+
+_PARAM_MAX_CHARS = 2000
+
+
+# ===== Fingerprint =====
+_RX_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RX_STRING = re.compile(r"'(?:[^']|'')*'")
+_RX_BIND = re.compile(r"%\(\w+\)s|%s|(?<![:\w]):\w+|\$\d+|\?")
+_RX_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RX_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RX_SPACE = re.compile(r"\s+")
+_RX_READ_ONLY = re.compile(r"^\s*(select|with)\b", re.I)
+_RX_WRITES = re.compile(r"\b(insert|update|delete|merge|create|drop|alter|truncate)\b", re.I)
+
+
+def normalize_sql(statement: str) -> str:
+    """Bỏ comment/literal/bind param, gộp IN (...) và khoảng trắng -> dạng chuẩn để nhóm query."""
+    s = _RX_COMMENT.sub(" ", statement)
+    s = _RX_STRING.sub("?", s)
+    s = _RX_BIND.sub("?", s)
+    s = _RX_NUMBER.sub("?", s)
+    s = _RX_IN_LIST.sub("(?)", s)
+    return _RX_SPACE.sub(" ", s).strip().rstrip(";").strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _params_repr(parameters) -> str:
+    s = json.dumps(parameters, default=str, ensure_ascii=False)
+    return s if len(s) <= _PARAM_MAX_CHARS else s[:_PARAM_MAX_CHARS] + "..."
+
+
+# ===== Profiler =====
+class SQLProfiler:
+    def __init__(self, slow_ms: float = SLOW_MS, log_path: str = SLOW_LOG):
+        self.slow_s = slow_ms / 1000.0
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+        self._last_explain: Dict[str, float] = {}
+        self._log = self._make_logger(log_path)
+
+    @staticmethod
+    def _make_logger(path: str) -> logging.Logger:
+        log = logging.getLogger("sql_profiler")
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        if not log.handlers:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log.addHandler(handler)
+        return log
+
+    # ----- events -----
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+        return engine
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_profiler_t0", []).append(time.perf_counter())
+
+    def _error(self, ctx):
+        conn = ctx.connection
+        if conn is not None and conn.info.get("_profiler_t0"):
+            conn.info["_profiler_t0"].pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_profiler_t0")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        if statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+
+        norm = normalize_sql(statement)
+        fp = fingerprint(norm)
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        slow = elapsed >= self.slow_s
+
+        with self._lock:
+            st = self._stats.get(fp)
+            if st is None:
+                st = self._stats[fp] = {
+                    "fingerprint": fp, "statement": norm, "calls": 0, "slow_calls": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                    "last_params": None, "last_plan": None, "last_slow_at": None,
+                }
+            st["calls"] += 1
+            st["total_ms"] += elapsed * 1000
+            st["max_ms"] = max(st["max_ms"], elapsed * 1000)
+            st["rows"] += rows or 0
+            st["last_params"] = _params_repr(parameters)
+            if slow:
+                st["slow_calls"] += 1
+                st["last_slow_at"] = datetime.now(timezone.utc).isoformat()
+
+        if not slow:
+            return
+
+        plan = None
+        if not executemany and self._explain_due(fp) and self._explainable(conn, statement):
+            plan = self._explain(conn, statement, parameters)
+            with self._lock:
+                self._stats[fp]["last_plan"] = plan
+
+        self._log.info(json.dumps({
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "fingerprint": fp,
+            "duration_ms": round(elapsed * 1000, 3),
+            "rows": rows,
+            "statement": norm,
+            "params": _params_repr(parameters),
+            "plan": plan,
+        }, default=str, ensure_ascii=False))
+
+    # ----- EXPLAIN -----
+    def _explain_due(self, fp: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explain.get(fp, float("-inf")) < EXPLAIN_INTERVAL_S:
+                return False
+            self._last_explain[fp] = now
+        return True
+
+    @staticmethod
+    def _explainable(conn, statement: str) -> bool:
+        # ANALYZE thực thi lại câu lệnh -> chỉ cho câu đọc, chỉ trên PostgreSQL
+        return (
+            conn.dialect.name == "postgresql"
+            and bool(_RX_READ_ONLY.match(statement))
+            and not _RX_WRITES.search(_RX_STRING.sub("''", statement))
+        )
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> Optional[List]:
+        # Chạy trong SAVEPOINT để lỗi EXPLAIN không làm hỏng transaction của request
+        cur = conn.connection.dbapi_connection.cursor()
+        try:
+            cur.execute("SAVEPOINT _sql_profiler")
+            try:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+                plan = cur.fetchone()[0]
+                cur.execute("RELEASE SAVEPOINT _sql_profiler")
+                return plan
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT _sql_profiler")
+                print("[profiler] EXPLAIN failed:", e)
+                return None
+        except Exception as e:
+            print("[profiler] EXPLAIN skipped:", e)
+            return None
+        finally:
+            cur.close()
+
+    # ----- report -----
+    def top(self, limit: int = 20, order: str = "total_ms") -> List[Dict]:
+        with self._lock:
+            items = [dict(st) for st in self._stats.values()]
+        for st in items:
+            st["mean_ms"] = st["total_ms"] / st["calls"] if st["calls"] else 0.0
+        items.sort(key=lambda st: st.get(order, 0), reverse=True)
+        return items[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._last_explain.clear()
+
+
+_profiler: Optional[SQLProfiler] = None
+
+
+def install_profiler(engine) -> Optional[SQLProfiler]:
+    """Gắn profiler vào engine nếu SQL_PROFILE bật; tắt thì không gắn event nào."""
+    global _profiler
+    if not SQL_PROFILE:
+        return None
+    if _profiler is None:
+        _profiler = SQLProfiler()
+    _profiler.install(engine)
+    return _profiler
+
+
+def get_profiler() -> Optional[SQLProfiler]:
+    return _profiler
@@ -0,0 +1,185 @@
+# report_datasets.py — CSV export (reports/<account>/<dataset>.csv) -> item đúng shape frontend đang dùng.
+# Dùng chung cho script convert_* (sinh JS) và /api/reports (routes/reports.py), để 2 đường luôn ra cùng dữ liệu.
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from csv_stream import CsvStream, UnsortedDaysError, fill_day_gaps, hsl_from_text
+
+
+# cột số (float: giữ nguyên ngữ nghĩa to_number cũ)
+TRAFFIC_TYPES = {
+    "views": "float",
+    "estimatedMinutesWatched": "float",
+    "averageViewDuration": "float",
+    "averageViewPercentage": "float",
+    "engagedViews": "float",
+}
+
+GEO_TYPES = {
+    "views": "float",
+    "estimatedMinutesWatched": "float",
+    "averageViewDuration": "float",
+    "averageViewPercentage": "float",
+}
+
+DAILY_NUMERIC_FIELDS = [
+    "views",
+    "estimatedMinutesWatched",
+    "averageViewDuration",
+    "averageViewPercentage",
+    "engagedViews",
+    "subscribersGained",
+    "subscribersLost",
+    "likes",
+    "shares",
+    "comments",
+    "impressions",
+    "impressionsClickThroughRate",
+]
+DAILY_TYPES = {f: "int" for f in DAILY_NUMERIC_FIELDS}
+DAILY_TYPES["averageViewPercentage"] = "float"
+DAILY_TYPES["impressionsClickThroughRate"] = "float"
+
+_PERIOD_RE = re.compile(
+    r"^traffic[_\-\.\s]*sources?[_\-\.\s]+(7d|28d|90d|365d|30d|lifetime|2025|2024)$",
+    re.IGNORECASE,
+)
+
+
+def extract_period(name: str) -> Optional[str]:
+    """traffic_sources__<period> (hoặc biến thể) -> period, không match -> None."""
+    m = _PERIOD_RE.match(name)
+    return m.group(1).lower() if m else None
+
+
+# ===== Item builders =====
+def traffic_item(r: Dict) -> Optional[Dict]:
+    idv = r.get("insightTrafficSourceType") or r.get("id") or ""
+    if not idv:
+        return None
+    views = r.get("views", 0.0)
+    return {
+        "id": idv,
+        "label": idv,
+        "value": views,
+        "color": hsl_from_text(idv),
+        "views": int(views),
+        "estimatedMinutesWatched": int(r.get("estimatedMinutesWatched", 0.0)),
+        "averageViewDuration": int(r.get("averageViewDuration", 0.0)),
+        "averageViewPercentage": float(r.get("averageViewPercentage", 0.0)),
+        "engagedViews": int(r.get("engagedViews", 0.0)),
+    }
+
+
+def geography_item(r: Dict) -> Optional[Dict]:
+    idv = r.get("country") or r.get("Country") or r.get("countryCode") or ""
+    if not idv:
+        return None
+    views = r.get("views", 0.0)
+    return {
+        "id": idv,
+        "label": idv,
+        "value": views,
+        "color": hsl_from_text(idv),
+        "views": int(views),
+        "estimatedMinutesWatched": int(r.get("estimatedMinutesWatched", 0.0)),
+        "averageViewDuration": int(r.get("averageViewDuration", 0.0)),
+        "averageViewPercentage": float(r.get("averageViewPercentage", 0.0)),
+    }
+
+
+def daily_item(r: Dict) -> Dict:
+    item = {}
+    if r.get("day") is not None:
+        item["day"] = r["day"]
+    if r.get("insightTrafficSourceType"):
+        item["insightTrafficSourceType"] = r["insightTrafficSourceType"]
+    item.update({
+        "views": int(r.get("views", 0)),
+        "estimatedMinutesWatched": int(r.get("estimatedMinutesWatched", 0)),
+        "averageViewDuration": int(r.get("averageViewDuration", 0)),
+        "averageViewPercentage": round(float(r.get("averageViewPercentage", 0)), 2),
+        "engagedViews": int(r.get("engagedViews", 0)),
+        "subscribersGained": int(r.get("subscribersGained", 0)),
+        "subscribersLost": int(r.get("subscribersLost", 0)),
+        "likes": int(r.get("likes", 0)),
+        "shares": int(r.get("shares", 0)),
+        "comments": int(r.get("comments", 0)),
+    })
+    return item
+
+
+# ===== Loaders =====
+def traffic_items(csv_path: str) -> List[Dict]:
+    items = [it for it in map(traffic_item, CsvStream(csv_path, TRAFFIC_TYPES)) if it]
+    # item đã convert nhỏ (1 dòng / source type); chỉ phần text thô là không còn giữ trong RAM
+    items.sort(key=lambda x: x["views"], reverse=True)
+    return items
+
+
+def geography_items(csv_path: str) -> Iterator[Dict]:
+    return (it for it in map(geography_item, CsvStream(csv_path, GEO_TYPES)) if it)
+
+
+def daily_rows(csv_path: str) -> Tuple[Optional[List[str]], Iterator[Dict]]:
+    """
+    (header, dòng đã bù ngày thiếu). Export đã sort theo ngày -> bù ngay khi stream;
+    UnsortedDaysError khi iterate nếu file không sort (người gọi tự chọn đường pandas).
+    """
+    stream = CsvStream(csv_path, DAILY_TYPES)
+    fieldnames = stream.open_header()
+    if not fieldnames:
+        return None, iter(())
+    if "day" in fieldnames:
+        return fieldnames, fill_day_gaps(stream, fieldnames, "day", DAILY_NUMERIC_FIELDS)
+    return fieldnames, iter(stream)
+
+
+def detect_kind(fieldnames: Optional[List[str]]) -> str:
+    cols = set(fieldnames or ())
+    if "insightTrafficSourceType" in cols and "day" not in cols:
+        return "traffic_source"
+    if cols & {"country", "Country", "countryCode"} and "day" not in cols:
+        return "geography"
+    if "day" in cols:
+        return "daily"
+    return "rows"
+
+
+def _sorted_daily(csv_path: str) -> List[Dict]:
+    # file không sort theo ngày: đọc cả file, sort, bù ngày
+    rows = sorted((r for r in CsvStream(csv_path, DAILY_TYPES)), key=lambda r: str(r.get("day", "")))
+    fieldnames = CsvStream(csv_path).open_header() or []
+    try:
+        return [daily_item(r) for r in fill_day_gaps(rows, fieldnames, "day", DAILY_NUMERIC_FIELDS)]
+    except UnsortedDaysError:
+        # ngày không parse được -> trả nguyên thứ tự đã sort, không bù
+        return [daily_item(r) for r in rows]
+
+
+def load_dataset(csv_path: str, name: str) -> Dict:
+    """1 file CSV -> {"kind", "period"|"datasetTag", "items"} (shape giống các file JS sinh ra)."""
+    fieldnames = CsvStream(csv_path).open_header()
+    kind = detect_kind(fieldnames)
+    period = extract_period(name)
+    out = {"kind": kind}
+    if period:
+        out["period"] = period
+    else:
+        out["datasetTag"] = name
+
+    if kind == "traffic_source":
+        out["items"] = traffic_items(csv_path)
+    elif kind == "geography":
+        out["items"] = list(geography_items(csv_path))
+    elif kind == "daily":
+        try:
+            _, rows = daily_rows(csv_path)
+            out["items"] = [daily_item(r) for r in rows]
+        except UnsortedDaysError:
+            out["items"] = _sorted_daily(csv_path)
+    else:
+        # báo cáo khác (devices, demographics, ...): dòng nguyên bản, cột số tự nhận theo tên metric
+        types = {c: "float" for c in fieldnames or () if c in TRAFFIC_TYPES or c in DAILY_TYPES}
+        out["items"] = list(CsvStream(csv_path, types)) if fieldnames else []
+    return out
@@ -0,0 +1,163 @@
+# report_runner.py — chạy nhiều reports.query song song cho exporter (get_data_from_credentials_token.py, test.py).
+# - ThreadPoolExecutor giới hạn REPORT_WORKERS, log in theo đúng thứ tự spec (không xen kẽ)
+# - RateLimiter dùng chung cả process (YT_QPS request/giây) để không vượt quota khi chạy song song
+# - tổ hợp bị API trả "not supported" được nhớ trong CapabilityCache -> lần sau bỏ qua, không gọi lại
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+from httplib2 import HttpLib2Error
+
+from capabilities import (
+    CapabilityCache, capability_key, error_reason, get_capabilities, is_forbidden_error, is_unsupported_error,
+    probe_key,
+)
+from module_transport import get_transport
+
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "6"))
+YT_QPS = float(os.getenv("YT_QPS", "8"))
+# cửa sổ ngắn cho query probe (chỉ cần biết API chấp nhận metric hay không)
+PROBE_DAYS = 7
+# lỗi mạng / transport (timeout, mất kết nối, refresh token không gọi được) -> coi là lỗi tạm thời
+NETWORK_ERRORS = (OSError, HttpLib2Error, TransportError)
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """Token bucket thread-safe; qps <= 0 = không giới hạn."""
+
+    def __init__(self, qps: float, burst: Optional[float] = None):
+        self.qps = qps
+        self.capacity = burst if burst is not None else max(1.0, qps)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.qps <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.qps)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.qps
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(YT_QPS)
+
+
+class UnsupportedQuery(Exception):
+    """Tổ hợp (ids mode, dimensions, metrics) đã biết là không được hỗ trợ (từ cache hoặc vừa bị 400)."""
+
+    def __init__(self, key: str, reason: str = "", cached: bool = False):
+        super().__init__(f"{key}: {reason}" if reason else key)
+        self.key = key
+        self.reason = reason
+        self.cached = cached
+
+
+def query_report(credentials, req: Dict, caps: Optional[CapabilityCache] = None, transport=None) -> Dict:
+    """
+    reports.query qua transport + rate limit chung.
+    caps: tổ hợp đã biết không hỗ trợ -> UnsupportedQuery(cached=True) không gọi API;
+    API trả 400 "not supported" -> ghi vào caps rồi raise UnsupportedQuery.
+    Lỗi khác (quota, 5xx, ...) raise HttpError như cũ, không ghi nhớ.
+    """
+    key = capability_key(req["ids"], req.get("dimensions", ""), req.get("metrics", ""),
+                         req.get("filters", ""), req.get("maxResults"))
+    if caps is not None:
+        known = caps.unsupported(key)
+        if known is not None:
+            raise UnsupportedQuery(key, known.get("reason", ""), cached=True)
+
+    rate_limiter.acquire()
+    # LiveTransport cache service theo thread -> an toàn khi gọi từ worker
+    yta = get_transport(transport).build("youtubeAnalytics", "v2", credentials=credentials)
+    try:
+        return yta.reports().query(**req).execute()
+    except HttpError as e:
+        if caps is not None and is_unsupported_error(e):
+            reason = error_reason(e)
+            caps.mark_unsupported(key, reason)
+            raise UnsupportedQuery(key, reason) from e
+        raise
+
+
+def run_ordered(tasks: Iterable[Callable[[], T]], max_workers: int = REPORT_WORKERS) -> Iterator[T]:
+    """Chạy tasks song song (tối đa max_workers), trả kết quả theo thứ tự submit."""
+    tasks = list(tasks)
+    if max_workers <= 1 or len(tasks) <= 1:
+        for fn in tasks:
+            yield fn()
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as ex:
+        futures = [ex.submit(fn) for fn in tasks]
+        for f in futures:
+            yield f.result()
+
+
+
+# ===== Metric probes =====
+def metric_supported(credentials, owner_id: str, ids_req: Dict, metric: str, dimension: str = "day",
+                     caps: Optional[CapabilityCache] = None, transport=None) -> bool:
+    """
+    Metric có dùng được cho channel/owner `owner_id` không. Kết quả lưu trong capability cache
+    (key = owner, metric, dimension; hết hạn sau CAPABILITY_TTL_S) -> lần chạy sau không probe lại.
+    ids_req: {"ids": ..., ["onBehalfOfContentOwner": ...]} — các key khác bị bỏ qua.
+    Lỗi tạm thời (quota, 5xx, mạng) -> False nhưng không ghi nhớ.
+    """
+    caps = caps or get_capabilities()
+    key = probe_key(owner_id, metric, dimension)
+    known = caps.probe(key)
+    if known is not None:
+        return known
+
+    end = date.today()
+    req = {k: ids_req[k] for k in ("ids", "onBehalfOfContentOwner") if k in ids_req}
+    req.update({
+        "startDate": (end - timedelta(days=PROBE_DAYS)).isoformat(),
+        "endDate": end.isoformat(),
+        "dimensions": dimension,
+        "metrics": metric,
+    })
+    try:
+        # không truyền caps: 400 ở đây là theo kênh, không ghi vào "unsupported" (cố định, chung mọi kênh)
+        query_report(credentials, req, transport=transport)
+        ok = True
+    except HttpError as e:
+        # chỉ ghi nhớ lỗi chắc chắn theo kênh: 403 thiếu quyền, 400 metric / tổ hợp không hỗ trợ;
+        # 403 quota / rate limit, 5xx, 400 khác -> tạm thời (ghi nhớ thì tắt metric cả TTL)
+        if not (is_forbidden_error(e) or is_unsupported_error(e)):
+            print(f"[capabilities] probe {metric} lỗi tạm thời ({e.resp.status}: {error_reason(e)[:120]}), "
+                  f"không ghi nhớ")
+            return False
+        ok = False
+    except NETWORK_ERRORS as e:
+        print(f"[capabilities] probe {metric} lỗi mạng ({e.__class__.__name__}), không ghi nhớ")
+        return False
+    caps.record_probe(key, ok)
+    caps.flush()  # chỉ xảy ra khi chưa có / hết hạn -> ghi ngay cho process khác dùng
+    return ok
+
+
+def supported_metrics(credentials, owner_id: str, ids_req: Dict, metrics: List[str], dimension: str = "day",
+                      caps: Optional[CapabilityCache] = None, transport=None) -> List[str]:
+    """Lọc `metrics` còn dùng được (probe song song các metric chưa có trong cache, giữ thứ tự)."""
+    caps = caps or get_capabilities()
+    flags = list(run_ordered(
+        (lambda m=m: metric_supported(credentials, owner_id, ids_req, m, dimension, caps, transport))
+        for m in metrics
+    ))
+    return [m for m, ok in zip(metrics, flags) if ok]
@@ -0,0 +1,52 @@
+# routes/admin.py
+# Trạng thái ingest nền (scheduler.py) + checkpoint backfill (module_jobs: ingest_jobs / ingest_units).
+import hmac
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from db import read_conn
+from module_jobs import recent_jobs
+from scheduler import INGEST_SCHEDULE, get_scheduler
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# POST /ingest phải gửi header X-Admin-Token (chạy ingest tốn quota API);
+# chưa đặt ADMIN_TOKEN thì POST /ingest bị tắt (403), không mở cho mọi người
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+
+
+def _jobs(account: Optional[str], limit: int):
+    try:
+        with read_conn() as conn:
+            return recent_jobs(conn, account=account, limit=limit)
+    except Exception as e:
+        # chưa có bảng ingest_jobs (chưa backfill lần nào)
+        print("[admin.ingest] ingest_jobs unavailable:", e)
+        return []
+
+
+@router.get("/ingest")
+def ingest_status(account: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """Scheduler trong process này (nếu bật) + các job checkpoint gần nhất trong DB (mọi worker)."""
+    sched = get_scheduler()
+    out = sched.snapshot() if sched else {"enabled": False, "schedule": INGEST_SCHEDULE}
+    if account and sched:
+        out["accounts"] = [a for a in out["accounts"] if a["account"] == account]
+    out["jobs"] = _jobs(account, limit)
+    return out
+
+
+@router.post("/ingest")
+async def ingest_trigger(account: Optional[List[str]] = Query(None),
+                         x_admin_token: Optional[str] = Header(None)):
+    """Chạy ngay 1 lượt (mọi account hoặc ?account=a&account=b), không chờ lịch."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "chưa cấu hình ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(403, "sai X-Admin-Token")
+    sched = get_scheduler()
+    if sched is None:
+        raise HTTPException(409, "scheduler chưa bật (INGEST_SCHEDULER=1)")
+    return {"started": sched.trigger(account)}
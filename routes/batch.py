@@ -0,0 +1,156 @@
+# routes/batch.py
+# 1 request -> nhiều sub-query (route + body) chạy song song qua chính ASGI app,
+# đọc chung 1 snapshot PostgreSQL (pg_export_snapshot / SET TRANSACTION SNAPSHOT).
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from db import export_snapshot, use_snapshot
+
+router = APIRouter(prefix="/api/batch", tags=["batch"])
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "20"))
+# số sub-query chạy cùng lúc (mỗi cái giữ 1 connection, + 1 connection giữ snapshot)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# số batch chạy cùng lúc trong 1 process: mỗi batch giữ 1 + BATCH_CONCURRENCY connection của pool
+# (mặc định 5 + 10 overflow) -> 2 batch = 10 connection, còn chỗ cho route thường
+BATCH_MAX_ACTIVE = int(os.getenv("BATCH_MAX_ACTIVE", "2"))
+_active = asyncio.Semaphore(BATCH_MAX_ACTIVE)
+
+# sub-query chỉ được gọi route đọc: GET trong /api (trừ các prefix dưới) + POST đọc liệt kê sẵn
+# (phần lớn route đọc nhận body JSON nên là POST; POST khác như /api/admin/ingest có tác dụng phụ)
+BATCH_BLOCKED_PREFIXES = ("/api/batch", "/api/admin")
+BATCH_READ_POSTS = {
+    "/api/traffic_source/timeseries",
+    "/api/traffic_source/range",
+    "/api/traffic_source/overview",
+    "/api/content/list",
+    "/api/content/top",
+    "/api/content/timeseries",
+    "/api/video_overview/list",
+    "/api/video_overview/stats",
+    "/api/portfolio",
+    "/api/retention/curves",
+}
+
+
+class SubQuery(BaseModel):
+    id: str
+    route: str                                # vd "/api/traffic_source/range"
+    method: Optional[str] = None              # mặc định: POST nếu có body, ngược lại GET
+    body: Optional[Any] = None
+    params: Optional[Dict[str, Any]] = None   # query string
+
+
+class BatchRequest(BaseModel):
+    queries: List[SubQuery]
+
+
+def _method(q: SubQuery) -> str:
+    return (q.method or ("POST" if q.body is not None else "GET")).upper()
+
+
+def _allowed(q: SubQuery) -> bool:
+    route = q.route.split("?", 1)[0]
+    if not route.startswith("/api/") or route.startswith(BATCH_BLOCKED_PREFIXES) or ".." in route:
+        return False
+    method = _method(q)
+    if method == "GET":
+        return True
+    return method == "POST" and route.rstrip("/") in BATCH_READ_POSTS
+
+
+async def _call(app, q: SubQuery) -> Dict:
+    method = _method(q)
+    payload = json.dumps(q.body).encode("utf-8") if q.body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": q.route,
+        "raw_path": q.route.encode("utf-8"),
+        "root_path": "",
+        "query_string": urlencode(q.params or {}, doseq=True).encode("utf-8"),
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("batch", 0),
+        "server": ("batch", 0),
+    }
+
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    status, headers, chunks = 500, {}, []
+
+    async def send(message):
+        nonlocal status, headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception as e:
+        # như response 500 của app: không trả chi tiết lỗi ra ngoài
+        print(f"[batch] {q.id} {method} {q.route} failed:", e)
+        return {"status": 500, "body": {"detail": "Internal Server Error"}}
+
+    raw = b"".join(chunks)
+    if "json" in headers.get("content-type", ""):
+        body = json.loads(raw) if raw else None
+    else:
+        body = raw.decode("utf-8", errors="replace")
+    return {"status": status, "body": body}
+
+
+@router.post("")
+async def batch(req: BatchRequest, request: Request):
+    """
+    Body: {"queries": [{"id": "ts", "route": "/api/traffic_source/timeseries", "body": {...}}, ...]}
+    Trả về: {"results": {"ts": {"status": 200, "body": ...}, ...}}
+    """
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(400, f"tối đa {BATCH_MAX_QUERIES} sub-query")
+    ids = [q.id for q in req.queries]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(400, "id sub-query bị trùng")
+    for q in req.queries:
+        if not _allowed(q):
+            raise HTTPException(400, f"route không hợp lệ: {_method(q)} {q.route}")
+
+    app = request.app
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(q: SubQuery):
+        async with sem:
+            return await _call(app, q)
+
+    async with _active:
+        # mở transaction giữ snapshot (blocking) trong threadpool, giữ tới khi mọi sub-query xong
+        holder = export_snapshot()
+        snap = await run_in_threadpool(holder.__enter__)
+        try:
+            with use_snapshot(snap):
+                results = await asyncio.gather(*(run(q) for q in req.queries))
+        finally:
+            await run_in_threadpool(holder.__exit__, None, None, None)
+
+    return {"snapshot": snap.sid if snap else None, "results": dict(zip(ids, results))}
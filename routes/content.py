@@ -1,10 +1,12 @@
 # routes/content.py
 import os
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import date
+from typing import Optional
 from sqlalchemy import text
-from db import engine
+from db import HEAVY_STATEMENT_TIMEOUT_MS, QueryTimeout, read_conn
+from module_columnar import lttb_indices
 from module_trafficsource import sanitize_filename  # dùng lại hàm này
 
 router = APIRouter(prefix="/api/content", tags=["content"])
@@ -15,11 +17,13 @@ CREDENTIALS_DIR = "./credentials"
 # ==============================
 # Helper query
 # ==============================
-def query_all_safe(sql: str, params=None):
+def query_all_safe(sql: str, params=None, timeout_ms=None):
     try:
-        with engine.begin() as conn:
+        with read_conn(timeout_ms) as conn:
             rs = conn.execute(text(sql), params or {})
             return rs.mappings().all()
+    except QueryTimeout:
+        raise
     except Exception as e:
         print("[content.query_all_safe] failed:", e)
         return []
@@ -53,6 +57,9 @@ class ContentListRequest(BaseModel):
 
 @router.post("/list")
 def content_list(req: ContentListRequest):
+    # tổng [start, end] = cum[ngày cuối <= end] - cum[ngày cuối < start]  (video_daily_cum,
+    # cập nhật bởi save_daily_stats) -> 2 lookup PK / video, không phụ thuộc độ dài range;
+    # revenue / impressions: range scan trên PK (video_id, day) của video_daily_monetization
     sql = """
     SELECT
         v.video_id      AS "videoId",
@@ -61,25 +68,40 @@ def content_list(req: ContentListRequest):
         v.published_at  AS "publishedAt",
         v.duration,
 
-        COALESCE(SUM(s.views), 0) AS views,
-        COALESCE(SUM(s.estimated_minutes) / 60.0, 0) AS "watchTimeHours",
+        (e.cum_views - COALESCE(b.cum_views, 0)) AS views,
+        (e.cum_minutes - COALESCE(b.cum_minutes, 0)) / 60.0 AS "watchTimeHours",
 
-        COALESCE(SUM(s.likes), 0) AS likes,
-        0::numeric AS "estimatedRevenue",
-        0::bigint  AS "impressions",
-        0::numeric AS "ctr"
+        (e.cum_likes - COALESCE(b.cum_likes, 0)) AS likes,
+        COALESCE(m.revenue, 0)::numeric     AS "estimatedRevenue",
+        COALESCE(m.impressions, 0)::bigint  AS "impressions",
+        COALESCE(m.ctr, 0)::numeric         AS "ctr"
     FROM videos v
-    JOIN video_daily_stats s
-      ON s.video_id = v.video_id
-     AND s.day BETWEEN :start AND :end
+    JOIN LATERAL (
+        SELECT cum_views, cum_minutes, cum_likes
+        FROM video_daily_cum c
+        WHERE c.video_id = v.video_id AND c.day <= :end
+        ORDER BY c.day DESC
+        LIMIT 1
+    ) e ON true
+    LEFT JOIN LATERAL (
+        SELECT cum_views, cum_minutes, cum_likes
+        FROM video_daily_cum c
+        WHERE c.video_id = v.video_id AND c.day < :start
+        ORDER BY c.day DESC
+        LIMIT 1
+    ) b ON true
+    LEFT JOIN LATERAL (
+        -- ctr theo ngày là % -> gộp có trọng số impressions; mẫu số chỉ tính ngày có ctr
+        -- (ngày ctr NULL mà vẫn cộng impressions vào mẫu thì ctr bị kéo thấp)
+        SELECT SUM(m.estimated_revenue) AS revenue,
+               SUM(m.impressions)       AS impressions,
+               SUM(m.impressions * m.impressions_ctr)
+                 / NULLIF(SUM(m.impressions) FILTER (WHERE m.impressions_ctr IS NOT NULL), 0) AS ctr
+        FROM video_daily_monetization m
+        WHERE m.video_id = v.video_id AND m.day BETWEEN :start AND :end
+    ) m ON true
     WHERE v.account_tag = :account_tag
-    GROUP BY
-        v.video_id,
-        v.title,
-        v.thumbnail,
-        v.published_at,
-        v.duration
-    HAVING SUM(s.views) > 0 
+      AND e.cum_views - COALESCE(b.cum_views, 0) > 0
     ORDER BY v.published_at DESC;
 """
 
@@ -90,21 +112,162 @@ def content_list(req: ContentListRequest):
         "account_tag": req.channelId,
     }
 
-    rows = query_all_safe(sql, params)
+    rows = query_all_safe(sql, params, HEAVY_STATEMENT_TIMEOUT_MS)
     # print("[content.list] rows =", rows[:3])  # debug 
     return {"items": rows}
 
 
+# tên metric (API) -> cột trong CTE r của /top
+TOP_METRICS = {
+    "views": "views",
+    "watchTimeHours": "watch_hours",
+    "likes": "likes",
+}
+TOP_MAX_N = 100
+
+
+class ContentTopRequest(BaseModel):
+    start: date
+    end: date
+    channelId: str
+    metric: str = "views"  # 1 hoặc nhiều metric, phân tách bằng dấu phẩy
+    n: int = 10
+
+
+@router.post("/top")
+def content_top(req: ContentTopRequest):
+    """
+    Top N video theo từng metric trong [start, end] + tổng của cả kênh (cùng tập video như /list).
+    Mỗi metric là 1 nhánh ORDER BY ... LIMIT n (top-N heapsort, không sort toàn bộ),
+    tổng theo range lấy từ video_daily_cum.
+    UNION ALL / join không giữ thứ tự của nhánh -> mỗi nhánh đánh rn, ORDER BY metric, rn ở ngoài.
+    """
+    metrics = [m.strip() for m in req.metric.split(",") if m.strip()]
+    bad = [m for m in metrics if m not in TOP_METRICS]
+    if not metrics or bad:
+        raise HTTPException(400, f"metric phải thuộc {', '.join(TOP_METRICS)}")
+    if not 1 <= req.n <= TOP_MAX_N:
+        raise HTTPException(400, f"n phải trong khoảng 1..{TOP_MAX_N}")
+
+    branches = "\n        UNION ALL\n".join(
+        f"""        (SELECT '{m}' AS metric,
+                ROW_NUMBER() OVER (ORDER BY s.{TOP_METRICS[m]} DESC, s.video_id) AS rn, s.*
+         FROM (SELECT * FROM r ORDER BY r.{TOP_METRICS[m]} DESC, r.video_id LIMIT :n) s)"""
+        for m in dict.fromkeys(metrics)
+    )
+
+    sql = f"""
+    WITH r AS MATERIALIZED (
+        SELECT
+            v.video_id,
+            v.title,
+            v.thumbnail,
+            v.published_at,
+            (e.cum_views - COALESCE(b.cum_views, 0)) AS views,
+            (e.cum_minutes - COALESCE(b.cum_minutes, 0)) / 60.0 AS watch_hours,
+            (e.cum_likes - COALESCE(b.cum_likes, 0)) AS likes
+        FROM videos v
+        JOIN LATERAL (
+            SELECT cum_views, cum_minutes, cum_likes
+            FROM video_daily_cum c
+            WHERE c.video_id = v.video_id AND c.day <= :end
+            ORDER BY c.day DESC
+            LIMIT 1
+        ) e ON true
+        LEFT JOIN LATERAL (
+            SELECT cum_views, cum_minutes, cum_likes
+            FROM video_daily_cum c
+            WHERE c.video_id = v.video_id AND c.day < :start
+            ORDER BY c.day DESC
+            LIMIT 1
+        ) b ON true
+        WHERE v.account_tag = :account_tag
+          AND e.cum_views - COALESCE(b.cum_views, 0) > 0
+    ),
+    totals AS (
+        SELECT
+            COUNT(*)                            AS total_videos,
+            COALESCE(SUM(views), 0)             AS total_views,
+            COALESCE(SUM(watch_hours), 0)       AS total_watch_hours,
+            COALESCE(SUM(likes), 0)             AS total_likes
+        FROM r
+    )
+    SELECT t.*, x.*
+    FROM totals t
+    LEFT JOIN (
+{branches}
+    ) x ON true
+    ORDER BY x.metric, x.rn;
+"""
+
+    rows = query_all_safe(sql, {
+        "start": req.start,
+        "end": req.end,
+        "account_tag": req.channelId,
+        "n": req.n,
+    }, HEAVY_STATEMENT_TIMEOUT_MS)
+
+    items = {m: [] for m in metrics}
+    totals = {"videos": 0, "views": 0, "watchTimeHours": 0, "likes": 0}
+    for r in rows:
+        totals = {
+            "videos": r["total_videos"],
+            "views": r["total_views"],
+            "watchTimeHours": r["total_watch_hours"],
+            "likes": r["total_likes"],
+        }
+        if r["metric"] is None:  # kênh không có video nào trong range
+            continue
+        items[r["metric"]].append({
+            "videoId": r["video_id"],
+            "title": r["title"],
+            "thumbnail": r["thumbnail"],
+            "publishedAt": r["published_at"],
+            "views": r["views"],
+            "watchTimeHours": r["watch_hours"],
+            "likes": r["likes"],
+        })
+
+    return {"items": items, "totals": totals}
+
+
 class TimeSeriesRequest(BaseModel):
     start: date
     end: date
     channelId: str  # = account_tag
+    interval: str = "daily"           # daily | weekly | monthly | yearly
+    maxPoints: Optional[int] = None   # LTTB: tối đa số điểm / video
+    topK: Optional[int] = None        # giữ K video nhiều views nhất, còn lại gộp thành "other"
+
+
+TS_INTERVALS = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year"}
+OTHER_VIDEO_ID = "__other__"
+
+
+def _downsample(rows, max_points: int):
+    """LTTB theo views, riêng từng video; giữ nguyên thứ tự (bucket, videoId)."""
+    by_video = {}
+    for i, r in enumerate(rows):
+        by_video.setdefault(r["videoId"], []).append(i)
+
+    keep = []
+    for idx in by_video.values():
+        if len(idx) <= max_points:
+            keep.extend(idx)
+            continue
+        x = [rows[i]["bucket"].toordinal() for i in idx]
+        y = [float(rows[i]["views"] or 0) for i in idx]
+        keep.extend(idx[j] for j in lttb_indices(x, y, max_points))
+    keep.sort()
+    return [rows[i] for i in keep]
 
 
 @router.post("/timeseries")
 def content_timeseries(req: TimeSeriesRequest):
     """
-    Trả timeseries theo từng video, dùng bảng video_daily_stats.
+    Trả timeseries theo từng video, dùng bảng video_daily_stats (+ revenue/impressions từ video_daily_monetization).
+    interval: gộp theo tuần/tháng/năm (bucket = ngày đầu kỳ), topK: K video nhiều views
+    nhất trong range + 1 series "other", maxPoints: LTTB mỗi video còn tối đa N điểm.
 
     Response mẫu:
     {
@@ -123,28 +286,12 @@ def content_timeseries(req: TimeSeriesRequest):
       ]
     }
     """
-
-    sql = """
-        SELECT
-            s.day                  AS bucket,
-            v.video_id             AS "videoId",
-            v.title                AS title,
-
-            s.views                AS views,
-            (s.estimated_minutes / 60.0) AS watch_hours,
-
-            s.likes                AS likes,
-            0::numeric             AS revenue,
-            0::bigint              AS impressions
-        FROM video_daily_stats s
-        JOIN videos v
-          ON v.video_id = s.video_id
-        WHERE v.account_tag = :account_tag
-          AND s.day BETWEEN :start AND :end
-        ORDER BY
-            bucket ASC,
-            "videoId" ASC;
-    """
+    if req.interval not in TS_INTERVALS:
+        raise HTTPException(400, "interval phải là daily/weekly/monthly/yearly")
+    if req.maxPoints is not None and req.maxPoints < 3:
+        raise HTTPException(400, "maxPoints phải >= 3")
+    if req.topK is not None and req.topK < 1:
+        raise HTTPException(400, "topK phải >= 1")
 
     params = {
         "account_tag": req.channelId,
@@ -152,6 +299,91 @@ def content_timeseries(req: TimeSeriesRequest):
         "end": req.end,
     }
 
-    rows = query_all_safe(sql, params)
+    if req.interval == "daily" and req.topK is None:
+        # đường cũ: 1 dòng / (ngày, video), không GROUP BY
+        sql = """
+            SELECT
+                s.day                  AS bucket,
+                v.video_id             AS "videoId",
+                v.title                AS title,
+
+                s.views                AS views,
+                (s.estimated_minutes / 60.0) AS watch_hours,
+
+                s.likes                AS likes,
+                COALESCE(m.estimated_revenue, 0)::numeric AS revenue,
+                COALESCE(m.impressions, 0)::bigint        AS impressions
+            FROM video_daily_stats s
+            JOIN videos v
+              ON v.video_id = s.video_id
+            LEFT JOIN video_daily_monetization m
+              ON m.video_id = s.video_id AND m.day = s.day
+            WHERE v.account_tag = :account_tag
+              AND s.day BETWEEN :start AND :end
+            ORDER BY
+                bucket ASC,
+                "videoId" ASC;
+        """
+    else:
+        params["bucket"] = TS_INTERVALS[req.interval]
+        if req.topK is not None:
+            # hạng theo tổng views trong range; ngoài top K -> "other"
+            params["k"] = req.topK
+            params["other_id"] = OTHER_VIDEO_ID
+            rank_cte = """,
+            rk AS (
+                SELECT video_id,
+                       ROW_NUMBER() OVER (ORDER BY SUM(views) DESC NULLS LAST, video_id) AS rn
+                FROM d
+                GROUP BY video_id
+            )"""
+            video_expr = 'CASE WHEN rk.rn <= :k THEN d.video_id ELSE :other_id END'
+            title_expr = "CASE WHEN rk.rn <= :k THEN d.title ELSE 'Other' END"
+            join_rank = "JOIN rk ON rk.video_id = d.video_id"
+        else:
+            rank_cte, join_rank = "", ""
+            video_expr, title_expr = "d.video_id", "d.title"
+
+        sql = f"""
+            WITH d AS (
+                SELECT
+                    date_trunc(:bucket, s.day)::date AS bucket,
+                    s.video_id,
+                    v.title,
+                    s.views,
+                    s.estimated_minutes,
+                    s.likes,
+                    m.estimated_revenue,
+                    m.impressions
+                FROM video_daily_stats s
+                JOIN videos v
+                  ON v.video_id = s.video_id
+                LEFT JOIN video_daily_monetization m
+                  ON m.video_id = s.video_id AND m.day = s.day
+                WHERE v.account_tag = :account_tag
+                  AND s.day BETWEEN :start AND :end
+            ){rank_cte}
+            SELECT
+                d.bucket AS bucket,
+                {video_expr} AS "videoId",
+                {title_expr} AS title,
+
+                SUM(d.views)::bigint AS views,
+                SUM(d.estimated_minutes) / 60.0 AS watch_hours,
+
+                SUM(d.likes)::bigint AS likes,
+                COALESCE(SUM(d.estimated_revenue), 0)::numeric AS revenue,
+                COALESCE(SUM(d.impressions), 0)::bigint AS impressions
+            FROM d
+            {join_rank}
+            GROUP BY 1, 2, 3
+            ORDER BY
+                bucket ASC,
+                "videoId" ASC;
+        """
+
+    rows = query_all_safe(sql, params, HEAVY_STATEMENT_TIMEOUT_MS)
+    if req.maxPoints is not None:
+        rows = _downsample(rows, req.maxPoints)
     # print("[content.timeseries] rows (sample) =", rows[:5])  # debug
     return {"items": rows}
@@ -0,0 +1,26 @@
+# routes/debug.py
+from fastapi import APIRouter, HTTPException
+
+from profiler import SLOW_MS, get_profiler
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+_ORDERS = {"total": "total_ms", "max": "max_ms", "mean": "mean_ms", "calls": "calls", "slow": "slow_calls"}
+
+
+@router.get("/slow-queries")
+def slow_queries(limit: int = 20, order: str = "total"):
+    """Top câu SQL theo fingerprint (cần SQL_PROFILE=1)."""
+    if order not in _ORDERS:
+        raise HTTPException(400, f"order phải là {'/'.join(_ORDERS)}")
+
+    prof = get_profiler()
+    if prof is None:
+        return {"enabled": False, "thresholdMs": SLOW_MS, "items": []}
+
+    return {
+        "enabled": True,
+        "thresholdMs": SLOW_MS,
+        "logPath": prof.log_path,
+        "items": prof.top(limit=limit, order=_ORDERS[order]),
+    }
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Query
 from datetime import datetime, timedelta
 from module_trafficsource import create_token_from_credentials
 from module_geography import fetch_geography
+from module_transport import get_transport
 
 import os
 
@@ -68,7 +69,8 @@ def api_geography(
     cred_file = CHANNEL_CREDENTIALS[channel]
 
     try:
-        creds = create_token_from_credentials(cred_file)
+        # YT_TRANSPORT=replay/synthetic: không cần OAuth
+        creds = None if get_transport().offline else create_token_from_credentials(cred_file)
     except Exception as e:
         return {
             "start": None,
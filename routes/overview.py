@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import date
 from sqlalchemy import text
-from db import engine
+from db import HEAVY_STATEMENT_TIMEOUT_MS, QueryTimeout, read_conn
 from typing import Optional
 
 router = APIRouter(prefix="/api/video_overview", tags=["video_overview"])
@@ -12,11 +12,13 @@ router = APIRouter(prefix="/api/video_overview", tags=["video_overview"])
 # ---------------------------------------------------------------------
 # Utility query
 # ---------------------------------------------------------------------
-def query(sql: str, params=None):
+def query(sql: str, params=None, timeout_ms=None):
     try:
-        with engine.begin() as conn:
+        with read_conn(timeout_ms) as conn:
             rs = conn.execute(text(sql), params or {})
             return rs.mappings().all()
+    except QueryTimeout:
+        raise
     except Exception as e:
         print("[DB ERROR]", e)
         return []
@@ -41,7 +43,7 @@ def list_channels():
         FROM video_overview
         WHERE account_tag IS NOT NULL
         ORDER BY account_tag;
-    """)
+    """, timeout_ms=HEAVY_STATEMENT_TIMEOUT_MS)  # DISTINCT quét cả bảng
 
     return {"items": rows}
 
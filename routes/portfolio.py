@@ -0,0 +1,96 @@
+# routes/portfolio.py
+# Tổng hợp nhiều kênh (account_tag) trong 1 query: GROUPING SETS trên traffic_source_daily
+# (index covering idx_tsd_acct_day_cover), kết quả cache TTL ngắn.
+import os
+from datetime import date
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import text
+
+from cache import TTLCache
+from db import HEAVY_STATEMENT_TIMEOUT_MS, read_conn
+from routes.traffic_timeseries import INTERVAL_MAP, _AGG_COLUMNS, _METRIC_KEYS
+
+router = APIRouter(prefix="/api/portfolio", tags=["portfolio"])
+
+_cache = TTLCache("portfolio", ttl_s=float(os.getenv("PORTFOLIO_CACHE_TTL_S", "60")))
+
+
+class PortfolioRequest(BaseModel):
+    accountTags: Union[List[str], str] = "all"  # danh sách account_tag hoặc "all"
+    start: date
+    end: date
+    interval: str = "daily"  # daily | weekly | monthly | yearly
+
+
+def _portfolio(tags: Optional[List[str]], start: date, end: date, interval: str):
+    cond_tags = "AND account_tag = ANY(:tags)" if tags is not None else ""
+    sql = text(f"""
+        SELECT
+          GROUPING(account_tag, bucket) AS grp,
+          account_tag,
+          bucket,
+          {_AGG_COLUMNS}
+        FROM (
+          SELECT account_tag, date_trunc(:bucket, day)::date AS bucket, views,
+                 estimated_minutes_watched, engaged_views,
+                 average_view_duration, average_view_percentage
+          FROM traffic_source_daily
+          WHERE day BETWEEN :start AND :end
+            {cond_tags}
+        ) t
+        GROUP BY GROUPING SETS ((account_tag, bucket), (account_tag), (bucket), ())
+        ORDER BY grp ASC, account_tag ASC, bucket ASC
+    """)
+    params = {"bucket": INTERVAL_MAP[interval], "start": start, "end": end}
+    if tags is not None:
+        params["tags"] = tags
+
+    with read_conn(HEAVY_STATEMENT_TIMEOUT_MS) as conn:
+        rows = conn.execute(sql, params).mappings().all()
+
+    # grp: 0 = (account, bucket), 1 = (account), 2 = (bucket), 3 = ()
+    accounts = {}
+    series = []
+    totals = {k: 0 for k in _METRIC_KEYS}
+    for r in rows:
+        metrics = {k: r[k] for k in _METRIC_KEYS}
+        grp = r["grp"]
+        if grp == 0:
+            accounts.setdefault(r["account_tag"], {"series": []})["series"].append(
+                {"bucket": r["bucket"], **metrics})
+        elif grp == 1:
+            accounts.setdefault(r["account_tag"], {"series": []})["totals"] = metrics
+        elif grp == 2:
+            series.append({"bucket": r["bucket"], **metrics})
+        else:
+            totals = {k: v or 0 for k, v in metrics.items()}  # không có dòng -> SUM() = NULL
+
+    return {
+        "accounts": [{"accountTag": tag, **acc} for tag, acc in accounts.items()],
+        "combined": {"totals": totals, "series": series},
+    }
+
+
+@router.post("")
+def portfolio(req: PortfolioRequest):
+    """
+    Per-account totals + series và tổng gộp của cả portfolio cho [start, end].
+    account_tag không có dữ liệu trong range sẽ không xuất hiện trong "accounts".
+    """
+    if req.interval not in INTERVAL_MAP:
+        raise HTTPException(400, "interval phải là daily/weekly/monthly/yearly")
+
+    if isinstance(req.accountTags, str):
+        if req.accountTags != "all":
+            raise HTTPException(400, 'accountTags phải là danh sách hoặc "all"')
+        tags = None
+    else:
+        tags = sorted(set(t.strip() for t in req.accountTags if t.strip()))
+        if not tags:
+            raise HTTPException(400, "accountTags rỗng")
+
+    key = (tuple(tags) if tags is not None else "all", req.start, req.end, req.interval)
+    return _cache.get_or_compute(key, lambda: _portfolio(tags, req.start, req.end, req.interval))
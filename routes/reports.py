@@ -0,0 +1,89 @@
+# routes/reports.py
+# Dataset báo cáo (reports/<account>/<dataset>.csv do get_data_from_credentials_token export) phục vụ qua API,
+# cùng shape item với các file JS convert_* sinh ra -> frontend không cần build lại bundle khi có export mới.
+# Cache in-process theo (path, mtime, size): file đổi là key đổi, không cần invalidate; ETag cũng lấy từ đó.
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+from cache import TTLCache
+from report_datasets import load_dataset
+
+router = APIRouter(prefix="/api/reports", tags=["reports"])
+
+REPORT_ROOT = os.getenv("REPORT_ROOT", "reports")
+# export chạy theo chu kỳ ingest -> client revalidate (rẻ nhờ 304)
+REPORTS_MAX_AGE_S = int(os.getenv("REPORTS_MAX_AGE_S", "60"))
+
+_cache = TTLCache("reports", ttl_s=float(os.getenv("REPORTS_CACHE_TTL_S", "3600")), maxsize=128)
+_NAME_RE = re.compile(r"^[A-Za-z0-9_\-\.]+$")
+
+
+def _check_name(value: str, what: str) -> str:
+    # tên lấy từ path -> chặn "..", "/" để không đọc ra ngoài REPORT_ROOT
+    if not _NAME_RE.match(value) or ".." in value:
+        raise HTTPException(400, f"{what} không hợp lệ")
+    return value
+
+
+def _etag(path: str, st: os.stat_result) -> str:
+    h = hashlib.sha1(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return '"' + h.hexdigest()[:24] + '"'
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or etag in tags or ("W/" + etag) in tags
+    ims = request.headers.get("if-modified-since")
+    if ims is not None:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+@router.get("/{account}")
+def list_datasets(account: str):
+    account_dir = os.path.join(REPORT_ROOT, _check_name(account, "account"))
+    if not os.path.isdir(account_dir):
+        raise HTTPException(404, f"không có báo cáo cho {account}")
+    datasets = sorted(f[:-4] for f in os.listdir(account_dir) if f.lower().endswith(".csv"))
+    return {"account": account, "datasets": datasets}
+
+
+@router.get("/{account}/{dataset}")
+def get_dataset(account: str, dataset: str, request: Request):
+    _check_name(account, "account")
+    _check_name(dataset, "dataset")
+    path = os.path.join(REPORT_ROOT, account, f"{dataset}.csv")
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(404, f"không có dataset {dataset} cho {account}")
+
+    etag = _etag(path, st)
+    last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={REPORTS_MAX_AGE_S}, must-revalidate",
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    key = (path, st.st_mtime_ns, st.st_size)
+    payload: Optional[dict] = _cache.get(key)
+    if payload is None:
+        payload = {"account": account, "dataset": dataset, **load_dataset(path, dataset)}
+        _cache.set(key, payload)
+    return JSONResponse(payload, headers=headers)
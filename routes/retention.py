@@ -0,0 +1,106 @@
+# routes/retention.py
+# Audience retention theo video (video_retention, ghi bởi module_drilldown: 1 dòng / video / window,
+# watch_ratio REAL[RETENTION_BUCKETS]) -> nhiều video trong 1 lần đọc PK + trung bình tính trong PostgreSQL.
+import os
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import text
+
+from db import QueryTimeout, read_conn
+from module_drilldown import RETENTION_BUCKETS
+
+router = APIRouter(prefix="/api/retention", tags=["retention"])
+
+RETENTION_MAX_VIDEOS = int(os.getenv("RETENTION_MAX_VIDEOS", "500"))
+# elapsedVideoTimeRatio của từng bucket (0.01 .. 1.00)
+BUCKETS = [round((i + 1) / RETENTION_BUCKETS, 2) for i in range(RETENTION_BUCKETS)]
+
+
+class RetentionRequest(BaseModel):
+    channelId: str                     # = account_tag
+    videoIds: List[str]
+    start: Optional[date] = None       # start + end: đúng window đã drill-down; bỏ trống -> window mới nhất / video
+    end: Optional[date] = None
+    audienceType: str = "ORGANIC"
+    includeCurves: bool = True
+    average: bool = False              # trung bình từng bucket trên tập video (bỏ qua bucket NULL)
+
+
+def _curves_cte(req: RetentionRequest) -> str:
+    window = "AND r.start_date = :start AND r.end_date = :end" if req.start and req.end else ""
+    return f"""
+    WITH c AS (
+        SELECT DISTINCT ON (r.video_id)
+            r.video_id, r.start_date, r.end_date, r.watch_ratio
+        FROM video_retention r
+        WHERE r.account_tag = :account_tag
+          AND r.video_id = ANY(:video_ids)
+          AND r.audience_type = :audience_type
+          {window}
+        ORDER BY r.video_id, r.end_date DESC, r.start_date
+    )"""
+
+
+@router.post("/curves")
+def retention_curves(req: RetentionRequest):
+    """
+    Response:
+    {
+      "buckets": [0.01, ..., 1.0],
+      "items": [{"videoId": "...", "start": "...", "end": "...", "watchRatio": [..100 phần tử..]}, ...],
+      "average": {"videos": 37, "watchRatio": [...], "samples": [...]}   # chỉ khi average=true
+    }
+    """
+    video_ids = list(dict.fromkeys(v for v in req.videoIds if v))
+    if not video_ids:
+        raise HTTPException(400, "videoIds rỗng")
+    if len(video_ids) > RETENTION_MAX_VIDEOS:
+        raise HTTPException(400, f"tối đa {RETENTION_MAX_VIDEOS} video")
+    if (req.start is None) != (req.end is None):
+        raise HTTPException(400, "cần cả start và end (hoặc bỏ trống cả 2)")
+
+    params = {
+        "account_tag": req.channelId,
+        "video_ids": video_ids,
+        "audience_type": req.audienceType,
+        "start": req.start,
+        "end": req.end,
+    }
+    cte = _curves_cte(req)
+    out = {"buckets": BUCKETS, "items": []}
+
+    try:
+        with read_conn() as conn:
+            if req.includeCurves:
+                rows = conn.execute(text(cte + """
+                    SELECT video_id, start_date, end_date, watch_ratio FROM c ORDER BY video_id
+                """), params).all()
+                out["items"] = [
+                    {"videoId": r[0], "start": r[1], "end": r[2], "watchRatio": r[3]} for r in rows
+                ]
+            if req.average:
+                rows = conn.execute(text(cte + """
+                    SELECT u.i, AVG(u.x), COUNT(u.x), (SELECT COUNT(*) FROM c)
+                    FROM c CROSS JOIN LATERAL unnest(c.watch_ratio) WITH ORDINALITY AS u(x, i)
+                    GROUP BY u.i
+                    ORDER BY u.i
+                """), params).all()
+                avg: List[Optional[float]] = [None] * RETENTION_BUCKETS
+                samples = [0] * RETENTION_BUCKETS
+                for i, value, n, _ in rows:
+                    if 1 <= i <= RETENTION_BUCKETS:
+                        avg[i - 1] = float(value) if value is not None else None
+                        samples[i - 1] = n
+                out["average"] = {"videos": rows[0][3] if rows else 0, "watchRatio": avg, "samples": samples}
+    except QueryTimeout:
+        raise
+    except Exception as e:
+        # chưa drill-down lần nào (chưa có bảng video_retention)
+        print("[retention.curves] failed:", e)
+        if req.average:
+            out["average"] = {"videos": 0, "watchRatio": [None] * RETENTION_BUCKETS,
+                              "samples": [0] * RETENTION_BUCKETS}
+    return out
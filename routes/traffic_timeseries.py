@@ -3,19 +3,37 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import date
 from sqlalchemy import text
-from db import engine
+from db import HEAVY_STATEMENT_TIMEOUT_MS, QueryTimeout, read_conn
 
-def query_all_safe(sql: str, params=None):
+def query_all_safe(sql: str, params=None, timeout_ms=None):
     try:
-        with engine.begin() as conn:
+        with read_conn(timeout_ms) as conn:
             rs = conn.execute(text(sql), params or {})
             return rs.mappings().all()
+    except QueryTimeout:
+        raise
     except Exception as e:
         print("[query_all_safe] failed:", e)
         return []
 
 router = APIRouter(prefix="/api/traffic_source", tags=["traffic_source"])
 
+# metric tổng hợp dùng chung cho /timeseries, /range, /overview (cùng công thức -> cùng kết quả)
+_AGG_COLUMNS = """
+          SUM(views)::bigint AS "views",
+          SUM(estimated_minutes_watched)::bigint AS "estimatedMinutesWatched",
+          SUM(engaged_views)::bigint AS "engagedViews",
+          CASE WHEN SUM(views) > 0
+               THEN SUM(average_view_duration * views)::float / SUM(views)
+               ELSE 0 END AS "averageViewDuration",
+          CASE WHEN SUM(views) > 0
+               THEN SUM(average_view_percentage * views)::float / SUM(views)
+               ELSE 0 END AS "averageViewPercentage"
+""".strip()
+
+_METRIC_KEYS = ["views", "estimatedMinutesWatched", "engagedViews",
+                "averageViewDuration", "averageViewPercentage"]
+
 def resolve_channel(channel_root: str):
     if "__" in channel_root:
         account_tag, channel_id = channel_root.split("__", 1)
@@ -33,7 +51,7 @@ def list_channels():
         FROM traffic_source_daily
         WHERE account_tag IS NOT NULL AND account_tag <> ''
         ORDER BY 2;
-    """)
+    """, timeout_ms=HEAVY_STATEMENT_TIMEOUT_MS)  # DISTINCT quét cả bảng
     items = [{"value": r["account_tag"], "label": r["account_tag"]} for r in rows_acc]
     return {"items": items}
 
@@ -45,10 +63,11 @@ class TSRequest(BaseModel):
     channelRoot: str
     interval: str  # daily | weekly | monthly | yearly
 
+INTERVAL_MAP = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year"}
+
 @router.post("/timeseries")
 def timeseries(req: TSRequest):
-    interval_map = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year"}
-    if req.interval not in interval_map:
+    if req.interval not in INTERVAL_MAP:
         raise HTTPException(400, "interval phải là daily/weekly/monthly/yearly")
 
     ch = resolve_channel(req.channelRoot)
@@ -58,15 +77,7 @@ def timeseries(req: TSRequest):
         SELECT
           date_trunc(:bucket, day)::date AS bucket,
           source,
-          SUM(views)::bigint AS "views",
-          SUM(estimated_minutes_watched)::bigint AS "estimatedMinutesWatched",
-          SUM(engaged_views)::bigint AS "engagedViews",
-          CASE WHEN SUM(views) > 0
-               THEN SUM(average_view_duration * views)::float / SUM(views)
-               ELSE 0 END AS "averageViewDuration",
-          CASE WHEN SUM(views) > 0
-               THEN SUM(average_view_percentage * views)::float / SUM(views)
-               ELSE 0 END AS "averageViewPercentage"
+          {_AGG_COLUMNS}
         FROM traffic_source_daily
         WHERE account_tag = :account_tag
           {cond_channel}
@@ -76,7 +87,7 @@ def timeseries(req: TSRequest):
     """)
 
     params = {
-        "bucket": interval_map[req.interval],
+        "bucket": INTERVAL_MAP[req.interval],
         "account_tag": ch["account_tag"],
         "start": req.start,
         "end": req.end,
@@ -84,7 +95,7 @@ def timeseries(req: TSRequest):
     if ch["channel_id"] is not None:
         params["channel_id"] = ch["channel_id"]
 
-    with engine.begin() as conn:
+    with read_conn(HEAVY_STATEMENT_TIMEOUT_MS) as conn:
         rows = conn.execute(sql, params).mappings().all()
 
     return rows
@@ -103,15 +114,7 @@ def range_aggregate(req: RangeRequest):
     sql = text(f"""
         SELECT
           source,
-          SUM(views)::bigint AS "views",
-          SUM(estimated_minutes_watched)::bigint AS "estimatedMinutesWatched",
-          SUM(engaged_views)::bigint AS "engagedViews",
-          CASE WHEN SUM(views) > 0
-               THEN SUM(average_view_duration * views)::float / SUM(views)
-               ELSE 0 END AS "averageViewDuration",
-          CASE WHEN SUM(views) > 0
-               THEN SUM(average_view_percentage * views)::float / SUM(views)
-               ELSE 0 END AS "averageViewPercentage"
+          {_AGG_COLUMNS}
         FROM traffic_source_daily
         WHERE account_tag = :account_tag
           {cond_channel}
@@ -128,7 +131,80 @@ def range_aggregate(req: RangeRequest):
     if ch["channel_id"] is not None:
         params["channel_id"] = ch["channel_id"]
 
-    with engine.begin() as conn:
+    with read_conn(HEAVY_STATEMENT_TIMEOUT_MS) as conn:
         rows = conn.execute(sql, params).mappings().all()
 
     return [{"id": r["source"], "label": r["source"], **r} for r in rows]
+
+
+def _split_overview(rows):
+    """
+    Tách kết quả GROUPING SETS của /overview -> (series, sources, totals).
+    GROUPING(bucket, source): đối số trái là bit cao, bit = 1 khi cột bị gộp
+      0 = (bucket, source), 2 = (source) [bucket bị gộp], 3 = ()
+    """
+    series, sources, totals = [], [], None
+    for r in rows:
+        if r["grp"] == 0:
+            series.append({"bucket": r["bucket"], "source": r["source"],
+                           **{k: r[k] for k in _METRIC_KEYS}})
+        elif r["grp"] == 2:
+            sources.append({"id": r["source"], "label": r["source"], "source": r["source"],
+                            **{k: r[k] for k in _METRIC_KEYS}})
+        elif r["grp"] == 3:
+            # không có dòng nào -> SUM() = NULL
+            totals = {k: r[k] or 0 for k in _METRIC_KEYS}
+
+    sources.sort(key=lambda x: x["views"], reverse=True)  # như /range: ORDER BY views DESC
+    return series, sources, totals or {k: 0 for k in _METRIC_KEYS}
+
+
+@router.post("/overview")
+def overview(req: TSRequest):
+    """
+    /timeseries + /range trong 1 lần quét: GROUPING SETS
+      (bucket, source) -> series  (giống /timeseries)
+      (source)         -> sources (giống /range)
+      ()               -> totals
+    """
+    if req.interval not in INTERVAL_MAP:
+        raise HTTPException(400, "interval phải là daily/weekly/monthly/yearly")
+
+    ch = resolve_channel(req.channelRoot)
+    cond_channel = "AND channel_id = :channel_id" if ch["channel_id"] is not None else ""
+
+    # bucket tính trong subquery để GROUPING SETS tham chiếu theo tên cột
+    sql = text(f"""
+        SELECT
+          GROUPING(bucket, source) AS grp,
+          bucket,
+          source,
+          {_AGG_COLUMNS}
+        FROM (
+          SELECT date_trunc(:bucket, day)::date AS bucket, source, views,
+                 estimated_minutes_watched, engaged_views,
+                 average_view_duration, average_view_percentage
+          FROM traffic_source_daily
+          WHERE account_tag = :account_tag
+            {cond_channel}
+            AND day BETWEEN :start AND :end
+        ) t
+        GROUP BY GROUPING SETS ((bucket, source), (source), ())
+        ORDER BY grp ASC, bucket ASC, source ASC
+    """)
+
+    params = {
+        "bucket": INTERVAL_MAP[req.interval],
+        "account_tag": ch["account_tag"],
+        "start": req.start,
+        "end": req.end,
+    }
+    if ch["channel_id"] is not None:
+        params["channel_id"] = ch["channel_id"]
+
+    with read_conn(HEAVY_STATEMENT_TIMEOUT_MS) as conn:
+        rows = conn.execute(sql, params).mappings().all()
+
+    series, sources, totals = _split_overview(rows)
+
+    return {"series": series, "sources": sources, "totals": totals}
@@ -0,0 +1,317 @@
+# scheduler.py — ingest định kỳ chạy nền, thay cho chạy get_data.py bằng tay.
+# - lịch dạng cron 5 trường (INGEST_SCHEDULE, giờ local), mỗi lượt chạy các stage cho mọi account có token
+# - mỗi account chạy trong 1 process con (ProcessPoolExecutor, spawn) -> event loop của API không bị chặn
+# - advisory lock PostgreSQL theo account: nhiều worker uvicorn / worker riêng không ingest trùng account
+# - account xong -> bỏ cache in-process của account đó (data_version đã tăng trong transaction ghi dữ liệu)
+#
+# Bật trong app: INGEST_SCHEDULER=1 (lifespan của main.py). Chạy riêng: python scheduler.py [--once] [--account X]
+import argparse
+import asyncio
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import create_engine
+
+from cache import invalidate_account
+from module_content import process_content
+from module_monetization import process_monetization
+from module_overall import process_overall
+from module_trafficsource import CREDENTIALS_FOLDER, TOKEN_FOLDER, process_one, sanitize_filename
+from module_transport import get_transport
+
+
+# ===== Config =====
+INGEST_SCHEDULER = os.getenv("INGEST_SCHEDULER", "0") == "1"
+# mặc định mỗi giờ, khớp INGEST_INTERVAL_S (http_cache: max-age theo chu kỳ ingest)
+INGEST_SCHEDULE = os.getenv("INGEST_SCHEDULE", "0 * * * *")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# lượt lỗi (list account / tính lịch) -> thử lại sau INGEST_RETRY_S thay vì dừng scheduler
+INGEST_RETRY_S = float(os.getenv("INGEST_RETRY_S", "60"))
+INGEST_STAGES = [s.strip() for s in os.getenv("INGEST_STAGES", "traffic,content,monetization,overall").split(",")
+                 if s.strip()]
+
+# stage -> hàm process_* (nhận tên file credentials)
+STAGES = {
+    "traffic": process_one,
+    "content": process_content,
+    "monetization": process_monetization,
+    "overall": process_overall,
+}
+
+
+# ===== Cron =====
+class CronSchedule:
+    """
+    "phút giờ ngày tháng thứ" — mỗi trường: *, */n, a-b, a-b/n, a,b,... (thứ: 0 = Chủ nhật).
+    Ngày và thứ cùng bị giới hạn thì phải khớp cả 2 (đơn giản hơn cron chuẩn là khớp 1 trong 2).
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"INGEST_SCHEDULE cần 5 trường: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(p, lo, hi) for p, (lo, hi) in zip(parts, self._RANGES)
+        )
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> Set[int]:
+        out: Set[int] = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            step_n = int(step) if step else 1
+            if base == "*":
+                a, b = lo, hi
+            elif "-" in base:
+                a, b = (int(x) for x in base.split("-", 1))
+            else:
+                a = b = int(base)
+                if step:
+                    b = hi  # "5/15" = từ 5, mỗi 15
+            if not (lo <= a <= b <= hi) or step_n < 1:
+                raise ValueError(f"trường cron không hợp lệ: {field!r}")
+            out.update(range(a, b + 1, step_n))
+        return out
+
+    def next_after(self, t: datetime) -> datetime:
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif t.day not in self.days or (t.weekday() + 1) % 7 not in self.weekdays:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"INGEST_SCHEDULE không bao giờ khớp: {self.expr!r}")
+
+
+# ===== Account =====
+def account_tag_of(cred_file: str) -> str:
+    return sanitize_filename(os.path.splitext(os.path.basename(cred_file))[0])
+
+
+def _token_usable(cred_file: str) -> bool:
+    # token hỏng / không refresh được -> create_token_from_credentials sẽ mở browser (chặn process con)
+    token_path = os.path.join(TOKEN_FOLDER, os.path.splitext(cred_file)[0] + ".pickle")
+    try:
+        with open(token_path, "rb") as f:
+            creds = pickle.load(f)
+    except Exception:
+        # file hỏng / pickle của phiên bản thư viện khác: coi như chưa có token, không làm hỏng cả lượt
+        return False
+    return bool(creds and (creds.valid or (creds.expired and creds.refresh_token)))
+
+
+def list_accounts() -> Dict[str, Optional[str]]:
+    """cred_file -> None nếu chạy được, hoặc lý do bỏ qua."""
+    if not os.path.isdir(CREDENTIALS_FOLDER):
+        return {}
+    offline = get_transport().offline
+    return {
+        f: None if offline or _token_usable(f) else "no_token"
+        for f in sorted(os.listdir(CREDENTIALS_FOLDER)) if f.endswith(".json")
+    }
+
+
+def ingest_account(cred_file: str, stages: List[str]) -> Dict:
+    """Chạy trong process con: các stage của 1 account, giữ advisory lock của account trong lúc chạy."""
+    tag = account_tag_of(cred_file)
+    pg_url = os.getenv("PG_URL")
+    engine = create_engine(pg_url, future=True)
+    with engine.connect() as conn:
+        got = conn.exec_driver_sql("SELECT pg_try_advisory_lock(hashtext(%s))", (f"ingest:{tag}",)).scalar()
+        conn.commit()
+        if not got:
+            return {"status": "skipped", "reason": "locked", "stages": {}}
+        out: Dict[str, Dict] = {}
+        try:
+            for name in stages:
+                t0 = time.monotonic()
+                try:
+                    result = STAGES[name](cred_file)
+                except Exception as e:
+                    out[name] = {"status": "error", "error": f"{e.__class__.__name__}: {e}"[:500]}
+                else:
+                    # stage có checkpoint trả về counts; còn unit chưa xong -> partial (lần sau chạy tiếp)
+                    partial = isinstance(result, dict) and result.get("status") not in (None, "done")
+                    out[name] = {"status": "partial" if partial else "ok"}
+                out[name]["seconds"] = round(time.monotonic() - t0, 1)
+        finally:
+            conn.exec_driver_sql("SELECT pg_advisory_unlock(hashtext(%s))", (f"ingest:{tag}",))
+            conn.commit()
+    statuses = {s["status"] for s in out.values()}
+    status = "error" if "error" in statuses else ("partial" if "partial" in statuses else "ok")
+    return {"status": status, "stages": out}
+
+
+# ===== Scheduler =====
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class IngestScheduler:
+    def __init__(self, schedule: str = INGEST_SCHEDULE, workers: int = INGEST_WORKERS,
+                 stages: Optional[List[str]] = None, only: Optional[List[str]] = None):
+        self.cron = CronSchedule(schedule)
+        self.only = only  # None = mọi account có token
+        self.workers = workers
+        self.stages = stages or INGEST_STAGES
+        unknown = [s for s in self.stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"INGEST_STAGES không hợp lệ: {unknown}")
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.next_run: Optional[datetime] = None
+        self.accounts: Dict[str, Dict] = {}  # account_tag -> lượt chạy gần nhất / đang chạy
+        self._running: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._triggered: Set[asyncio.Task] = set()  # giữ reference, không để task bị GC giữa chừng
+        self.last_error: Optional[Dict] = None
+
+    def open_pool(self):
+        # spawn: không fork process đang chạy event loop + thread pool; 1 account / process con rồi bỏ
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                        max_tasks_per_child=1)
+
+    def start(self):
+        self.open_pool()
+        self._task = asyncio.create_task(self._loop())
+        print(f"[ingest] scheduler started: '{self.cron.expr}', workers={self.workers}, stages={self.stages}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.pool:
+            # bỏ account chưa bắt đầu, chờ account đang chạy xong (trong thread, không chặn event loop)
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.pool.shutdown(wait=True, cancel_futures=True))
+            self.pool = None
+
+    async def _loop(self):
+        while True:
+            try:
+                self.next_run = self.cron.next_after(datetime.now())
+                await asyncio.sleep(max(0.0, (self.next_run - datetime.now()).total_seconds()))
+                await self.run(self.only)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 1 lượt lỗi không được làm chết task lịch (admin vẫn thấy enabled + nextRun)
+                self.last_error = {"at": _now(), "error": f"{e.__class__.__name__}: {e}"[:500]}
+                self.next_run = datetime.now() + timedelta(seconds=INGEST_RETRY_S)
+                print(f"[ingest] lượt lỗi, thử lại sau {INGEST_RETRY_S:.0f}s: {self.last_error['error']}")
+                await asyncio.sleep(INGEST_RETRY_S)
+
+    def trigger(self, accounts: Optional[List[str]] = None) -> List[str]:
+        """Chạy ngay (không chờ lịch), trả về account_tag sẽ chạy."""
+        selected = self._select(accounts)
+        task = asyncio.create_task(self._run_selected(selected))
+        self._triggered.add(task)
+        task.add_done_callback(self._triggered.discard)
+        return [account_tag_of(f) for f in selected]
+
+    def _select(self, accounts: Optional[List[str]]) -> List[str]:
+        selected = []
+        for cred_file, skip in list_accounts().items():
+            tag = account_tag_of(cred_file)
+            if accounts is not None and tag not in accounts:
+                continue
+            if skip:
+                self.accounts[tag] = {"account": tag, "status": "skipped", "reason": skip, "at": _now()}
+            elif tag not in self._running:
+                selected.append(cred_file)
+        return selected
+
+    async def run(self, accounts: Optional[List[str]] = None):
+        await self._run_selected(self._select(accounts))
+
+    async def _run_selected(self, cred_files: List[str]):
+        await asyncio.gather(*(self._run_account(f) for f in cred_files))
+
+    async def _run_account(self, cred_file: str):
+        tag = account_tag_of(cred_file)
+        self._running.add(tag)
+        state = {"account": tag, "status": "running", "startedAt": _now(), "stages": {}}
+        self.accounts[tag] = state
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.pool, ingest_account, cred_file, self.stages)
+            state.update(result)
+        except Exception as e:
+            state.update(status="error", error=f"{e.__class__.__name__}: {e}"[:500])
+        finally:
+            self._running.discard(tag)
+            state["finishedAt"] = _now()
+        # data_version đã tăng cùng dữ liệu; cache TTL in-process của process này thì bỏ ngay
+        dropped = invalidate_account(tag)
+        print(f"[ingest] {tag}: {state['status']} (cache: bỏ {dropped} entry)")
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": True,
+            "schedule": self.cron.expr,
+            "stages": self.stages,
+            "workers": self.workers,
+            "nextRun": self.next_run.isoformat(timespec="seconds") if self.next_run else None,
+            "running": sorted(self._running),
+            "lastError": self.last_error,
+            "accounts": sorted(self.accounts.values(), key=lambda s: s["account"]),
+        }
+
+
+_scheduler: Optional[IngestScheduler] = None
+
+
+def get_scheduler() -> Optional[IngestScheduler]:
+    return _scheduler
+
+
+@asynccontextmanager
+async def ingest_lifespan(app):
+    """Lifespan của FastAPI: chỉ chạy scheduler khi INGEST_SCHEDULER=1."""
+    global _scheduler
+    if INGEST_SCHEDULER:
+        _scheduler = IngestScheduler()
+        _scheduler.start()
+    try:
+        yield
+    finally:
+        if _scheduler:
+            await _scheduler.stop()
+            _scheduler = None
+
+
+# ===== Worker riêng =====
+async def _worker(once: bool, accounts: Optional[List[str]]):
+    global _scheduler
+    _scheduler = IngestScheduler(only=accounts)
+    if once:
+        _scheduler.open_pool()
+        await _scheduler.run(accounts)
+        for s in _scheduler.snapshot()["accounts"]:
+            print(s)
+        await _scheduler.stop()
+        return
+    _scheduler.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Worker ingest theo INGEST_SCHEDULE (không cần chạy API).")
+    ap.add_argument("--once", action="store_true", help="chạy 1 lượt ngay rồi thoát")
+    ap.add_argument("--account", action="append", help="chỉ account_tag này (lặp lại được)")
+    args = ap.parse_args()
+    asyncio.run(_worker(args.once, args.account))
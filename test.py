@@ -2,8 +2,8 @@ import os
 import csv
 import pickle
 import re
-from typing import Dict, Any, List
-from functools import lru_cache
+from typing import Dict, Any, List, Optional
+from functools import partial
 from datetime import datetime, timedelta
 
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -11,6 +11,10 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
+from capabilities import get_capabilities
+from module_drilldown import run_drilldown
+from report_runner import UnsupportedQuery, metric_supported, query_report, run_ordered
+
 # =========================
 # Paths / Settings
 # =========================
@@ -103,19 +107,6 @@ def value_list_from_first_column(resp):
         return []
     return sorted({r[0] for r in rows})
 
-@lru_cache(maxsize=None)
-def metric_supported(ids_val: str, start_date: str, end_date: str, metric_name: str, owner_mode: bool) -> bool:
-    """Probe one simple query once. Cache by signature."""
-    try:
-        yta = build("youtubeAnalytics", "v2")
-        base_req = {"ids": ids_val, "startDate": start_date, "endDate": end_date}
-        if owner_mode:
-            base_req["onBehalfOfContentOwner"] = CONTENT_OWNER_ID
-        yta_query(yta, **{**base_req, "dimensions": "day", "metrics": metric_name})
-        return True
-    except Exception:
-        return False
-
 def countries_with_data(yta, base_req) -> set:
     try:
         resp = yta_query(yta, **{**base_req, "dimensions": "country", "metrics": "views"})
@@ -223,62 +214,30 @@ def run_province_reports_if_any(yta, base_req, out_dir):
         else:
             print(f"  · Geography_by_province__{cc}: no country traffic → skip")
 
-def run_retention_per_video(yta, base_req, top_video_ids, out_dir):
-    for vid in top_video_ids:
-        try:
-            resp = yta_query(yta, **{**base_req,
-                                     "dimensions": "elapsedVideoTimeRatio",
-                                     "metrics": "audienceWatchRatio",
-                                     "filters": f"video=={vid};audienceType==ORGANIC"})
-            out = os.path.join(out_dir, f"Audience_retention__{sanitize_filename(vid)}.csv")
-            headers = [h["name"] for h in resp.get("columnHeaders", [])]
-            rows = resp.get("rows", [])
-            save_csv(out, headers, rows)
-            print(f"  ✓ Audience_retention({vid}) -> {out}")
-        except HttpError:
-            print(f"  · Audience_retention({vid}): unsupported/insufficient data → skip")
-
-def run_traffic_detail_per_video(yta, base_req, top_video_ids, out_dir):
-    # Only try a conservative set; API will 400 silently for unsupported combos
-    candidate_types = ["YT_SEARCH", "RELATED_VIDEO", "PLAYLIST", "YT_CHANNEL", "YT_OTHER_PAGE", "NO_LINK_OTHER"]
-    for vid in top_video_ids:
-        for t in candidate_types:
-            try:
-                resp = yta_query(yta, **{**base_req,
-                                         "dimensions": "insightTrafficSourceDetail",
-                                         "metrics": "views,estimatedMinutesWatched,averageViewDuration,averageViewPercentage,engagedViews",
-                                         "filters": f"video=={vid};insightTrafficSourceType=={t}",
-                                         "sort": "-views"})
-                out = os.path.join(out_dir, f"Traffic_source_detail__{sanitize_filename(vid)}__{t}.csv")
-                headers = [h["name"] for h in resp.get("columnHeaders", [])]
-                rows = resp.get("rows", [])
-                save_csv(out, headers, rows)
-                print(f"  ✓ Traffic_source_detail({vid}, {t}) -> {out}")
-            except HttpError:
-                pass  # skip unsupported
-
-def run_playback_detail_per_video(yta, base_req, top_video_ids, out_dir):
-    loc_types = ["WATCH", "EMBEDDED", "CHANNEL", "OTHER"]
-    for vid in top_video_ids:
-        for lt in loc_types:
-            try:
-                resp = yta_query(yta, **{**base_req,
-                                         "dimensions": "insightPlaybackLocationDetail",
-                                         "metrics": "views,estimatedMinutesWatched,averageViewDuration,averageViewPercentage,engagedViews",
-                                         "filters": f"video=={vid};insightPlaybackLocationType=={lt}",
-                                         "sort": "-views"})
-                out = os.path.join(out_dir, f"Playback_location_detail__{sanitize_filename(vid)}__{lt}.csv")
-                headers = [h["name"] for h in resp.get("columnHeaders", [])]
-                rows = resp.get("rows", [])
-                save_csv(out, headers, rows)
-                print(f"  ✓ Playback_location_detail({vid}, {lt}) -> {out}")
-            except HttpError:
-                pass  # skip unsupported
-
 # =========================
 # Main exporter
 # =========================
-def run_reports_to_csv(credentials, account_tag: str):
+def _export_safe_report(credentials, spec, base_req, account_dir, caps) -> str:
+    name = sanitize_filename(spec["name"])
+    out_csv = os.path.join(account_dir, f"{name}.csv")
+    req = {**base_req, "dimensions": spec["dimensions"], "metrics": ",".join(spec["metrics"]),
+           **spec.get("params", {})}
+    try:
+        resp = query_report(credentials, req, caps)
+        headers = [h.get("name", "") for h in resp.get("columnHeaders", [])]
+        rows = resp.get("rows", [])
+        if rows:
+            save_csv(out_csv, headers, rows)
+            return f"  ✓ {name}: {len(rows)} rows -> {out_csv}"
+        if headers:
+            save_csv(out_csv, headers, [])
+        return f"  · {name}: no_data"
+    except UnsupportedQuery as e:
+        return f"  · {name}: unsupported{' (cached)' if e.cached else ''} → skip"
+    except HttpError as e:
+        return f"  · {name}: error ({e.status_code}) → skip"
+
+def run_reports_to_csv(credentials, account_tag: str, channel_id: Optional[str] = None):
     yta = build("youtubeAnalytics", "v2", credentials=credentials)
     start_date, end_date = get_date_range()
 
@@ -295,32 +254,24 @@ def run_reports_to_csv(credentials, account_tag: str):
     if IS_OWNER_MODE:
         base_req["onBehalfOfContentOwner"] = CONTENT_OWNER_ID
 
-    # 1) Base reports (an toàn)
-    for spec in build_safe_reports():
-        dims = spec["dimensions"]
-        mets = ",".join(spec["metrics"])
-        params = dict(spec.get("params", {}))
-        out_csv = os.path.join(account_dir, f"{sanitize_filename(spec['name'])}.csv")
-        try:
-            resp = yta_query(yta, **{**base_req, "dimensions": dims, "metrics": mets, **params})
-            headers = [h.get("name", "") for h in resp.get("columnHeaders", [])]
-            rows = resp.get("rows", [])
-            if rows:
-                save_csv(out_csv, headers, rows)
-                print(f"  ✓ {sanitize_filename(spec['name'])}: {len(rows)} rows -> {out_csv}")
-            else:
-                if headers:
-                    save_csv(out_csv, headers, [])
-                print(f"  · {sanitize_filename(spec['name'])}: no_data")
-        except HttpError as e:
-            # Audience retention at channel-level is unsupported; we already don't query it here
-            print(f"  · {sanitize_filename(spec['name'])}: unsupported → skip")
+    # 1) Base reports (an toàn): song song, log theo thứ tự spec
+    caps = get_capabilities()
+    try:
+        for line in run_ordered(
+            partial(_export_safe_report, credentials, spec, base_req, account_dir, caps)
+            for spec in build_safe_reports()
+        ):
+            print(line)
+    finally:
+        caps.flush()
 
     # 2) Geography by province (US/CA) nếu có dữ liệu
     run_province_reports_if_any(yta, base_req, account_dir)
 
     # 3) Impressions*: chỉ nếu thật sự supported
-    imp_ok = metric_supported(ids_val, start_date, end_date, "impressions", IS_OWNER_MODE)
+    # probe theo channel/owner, nhớ trong capability cache (TTL) -> lần chạy sau không probe lại
+    owner_id = CONTENT_OWNER_ID if IS_OWNER_MODE else (channel_id or account_tag)
+    imp_ok = metric_supported(credentials, owner_id, base_req, "impressions")
     if imp_ok:
         try:
             resp = yta_query(yta, **{**base_req,
@@ -352,14 +303,13 @@ def run_reports_to_csv(credentials, account_tag: str):
     # 4) Lấy top videos để chạy per-video detail
     top_vids = get_top_video_ids(yta, base_req, limit=50)
 
-    # 5) Audience retention (per video)
-    run_retention_per_video(yta, base_req, top_vids, account_dir)
-
-    # 6) Traffic source detail (per video)
-    run_traffic_detail_per_video(yta, base_req, top_vids, account_dir)
-
-    # 7) Playback location detail (per video)
-    run_playback_detail_per_video(yta, base_req, top_vids, account_dir)
+    # 5-7) Audience retention / traffic source detail / playback location detail (per video):
+    #      lọc tổ hợp có views bằng query tổng hợp, fetch song song, ghi PostgreSQL (module_drilldown)
+    pg_url = os.getenv("PG_URL")
+    if not pg_url:
+        print("  · Drill-down per video: PG_URL chưa set → skip")
+    elif top_vids:
+        run_drilldown(credentials, account_tag, base_req, top_vids, pg_url)
 
 # =========================
 # Runner per credential file
@@ -374,7 +324,7 @@ def process_one(cred_file: str):
     ch = get_youtube_data(creds)
     if ch:
         print(f"  Channel: {ch['title']} ({ch['channel_id']}) | subs={ch['subs']} views={ch['views']} videos={ch['videos']}")
-    run_reports_to_csv(creds, account_tag)
+    run_reports_to_csv(creds, account_tag, channel_id=ch["channel_id"] if ch else None)
 
 # =========================
 # Main
@@ -0,0 +1,30 @@
+# capability cache: key theo filters / maxResults, entry "unsupported" có TTL, hint không khớp quá rộng
+import time
+
+from capabilities import CapabilityCache, capability_key, is_unsupported_error
+from module_transport import _http_error
+
+
+def test_key_separates_filtered_and_unfiltered():
+    bare = capability_key("channel==MINE", "insightTrafficSourceDetail", "views")
+    filtered = capability_key("channel==MINE", "insightTrafficSourceDetail", "views",
+                              "insightTrafficSourceType==YT_SEARCH", 25)
+    assert bare != filtered
+    # giá trị filter không vào key
+    assert capability_key("channel==MINE", "day", "views", "video==a,b") == \
+        capability_key("channel==MINE", "day", "views", "video==c")
+
+
+def test_unsupported_entries_expire(tmp_path):
+    caps = CapabilityCache(path=str(tmp_path / "caps.json"), unsupported_ttl_s=60)
+    caps.mark_unsupported("k", "The query is not supported.")
+    assert caps.unsupported("k") is not None
+    caps._entries["k"]["at"] = int(time.time()) - 120
+    assert caps.unsupported("k") is None
+    caps.flush()
+    assert "k" not in CapabilityCache(path=str(tmp_path / "caps.json"), unsupported_ttl_s=60)._entries
+
+
+def test_generic_not_supported_is_not_remembered():
+    assert is_unsupported_error(_http_error(400, b'{"error": {"message": "The query is not supported."}}'))
+    assert not is_unsupported_error(_http_error(400, b'{"error": {"message": "Sort is not supported without maxResults"}}'))
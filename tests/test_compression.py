@@ -0,0 +1,58 @@
+# CompressionMiddleware: mọi response có thể nén đều có Vary: Accept-Encoding và cùng dạng ETag (weak), kể cả 304
+import asyncio
+
+from compression import CompressionMiddleware
+
+
+def _app(status, body, headers):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+    return app
+
+
+def _call(app, accept_encoding=None):
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    scope = {"type": "http", "method": "GET", "path": "/api/x", "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, receive, send))
+    return sent[0]["status"], {k.lower(): v for k, v in sent[0]["headers"]}
+
+
+JSON = [(b"content-type", b"application/json"), (b"etag", b'"abc"')]
+
+
+def test_compressed_response_is_weak_and_varies():
+    status, h = _call(_app(200, b"x" * 500, JSON), "gzip")
+    assert h[b"content-encoding"] == b"gzip"
+    assert h[b"etag"] == b'W/"abc"' and h[b"vary"] == b"Accept-Encoding"
+
+
+def test_small_body_still_varies():
+    status, h = _call(_app(200, b"{}", JSON), "gzip")
+    assert b"content-encoding" not in h
+    assert h[b"etag"] == b'W/"abc"' and h[b"vary"] == b"Accept-Encoding"
+
+
+def test_identity_client_still_varies():
+    status, h = _call(_app(200, b"x" * 500, JSON))
+    assert b"content-encoding" not in h
+    assert h[b"etag"] == b'W/"abc"' and h[b"vary"] == b"Accept-Encoding"
+
+
+def test_not_modified_uses_same_etag_form():
+    status, h = _call(_app(304, b"", [(b"etag", b'"abc"'), (b"vary", b"Origin")]), "gzip")
+    assert status == 304
+    assert h[b"etag"] == b'W/"abc"' and h[b"vary"] == b"Origin, Accept-Encoding"
+
+
+def test_non_compressible_untouched():
+    status, h = _call(_app(200, b"x" * 500, [(b"content-type", b"image/png"), (b"etag", b'"abc"')]), "gzip")
+    assert h[b"etag"] == b'"abc"' and b"vary" not in h
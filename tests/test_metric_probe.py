@@ -0,0 +1,102 @@
+# report_runner.metric_supported / supported_metrics: lỗi tạm thời -> False, không ghi vào capability cache
+import socket
+
+from capabilities import CapabilityCache, probe_key
+from module_transport import _http_error
+from report_runner import metric_supported, supported_metrics
+
+IDS = {"ids": "channel==MINE"}
+_FORBIDDEN = b'{"error": {"code": 403, "message": "Forbidden", "errors": [{"reason": "forbidden"}]}}'
+_QUOTA = (b'{"error": {"code": 403, "message": "The request cannot be completed because you have exceeded '
+          b'your quota.", "errors": [{"reason": "quotaExceeded"}]}}')
+
+
+class _ProbeTransport:
+    """reports().query(metrics=m) -> outcomes[m]: dict = response, exception = raise."""
+
+    offline = True
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def build(self, service, version, credentials=None):
+        transport = self
+
+        class _Req:
+            def __init__(self, kw):
+                self.kw = kw
+
+            def execute(self):
+                transport.calls.append(self.kw["metrics"])
+                out = transport.outcomes[self.kw["metrics"]]
+                if isinstance(out, BaseException):
+                    raise out
+                return out
+
+        class _Reports:
+            def query(self, **kw):
+                return _Req(kw)
+
+        class _Svc:
+            def reports(self):
+                return _Reports()
+
+        return _Svc()
+
+
+def test_network_error_is_false_and_not_remembered(tmp_path):
+    caps = CapabilityCache(path=str(tmp_path / "caps.json"))
+    transport = _ProbeTransport({"views": socket.timeout("timed out")})
+
+    assert metric_supported(None, "UC1", IDS, "views", caps=caps, transport=transport) is False
+    assert caps.probe(probe_key("UC1", "views")) is None
+
+    # lần sau probe lại (không dùng kết quả lỗi mạng)
+    transport.outcomes["views"] = {"rows": []}
+    assert metric_supported(None, "UC1", IDS, "views", caps=caps, transport=transport) is True
+    assert transport.calls == ["views", "views"]
+    assert caps.probe(probe_key("UC1", "views")) is True
+
+
+def test_supported_metrics_survives_flaky_probe(tmp_path):
+    caps = CapabilityCache(path=str(tmp_path / "caps.json"))
+    transport = _ProbeTransport({
+        "views": {"rows": []},
+        "estimatedRevenue": _http_error(403, _FORBIDDEN, "Forbidden"),
+        "impressions": ConnectionResetError("reset by peer"),
+    })
+
+    ok = supported_metrics(None, "UC1", IDS, ["views", "estimatedRevenue", "impressions"],
+                           caps=caps, transport=transport)
+
+    assert ok == ["views"]
+    assert caps.probe(probe_key("UC1", "estimatedRevenue")) is False  # 403 forbidden: theo kênh, ghi nhớ
+    assert caps.probe(probe_key("UC1", "impressions")) is None        # lỗi mạng: không ghi nhớ
+
+
+def test_quota_403_is_not_remembered(tmp_path):
+    caps = CapabilityCache(path=str(tmp_path / "caps.json"))
+    transport = _ProbeTransport({"estimatedRevenue": _http_error(403, _QUOTA, "Forbidden")})
+
+    assert metric_supported(None, "UC1", IDS, "estimatedRevenue", caps=caps, transport=transport) is False
+    assert caps.probe(probe_key("UC1", "estimatedRevenue")) is None
+
+    # hết quota xong: probe lại, metric dùng được
+    transport.outcomes["estimatedRevenue"] = {"rows": []}
+    assert metric_supported(None, "UC1", IDS, "estimatedRevenue", caps=caps, transport=transport) is True
+
+
+def test_rate_limit_and_plain_400_are_not_remembered(tmp_path):
+    caps = CapabilityCache(path=str(tmp_path / "caps.json"))
+    rate = b'{"error": {"code": 403, "message": "Rate limit", "errors": [{"reason": "userRateLimitExceeded"}]}}'
+    transport = _ProbeTransport({
+        "views": _http_error(403, rate, "Forbidden"),
+        "likes": _http_error(400, b'{"error": {"message": "Invalid value for startDate"}}', "Bad Request"),
+        "impressions": _http_error(400, b'{"error": {"message": "The query is not supported."}}', "Bad Request"),
+    })
+
+    assert supported_metrics(None, "UC1", IDS, ["views", "likes", "impressions"], caps=caps, transport=transport) == []
+    assert caps.probe(probe_key("UC1", "views")) is None
+    assert caps.probe(probe_key("UC1", "likes")) is None
+    assert caps.probe(probe_key("UC1", "impressions")) is False
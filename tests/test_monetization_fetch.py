@@ -0,0 +1,67 @@
+# module_monetization.fetch_window: chunk `day,video` bị 400 / 403 -> fallback từng video thay vì đánh lỗi cả chunk
+from datetime import date
+
+from module_monetization import fetch_window
+from module_transport import _http_error
+
+QUOTA = b'{"error": {"code": 403, "message": "quota", "errors": [{"reason": "quotaExceeded"}]}}'
+
+
+class _Transport:
+    """reports().query: chunk có video "gone" -> 400; query 1 video: "gone" -> 404, "quota" -> 403 quota."""
+
+    offline = True
+
+    def __init__(self):
+        self.queries = []
+
+    def build(self, service, version, credentials=None):
+        transport = self
+
+        class _Req:
+            def __init__(self, kw):
+                self.kw = kw
+
+            def execute(self):
+                kw = self.kw
+                vids = kw["filters"].split("==", 1)[1].split(",")
+                transport.queries.append((kw["dimensions"], tuple(vids)))
+                if kw["dimensions"] == "day,video":
+                    if "gone" in vids:
+                        raise _http_error(400, b'{"error": {"message": "Invalid filter"}}', "Bad Request")
+                    return {"rows": [["2025-01-01", v, 1.5, 100, 0.05] for v in vids]}
+                vid = vids[0]
+                if vid == "gone":
+                    raise _http_error(404, b"{}", "Not Found")
+                if vid == "quota":
+                    raise _http_error(403, QUOTA, "Forbidden")
+                return {"rows": [["2025-01-01", 1.5, 100, 0.05]]}
+
+        class _Reports:
+            def query(self, **kw):
+                return _Req(kw)
+
+        class _Svc:
+            def reports(self):
+                return _Reports()
+
+        return _Svc()
+
+
+METRICS = ["estimatedRevenue", "impressions", "impressionsClickThroughRate"]
+
+
+def test_bad_chunk_falls_back_per_video():
+    transport = _Transport()
+    rows, failed = fetch_window(None, METRICS, date(2025, 1, 1), date(2025, 1, 1), ["a", "gone", "b"],
+                                transport=transport, workers=1)
+    assert failed == []
+    assert sorted(r[1] for r in rows) == ["a", "b"]
+    assert ("day", ("gone",)) in transport.queries
+
+
+def test_quota_in_fallback_is_still_a_failure():
+    rows, failed = fetch_window(None, METRICS, date(2025, 1, 1), date(2025, 1, 1), ["a", "gone", "quota"],
+                                transport=_Transport(), workers=1)
+    assert failed == ["quota"]
+    assert [r[1] for r in rows] == ["a"]
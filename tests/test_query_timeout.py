@@ -0,0 +1,53 @@
+# statement_timeout trong read_conn -> QueryTimeout -> 503 no-store (không trả [] 200 kèm ETag như dữ liệu thật)
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+import db
+import main
+
+
+class _Canceled(Exception):
+    pgcode = "57014"  # query_canceled
+
+
+def _raise_timeout(*args, **kwargs):
+    raise OperationalError("SELECT ...", {}, _Canceled("canceling statement due to statement timeout"))
+
+
+@pytest.fixture
+def sqlite_read(monkeypatch):
+    engine = create_engine("sqlite://", future=True)
+    monkeypatch.setattr(db, "_connect_read", engine.connect)
+    return engine
+
+
+def test_read_conn_maps_query_canceled(sqlite_read):
+    with pytest.raises(db.QueryTimeout):
+        with db.read_conn():
+            _raise_timeout()
+
+
+def test_read_conn_keeps_other_errors(sqlite_read):
+    with pytest.raises(OperationalError):
+        with db.read_conn() as conn:
+            conn.exec_driver_sql("SELECT * FROM missing_table")
+
+
+def test_route_returns_503_not_empty_list(sqlite_read, monkeypatch):
+    import routes.traffic_timeseries as ts
+
+    @contextmanager
+    def read_conn(timeout_ms=None):
+        with db.read_conn(timeout_ms):
+            _raise_timeout()  # query đầu tiên của route hết statement_timeout
+            yield
+
+    monkeypatch.setattr(ts, "read_conn", read_conn)
+    r = TestClient(main.app).get("/api/traffic_source/channels")
+    assert r.status_code == 503
+    assert r.headers["cache-control"] == "no-store"
+    assert "etag" not in r.headers
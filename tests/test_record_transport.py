@@ -0,0 +1,77 @@
+# module_transport: cassette chỉ ghi khi có response / HttpError; cache service của LiveTransport có giới hạn
+import socket
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import module_transport
+from module_transport import LiveTransport, RecordTransport, ReplayMissError, ReplayTransport, _http_error
+
+
+class _FakeInner:
+    """inner transport: reports().query(**kw).execute() -> outcome(kw)."""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def build(self, service, version, credentials=None):
+        outcome = self.outcome
+
+        class _Req:
+            def __init__(self, kw):
+                self.kw = kw
+
+            def execute(self):
+                return outcome(self.kw)
+
+        class _Res:
+            def query(self, **kw):
+                return _Req(kw)
+
+        class _Svc:
+            def reports(self):
+                return _Res()
+
+        return _Svc()
+
+
+def _query(transport, **kw):
+    return transport.build("youtubeAnalytics", "v2").reports().query(**kw).execute()
+
+
+def test_record_then_replay_response(tmp_path):
+    rec = RecordTransport(str(tmp_path), inner=_FakeInner(lambda kw: {"rows": [[kw["ids"], 1]]}))
+    assert _query(rec, ids="channel==MINE") == {"rows": [["channel==MINE", 1]]}
+    assert _query(ReplayTransport(str(tmp_path)), ids="channel==MINE") == {"rows": [["channel==MINE", 1]]}
+
+
+def test_record_http_error_is_replayed(tmp_path):
+    def fail(kw):
+        raise _http_error(403, b'{"error": {"message": "forbidden"}}', "Forbidden")
+
+    with pytest.raises(HttpError):
+        _query(RecordTransport(str(tmp_path), inner=_FakeInner(fail)), ids="x")
+    with pytest.raises(HttpError) as e:
+        _query(ReplayTransport(str(tmp_path)), ids="x")
+    assert e.value.resp.status == 403
+
+
+def test_record_network_error_writes_nothing(tmp_path):
+    def fail(kw):
+        raise socket.timeout("timed out")
+
+    with pytest.raises(socket.timeout):
+        _query(RecordTransport(str(tmp_path), inner=_FakeInner(fail)), ids="x")
+    assert not any(p.is_file() for p in tmp_path.rglob("*"))
+    with pytest.raises(ReplayMissError):
+        _query(ReplayTransport(str(tmp_path)), ids="x")
+
+
+def test_live_service_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(module_transport, "build", lambda *a, **kw: object())
+    live = LiveTransport(maxsize=4)
+    creds = [object() for _ in range(100)]  # mỗi request nạp credentials mới
+    for c in creds:
+        live.build("youtubeAnalytics", "v2", credentials=c)
+    assert len(live._local.services) == 4
+    assert live.build("youtube", "v3", credentials=creds[-1]) is live.build("youtube", "v3", credentials=creds[-1])
@@ -0,0 +1,81 @@
+# IngestScheduler: lượt lỗi không làm dừng task lịch; task của trigger() được giữ reference tới khi xong
+import asyncio
+from datetime import datetime
+
+import scheduler
+from scheduler import IngestScheduler
+
+
+def test_loop_survives_failed_round(monkeypatch):
+    calls = []
+
+    def flaky_accounts():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("token folder unreadable")
+        return {}
+
+    monkeypatch.setattr(scheduler, "list_accounts", flaky_accounts)
+    monkeypatch.setattr(scheduler, "INGEST_RETRY_S", 0.0)
+
+    async def main():
+        sched = IngestScheduler(schedule="* * * * *")
+        sched.cron.next_after = lambda t: datetime.now()  # chạy ngay, không chờ phút kế tiếp
+        sched._task = asyncio.create_task(sched._loop())
+        while len(calls) < 3:
+            await asyncio.sleep(0.01)
+        alive = not sched._task.done()
+        await sched.stop()
+        return sched, alive
+
+    sched, alive = asyncio.run(main())
+    assert alive
+    assert "RuntimeError" in sched.snapshot()["lastError"]["error"]
+
+
+def test_trigger_keeps_task_reference(monkeypatch):
+    monkeypatch.setattr(scheduler, "list_accounts", lambda: {"acc_a.json": None})
+
+    async def main():
+        sched = IngestScheduler()
+        done = asyncio.Event()
+
+        async def fake_run(cred_files):
+            await asyncio.sleep(0.01)
+            done.set()
+
+        sched._run_selected = fake_run
+        assert sched.trigger() == ["acc_a"]
+        assert len(sched._triggered) == 1
+        await done.wait()
+        await asyncio.sleep(0)  # done-callback
+        return sched
+
+    sched = asyncio.run(main())
+    assert not sched._triggered
+
+
+def test_trigger_rejected_without_admin_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    import routes.admin as admin
+
+    started = []
+
+    class FakeScheduler:
+        def trigger(self, accounts=None):
+            started.append(accounts)
+            return ["acc_a"]
+
+    monkeypatch.setattr(admin, "get_scheduler", lambda: FakeScheduler())
+    client = TestClient(main.app)
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.post("/api/admin/ingest").status_code == 403
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/admin/ingest", headers={"X-Admin-Token": "nope"}).status_code == 403
+    assert not started
+    r = client.post("/api/admin/ingest", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200 and r.json() == {"started": ["acc_a"]}
@@ -0,0 +1,41 @@
+# /api/traffic_source/overview: tách dòng GROUPING SETS -> series / sources / totals
+from datetime import date
+
+from routes.traffic_timeseries import _METRIC_KEYS, _split_overview
+
+
+def _row(grp, bucket, source, views, minutes):
+    return {"grp": grp, "bucket": bucket, "source": source, "views": views,
+            "estimatedMinutesWatched": minutes, "engagedViews": views,
+            "averageViewDuration": 10.0, "averageViewPercentage": 50.0}
+
+
+def test_split_overview_two_buckets_two_sources():
+    b1, b2 = date(2025, 1, 1), date(2025, 2, 1)
+    detail = [
+        _row(0, b1, "SEARCH", 10, 20),
+        _row(0, b1, "SUBSCRIBER", 5, 7),
+        _row(0, b2, "SEARCH", 30, 40),
+        _row(0, b2, "SUBSCRIBER", 1, 2),
+    ]
+    # thứ tự như PostgreSQL trả về với ORDER BY grp: (bucket, source) = 0, (source) = 2, () = 3
+    rows = detail + [
+        _row(2, None, "SEARCH", 40, 60),
+        _row(2, None, "SUBSCRIBER", 6, 9),
+        _row(3, None, None, 46, 69),
+    ]
+
+    series, sources, totals = _split_overview(rows)
+
+    assert len(series) == 4
+    assert [s["source"] for s in sources] == ["SEARCH", "SUBSCRIBER"]
+    for key in ("views", "estimatedMinutesWatched"):
+        assert totals[key] == sum(s[key] for s in sources) == sum(r[key] for r in detail)
+
+
+def test_split_overview_empty_range():
+    # không có dòng nào: chỉ còn dòng () với SUM() = NULL
+    rows = [{"grp": 3, "bucket": None, "source": None, **{k: None for k in _METRIC_KEYS}}]
+    series, sources, totals = _split_overview(rows)
+    assert series == [] and sources == []
+    assert totals == {k: 0 for k in _METRIC_KEYS}